@@ -0,0 +1,179 @@
+"""
+Fake OpenAI-compatible chat completion server for load tests.
+
+Answers ``POST /v1/chat/completions`` in the ReAct format the crew agents
+parse: the first ``--tool-calls`` turns of an agent run call its tools (a
+search, then a scrape of a link from the search result), then it gives a
+``Final Answer`` of about ``--completion-tokens`` tokens. The batched trend
+task gets the per-topic JSON it asks for. Every response is delayed by a
+sample of ``--latency`` plus ``--per-token-ms`` for each completion token.
+
+Run with ``python -m benchmarks.fake_llm --port 8101`` and point the workers
+at it with ``OPENAI_API_BASE=http://localhost:8101/v1``.
+"""
+
+import re
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+from collections import Counter
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from .latency import Latency
+
+app = FastAPI(title="Fake LLM")
+
+settings = {
+    'latency': Latency('none'),
+    'per_token_ms': 0.0,
+    'completion_tokens': 600,
+    'tool_calls': 2,
+    'error_rate': 0.0,
+    'random': random.Random(),
+}
+stats = Counter()
+
+WORDS = (
+    "audience broadcast coverage segment viewers story developing interview footage analysis "
+    "trend ratings prime time report exclusive expert reaction sources timeline impact "
+    "community policy market technology network producers graphics live field newsroom"
+).split()
+
+_TOOL_NAMES_RE = re.compile(r'only one name of \[(.*?)\]')
+_TOPICS_RE = re.compile(r"""research_topics['"]?:\s*['"](.*?)['"](?:,|\})""", re.S)
+_URL_RE = re.compile(r'https?://[^\s"\'\]\)>,]+')
+
+
+def count_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def filler(tokens: int) -> str:
+    """Roughly ``tokens`` tokens of newsroom-flavoured words"""
+    rng = settings['random']
+    return ' '.join(rng.choice(WORDS) for _ in range(max(1, int(tokens * 0.75))))
+
+
+def markdown_answer(tokens: int) -> str:
+    sections = max(2, min(8, tokens // 150))
+    body = '\n\n'.join(
+        f"## Section {index + 1}\n\n{filler(tokens // sections)}" for index in range(sections)
+    )
+    return f"# Research Findings\n\n{body}"
+
+
+def batch_answer(prompt: str, tokens: int) -> str:
+    match = _TOPICS_RE.search(prompt)
+    raw = match.group(1).replace('\\n', '\n') if match else ''
+    topics = [line.lstrip('- ').strip() for line in raw.splitlines() if line.strip()]
+    share = tokens // max(1, len(topics))
+    return json.dumps({'topics': [{'topic': topic, 'analysis': markdown_answer(share)} for topic in topics]})
+
+
+def tool_action(tool_names: list, observations: list) -> str:
+    """Next tool call of the agent run, or None when it should answer"""
+    search = next((name for name in tool_names if 'search' in name.lower()), None)
+    scrape = next((name for name in tool_names if 'website' in name.lower()), None)
+    urls = _URL_RE.findall(observations[-1]) if observations else []
+    if scrape and urls and len(observations) % 2 == 1:
+        return f"Action: {scrape}\nAction Input: {json.dumps({'website_url': urls[0]})}"
+    if search:
+        return f"Action: {search}\nAction Input: {json.dumps({'search_query': filler(4)})}"
+    return None
+
+
+def respond(messages: list) -> str:
+    system = '\n'.join(m.get('content') or '' for m in messages if m.get('role') == 'system')
+    prompt = '\n'.join(str(m.get('content') or '') for m in messages)
+    observations = [
+        part for m in messages if m.get('role') == 'assistant'
+        for part in str(m.get('content') or '').split('Observation:')[1:]
+    ]
+
+    match = _TOOL_NAMES_RE.search(system) or _TOOL_NAMES_RE.search(prompt)
+    tool_names = [name.strip() for name in match.group(1).split(',')] if match else []
+    if tool_names and len(observations) < settings['tool_calls']:
+        action = tool_action(tool_names, observations)
+        if action:
+            return f"Thought: I need more information.\n{action}"
+
+    mean = settings['completion_tokens']
+    tokens = max(20, int(settings['random'].gauss(mean, mean * 0.2)))
+    answer = batch_answer(prompt, tokens) if '"topics" array' in prompt else markdown_answer(tokens)
+    return f"Thought: I now can give a great answer\nFinal Answer: {answer}"
+
+
+@app.post("/v1/chat/completions")
+@app.post("/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    messages = body.get('messages') or []
+    stats['requests'] += 1
+
+    if settings['random'].random() < settings['error_rate']:
+        stats['errors'] += 1
+        await asyncio.sleep(settings['latency'].sample())
+        return JSONResponse(status_code=503, content={'error': {'message': 'Fake overload', 'type': 'server_error'}})
+
+    content = respond(messages)
+    prompt_tokens = count_tokens(''.join(str(m.get('content') or '') for m in messages))
+    completion_tokens = count_tokens(content)
+    stats['prompt_tokens'] += prompt_tokens
+    stats['completion_tokens'] += completion_tokens
+
+    await asyncio.sleep(settings['latency'].sample() + completion_tokens * settings['per_token_ms'] / 1000)
+    return {
+        'id': f"chatcmpl-{uuid.uuid4().hex[:24]}",
+        'object': 'chat.completion',
+        'created': int(time.time()),
+        'model': body.get('model', 'fake'),
+        'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+        'usage': {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'total_tokens': prompt_tokens + completion_tokens,
+        },
+    }
+
+
+@app.get("/health")
+async def health():
+    return {'status': 'healthy'}
+
+
+@app.get("/stats")
+async def get_stats():
+    return dict(stats)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible LLM server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8101)
+    parser.add_argument("--latency", default="lognormal:median=1.5,p95=5", help="Per-request latency distribution")
+    parser.add_argument("--per-token-ms", type=float, default=0.0, help="Extra delay per completion token")
+    parser.add_argument("--completion-tokens", type=int, default=600, help="Mean size of a final answer")
+    parser.add_argument("--tool-calls", type=int, default=2, help="Tool calls per agent run before answering")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with 503")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    settings.update({
+        'latency': Latency(args.latency, args.seed),
+        'per_token_ms': args.per_token_ms,
+        'completion_tokens': args.completion_tokens,
+        'tool_calls': args.tool_calls,
+        'error_rate': args.error_rate,
+        'random': random.Random(args.seed),
+    })
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Fake Serper search API and web pages for load tests.
+
+``POST /search`` and ``POST /news`` answer like google.serper.dev with links
+to ``GET /pages/{slug}`` on this server, so the scrape tool fetches pages from
+here as well. Searches are delayed by a sample of ``--search-latency`` and
+pages by ``--scrape-latency``.
+
+Run with ``python -m benchmarks.fake_search --port 8102`` and point the
+workers at it with ``SERPER_BASE_URL=http://localhost:8102``.
+"""
+
+import random
+import asyncio
+import argparse
+import hashlib
+from collections import Counter
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse
+
+from .fake_llm import WORDS
+from .latency import Latency
+
+app = FastAPI(title="Fake Search")
+
+settings = {
+    'search_latency': Latency('none'),
+    'scrape_latency': Latency('none'),
+    'results': 10,
+    'page_words': 800,
+}
+stats = Counter()
+
+
+def _slug(query: str, position: int) -> str:
+    return hashlib.sha1(f"{query}:{position}".encode()).hexdigest()[:12]
+
+
+def _text(seed: str, words: int) -> str:
+    rng = random.Random(seed)
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+async def _search(request: Request, kind: str) -> dict:
+    body = await request.json()
+    query = str(body.get('q', ''))
+    count = min(int(body.get('num') or settings['results']), settings['results'])
+    stats[kind] += 1
+    await asyncio.sleep(settings['search_latency'].sample())
+
+    base = str(request.base_url).rstrip('/')
+    results = [
+        {
+            'title': f"{query.title()} - result {position}",
+            'link': f"{base}/pages/{_slug(query, position)}",
+            'snippet': _text(f"{query}:{position}", 30),
+            'position': position,
+            'date': '1 hour ago',
+            'source': 'Fake News Network',
+        }
+        for position in range(1, count + 1)
+    ]
+    key = 'news' if kind == 'news' else 'organic'
+    return {'searchParameters': {'q': query, 'type': kind}, key: results}
+
+
+@app.post("/search")
+async def search(request: Request):
+    return await _search(request, 'search')
+
+
+@app.post("/news")
+async def news(request: Request):
+    return await _search(request, 'news')
+
+
+@app.get("/pages/{slug}", response_class=HTMLResponse)
+async def page(slug: str):
+    stats['pages'] += 1
+    await asyncio.sleep(settings['scrape_latency'].sample())
+    paragraphs = ''.join(f"<p>{_text(f'{slug}:{index}', 100)}</p>" for index in range(settings['page_words'] // 100))
+    return f"<html><head><title>Story {slug}</title></head><body><h1>Story {slug}</h1>{paragraphs}</body></html>"
+
+
+@app.get("/health")
+async def health():
+    return {'status': 'healthy'}
+
+
+@app.get("/stats")
+async def get_stats():
+    return dict(stats)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Serper search and web page server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8102)
+    parser.add_argument("--search-latency", default="lognormal:median=0.6,p95=2", help="Search latency distribution")
+    parser.add_argument("--scrape-latency", default="lognormal:median=0.8,p95=3", help="Page latency distribution")
+    parser.add_argument("--results", type=int, default=10, help="Results per search")
+    parser.add_argument("--page-words", type=int, default=800, help="Words per scraped page")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    settings.update({
+        'search_latency': Latency(args.search_latency, args.seed),
+        'scrape_latency': Latency(args.scrape_latency, args.seed),
+        'results': args.results,
+        'page_words': args.page_words,
+    })
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
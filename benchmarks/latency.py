@@ -0,0 +1,55 @@
+"""
+Latency distributions for the fake providers.
+
+A distribution is given as a spec string:
+
+- ``none`` (or ``0``): no delay
+- ``fixed:0.5``: always 0.5 seconds
+- ``uniform:0.2,1.5``: uniformly between 0.2 and 1.5 seconds
+- ``lognormal:median=1.2,p95=4``: log-normal with the given median and p95,
+  the usual shape of provider latencies (long right tail)
+"""
+
+import math
+import random
+
+# z-score of the 95th percentile of a standard normal distribution
+_Z95 = 1.6448536269514722
+
+
+class Latency:
+    """Samples delays in seconds from a distribution spec"""
+
+    def __init__(self, spec: str = 'none', seed: int = None):
+        self.spec = spec or 'none'
+        self.random = random.Random(seed)
+        kind, _, params = self.spec.partition(':')
+        self.kind = kind.strip().lower()
+
+        if self.kind in ('none', '0', ''):
+            self.kind = 'none'
+        elif self.kind == 'fixed':
+            self.value = float(params)
+        elif self.kind == 'uniform':
+            self.low, self.high = (float(value) for value in params.split(','))
+        elif self.kind == 'lognormal':
+            values = dict(item.split('=') for item in params.split(','))
+            median, p95 = float(values['median']), float(values['p95'])
+            if median <= 0 or p95 < median:
+                raise ValueError(f"Lognormal latency needs 0 < median <= p95: {spec!r}")
+            self.mu = math.log(median)
+            self.sigma = (math.log(p95) - self.mu) / _Z95
+        else:
+            raise ValueError(f"Unknown latency distribution: {spec!r}")
+
+    def sample(self) -> float:
+        if self.kind == 'none':
+            return 0.0
+        if self.kind == 'fixed':
+            return self.value
+        if self.kind == 'uniform':
+            return self.random.uniform(self.low, self.high)
+        return self.random.lognormvariate(self.mu, self.sigma)
+
+    def __repr__(self):
+        return f"Latency({self.spec!r})"
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+Offline end-to-end load test
+
+Starts Redis (unless --redis-url is given), the fake LLM and search servers,
+the API and the stage workers, drives --requests research requests with
+--concurrency of them in flight, and reports throughput and p50/p95/p99
+latencies per stage and end to end. No provider API credits are used.
+
+Examples:
+    # 20 requests, 5 in flight, default latencies and worker counts
+    python -m benchmarks.load_test
+
+    # Size workers for a slower LLM and keep the numbers for later runs
+    python -m benchmarks.load_test --requests 50 --concurrency 10 \\
+        --workers trend_research=3,news_aggregation=3,content_strategy=2,final_reporting=2 \\
+        --llm-latency lognormal:median=3,p95=10 --output baseline.json
+
+    # Fail when p95 latencies or throughput regress by more than 20%
+    python -m benchmarks.load_test --baseline baseline.json --max-regression 0.2
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import shutil
+import socket
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+import redis
+import requests
+
+ROOT = Path(__file__).resolve().parent.parent
+STAGES = ['trend_research', 'news_aggregation', 'content_strategy', 'final_reporting']
+DEFAULT_WORKERS = 'trend_research=2,news_aggregation=2,content_strategy=1,final_reporting=1'
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values: list, pct: float):
+    """Nearest-rank percentile, or None without values"""
+    if not values:
+        return None
+    values = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(values)))
+    return values[min(rank, len(values)) - 1]
+
+
+def summarize(values: list) -> dict:
+    return {
+        'count': len(values),
+        'p50': percentile(values, 50),
+        'p95': percentile(values, 95),
+        'p99': percentile(values, 99),
+        'max': max(values) if values else None,
+    }
+
+
+class Stack:
+    """Processes of the system under test; stopped in reverse start order"""
+
+    def __init__(self, workdir: Path, env: dict):
+        self.workdir = workdir
+        self.env = env
+        self.processes = []
+
+    def start(self, name: str, args: list, **env):
+        log = open(self.workdir / f'{name}.log', 'w')
+        process = subprocess.Popen(
+            args, cwd=self.workdir, env={**self.env, **env}, stdout=log, stderr=subprocess.STDOUT
+        )
+        self.processes.append((name, process, log))
+        return process
+
+    def python(self, name: str, module: str, *args, **env):
+        return self.start(name, [sys.executable, '-m', module, *args], **env)
+
+    def wait_http(self, name: str, url: str, timeout: int = 60):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            self.check_alive()
+            try:
+                if requests.get(url, timeout=2).ok:
+                    return
+            except requests.RequestException:
+                pass
+            time.sleep(0.5)
+        raise RuntimeError(f"{name} did not become healthy at {url}; see {self.workdir}/{name}.log")
+
+    def wait_redis(self, url: str, timeout: int = 30):
+        connection = redis.from_url(url)
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            self.check_alive()
+            try:
+                if connection.ping():
+                    return
+            except redis.RedisError:
+                pass
+            time.sleep(0.2)
+        raise RuntimeError(f"Redis did not start at {url}; see {self.workdir}/redis.log")
+
+    def check_alive(self):
+        for name, process, _ in self.processes:
+            if process.poll() is not None:
+                raise RuntimeError(f"{name} exited with {process.returncode}; see {self.workdir}/{name}.log")
+
+    def stop(self):
+        for _, process, _ in reversed(self.processes):
+            if process.poll() is None:
+                process.terminate()
+        for _, process, log in reversed(self.processes):
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+            log.close()
+
+
+def parse_workers(spec: str) -> dict:
+    workers = {}
+    for item in spec.split(','):
+        stage, _, count = item.partition('=')
+        if stage.strip() not in STAGES:
+            raise ValueError(f"Unknown stage in --workers: {stage!r}")
+        workers[stage.strip()] = int(count)
+    return workers
+
+
+def start_stack(args, workdir: Path) -> tuple:
+    """Start every service and return ``(stack, api_url, fake_urls)``"""
+    llm_port, search_port, api_port = free_port(), free_port(), free_port()
+    env = {
+        **os.environ,
+        'PYTHONPATH': os.pathsep.join(filter(None, [str(ROOT / 'src'), str(ROOT), os.getenv('PYTHONPATH')])),
+        'DATABASE_URL': args.database_url or f"sqlite:///{workdir / 'load_test.db'}",
+        'OPENAI_API_KEY': 'fake-key',
+        'OPENAI_API_BASE': f'http://127.0.0.1:{llm_port}/v1',
+        'SERPER_API_KEY': 'fake-key',
+        'SERPER_BASE_URL': f'http://127.0.0.1:{search_port}',
+        # Every request must run its own stages
+        'STAGE_MEMO_TTL': '0',
+        'REPORT_REUSE_MAX_AGE': '0',
+        'RATE_LIMIT_ENABLED': 'true' if args.rate_limits else 'false',
+        'OTEL_SDK_DISABLED': 'true',
+        'CREWAI_DISABLE_TELEMETRY': 'true',
+    }
+    stack = Stack(workdir, env)
+
+    if args.redis_url:
+        env['REDIS_URL'] = args.redis_url
+    else:
+        redis_server = shutil.which('redis-server')
+        if not redis_server:
+            raise RuntimeError("redis-server not found; install it or pass --redis-url")
+        redis_port = free_port()
+        stack.start('redis', [redis_server, '--port', str(redis_port), '--save', '', '--appendonly', 'no'])
+        env['REDIS_URL'] = f'redis://127.0.0.1:{redis_port}'
+        stack.wait_redis(env['REDIS_URL'])
+
+    seed = [] if args.seed is None else ['--seed', str(args.seed)]
+    stack.python(
+        'fake_llm', 'benchmarks.fake_llm', '--port', str(llm_port),
+        '--latency', args.llm_latency, '--per-token-ms', str(args.llm_per_token_ms),
+        '--completion-tokens', str(args.completion_tokens), '--tool-calls', str(args.tool_calls),
+        '--error-rate', str(args.llm_error_rate), *seed
+    )
+    stack.python(
+        'fake_search', 'benchmarks.fake_search', '--port', str(search_port),
+        '--search-latency', args.search_latency, '--scrape-latency', args.scrape_latency, *seed
+    )
+    fake_urls = {'llm': f'http://127.0.0.1:{llm_port}', 'search': f'http://127.0.0.1:{search_port}'}
+    for name, url in fake_urls.items():
+        stack.wait_http(f'fake_{name}', f'{url}/health')
+
+    # The API creates the schema before the workers start
+    stack.python('api', 'uvicorn', 'tv_research.api:app', '--port', str(api_port), '--log-level', 'warning')
+    api_url = f'http://127.0.0.1:{api_port}'
+    stack.wait_http('api', f'{api_url}/health', timeout=120)
+
+    for stage, count in parse_workers(args.workers).items():
+        for index in range(count):
+            stack.python(f'worker_{stage}_{index}', 'tv_research.worker', WORKER_QUEUE=stage)
+    return stack, api_url, fake_urls
+
+
+def run_request(api_url: str, index: int, args) -> dict:
+    """Submit one research request and wait until it completes or fails"""
+    submitted = time.time()
+    response = requests.post(
+        f'{api_url}/research',
+        json={'topic': f'Load test topic {index}', 'priority': args.priority, 'max_age': 0},
+        timeout=30
+    )
+    response.raise_for_status()
+    research_id = response.json()['id']
+
+    status = 'timeout'
+    while time.time() - submitted < args.timeout:
+        current = requests.get(f'{api_url}/research/{research_id}', timeout=10).json()['status']
+        if current in ('completed', 'failed'):
+            status = current
+            break
+        time.sleep(args.poll_interval)
+    return {'id': research_id, 'status': status, 'seconds': time.time() - submitted}
+
+
+def collect_stage_latencies(api_url: str, research_ids: list) -> dict:
+    """Service time of every completed stage run, in seconds"""
+    latencies = {stage: [] for stage in STAGES}
+    for research_id in research_ids:
+        usage = requests.get(f'{api_url}/research/{research_id}/usage', timeout=10).json()
+        for row in usage['stages']:
+            if row['status'] == 'completed' and row['duration_ms'] is not None and row['stage'] in latencies:
+                latencies[row['stage']].append(row['duration_ms'] / 1000.0)
+    return latencies
+
+
+def collect_queue_waits(api_url: str, research_ids: list) -> dict:
+    """Time every stage waited on its lane before a worker picked it up, in seconds"""
+    waits = {stage: [] for stage in STAGES}
+    for research_id in research_ids:
+        timeline = requests.get(f'{api_url}/research/{research_id}/timeline', timeout=10).json()
+        for interval in timeline['stages']:
+            if interval['queue_wait_ms'] is not None and interval['stage'] in waits:
+                waits[interval['stage']].append(interval['queue_wait_ms'] / 1000.0)
+    return waits
+
+
+def run_load(args) -> dict:
+    workdir = Path(tempfile.mkdtemp(prefix='tv-research-load-'))
+    print(f"📁 Logs and database in {workdir}")
+    stack, api_url, fake_urls = start_stack(args, workdir)
+    try:
+        print(f"🚀 Driving {args.requests} requests with {args.concurrency} in flight...")
+        started = time.time()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            runs = list(pool.map(lambda index: run_request(api_url, index, args), range(args.requests)))
+        wall_seconds = time.time() - started
+        stack.check_alive()
+
+        completed = [run for run in runs if run['status'] == 'completed']
+        stage_latencies = collect_stage_latencies(api_url, [run['id'] for run in completed])
+        queue_waits = collect_queue_waits(api_url, [run['id'] for run in completed])
+        return {
+            'config': {key: value for key, value in vars(args).items() if key not in ('baseline', 'output')},
+            'wall_seconds': round(wall_seconds, 2),
+            'completed': len(completed),
+            'failed': sum(1 for run in runs if run['status'] == 'failed'),
+            'timed_out': sum(1 for run in runs if run['status'] == 'timeout'),
+            'throughput_per_minute': round(len(completed) / wall_seconds * 60, 2) if wall_seconds else 0.0,
+            'end_to_end': summarize([run['seconds'] for run in completed]),
+            'stages': {stage: summarize(values) for stage, values in stage_latencies.items()},
+            'queue_wait': {stage: summarize(values) for stage, values in queue_waits.items()},
+            'providers': {name: requests.get(f'{url}/stats', timeout=5).json() for name, url in fake_urls.items()},
+        }
+    finally:
+        stack.stop()
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def print_report(report: dict):
+    def fmt(value):
+        return f"{value:8.2f}" if value is not None else "       -"
+
+    print(f"\n📊 {report['completed']} completed, {report['failed']} failed, {report['timed_out']} timed out "
+          f"in {report['wall_seconds']}s ({report['throughput_per_minute']} runs/min)")
+    print(f"{'':24} {'count':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}  (seconds)")
+    rows = [(stage, report['stages'][stage]) for stage in STAGES]
+    rows += [(f'{stage} wait', report['queue_wait'][stage]) for stage in STAGES if 'queue_wait' in report]
+    rows += [('end_to_end', report['end_to_end'])]
+    for name, summary in rows:
+        print(f"{name:24} {summary['count']:6d} {fmt(summary['p50'])} {fmt(summary['p95'])} "
+              f"{fmt(summary['p99'])} {fmt(summary['max'])}")
+    llm = report['providers']['llm']
+    print(f"LLM requests: {llm.get('requests', 0)}, tokens: "
+          f"{llm.get('prompt_tokens', 0) + llm.get('completion_tokens', 0)}; "
+          f"searches: {report['providers']['search'].get('search', 0)}, pages: {report['providers']['search'].get('pages', 0)}")
+
+
+def compare(report: dict, baseline: dict, max_regression: float) -> list:
+    """Regressions of p95 latencies and throughput beyond ``max_regression``"""
+    regressions = []
+    pairs = [('end_to_end', report['end_to_end'], baseline['end_to_end'])]
+    pairs += [(stage, report['stages'][stage], baseline['stages'].get(stage, {})) for stage in STAGES]
+    for name, current, previous in pairs:
+        if current.get('p95') and previous.get('p95') and current['p95'] > previous['p95'] * (1 + max_regression):
+            regressions.append(f"{name} p95 {previous['p95']:.2f}s -> {current['p95']:.2f}s")
+    if report['throughput_per_minute'] < baseline['throughput_per_minute'] * (1 - max_regression):
+        regressions.append(
+            f"throughput {baseline['throughput_per_minute']} -> {report['throughput_per_minute']} runs/min"
+        )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end load test with fake LLM and search providers")
+    parser.add_argument("--requests", type=int, default=20, help="Research requests to run")
+    parser.add_argument("--concurrency", type=int, default=5, help="Requests in flight at a time")
+    parser.add_argument("--priority", default="normal", choices=["high", "normal", "low"])
+    parser.add_argument("--workers", default=DEFAULT_WORKERS, help="Workers per stage, e.g. trend_research=2,...")
+    parser.add_argument("--llm-latency", default="lognormal:median=1.5,p95=5", help="LLM latency distribution")
+    parser.add_argument("--llm-per-token-ms", type=float, default=0.0, help="Extra LLM delay per completion token")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="Share of LLM requests failing with 503")
+    parser.add_argument("--completion-tokens", type=int, default=600, help="Mean size of a final answer")
+    parser.add_argument("--tool-calls", type=int, default=2, help="Tool calls per agent run")
+    parser.add_argument("--search-latency", default="lognormal:median=0.6,p95=2", help="Search latency distribution")
+    parser.add_argument("--scrape-latency", default="lognormal:median=0.8,p95=3", help="Page latency distribution")
+    parser.add_argument("--rate-limits", action="store_true", help="Keep the shared provider rate limits enabled")
+    parser.add_argument("--redis-url", help="Use this Redis (with empty queues) instead of starting redis-server")
+    parser.add_argument("--database-url", help="Database to use instead of a temporary SQLite file")
+    parser.add_argument("--timeout", type=int, default=1800, help="Seconds to wait for each request")
+    parser.add_argument("--poll-interval", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    parser.add_argument("--baseline", help="JSON report of an earlier run to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Allowed relative regression")
+    parser.add_argument("--keep", action="store_true", help="Keep logs and database after the run")
+    args = parser.parse_args()
+
+    report = run_load(args)
+    print_report(report)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+        print(f"💾 Report written to {args.output}")
+
+    failed = report['completed'] < args.requests
+    if args.baseline:
+        regressions = compare(report, json.loads(Path(args.baseline).read_text()), args.max_regression)
+        for regression in regressions:
+            print(f"❌ Regression: {regression}")
+        failed = failed or bool(regressions)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,9 @@ Daily News Brief Example
 Generates a comprehensive daily briefing for morning or evening news programs.
 Perfect for quick updates on trending topics and breaking news.
 
+The scheduler service also runs this briefing automatically, see the
+`daily_news_brief` entry in src/tv_research/config/schedules.yaml.
+
 Usage (Docker):
     docker compose run --rm tv-crew python examples/daily_news_brief.py
 """
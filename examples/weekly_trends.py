@@ -5,6 +5,9 @@ Weekly Trending Report Example
 Generates a comprehensive weekly roundup of trending topics perfect for
 weekend programming, social media content, and next week's planning.
 
+The scheduler service also runs this briefing automatically, see the
+`weekly_trends` entry in src/tv_research/config/schedules.yaml.
+
 Usage (Docker):
     docker compose run --rm tv-crew python examples/weekly_trends.py
 """
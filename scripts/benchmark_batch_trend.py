@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Batched vs per-topic trend stage benchmark
+
+Submits the same topics through POST /research/batch once per mode
+(per-topic trend stages and one batched trend stage) against a running stack
+and compares the trend stage's token usage and the wall time until every
+topic has its trend analysis.
+
+Run the workers with STAGE_MEMO_TTL=0, otherwise repeated topics are served
+from the stage memo and the per-topic numbers are meaningless.
+"""
+
+import sys
+import time
+import argparse
+import statistics
+from typing import Dict, List
+
+import requests
+
+DEFAULT_TOPICS = [
+    "AI in Healthcare",
+    "Renewable Energy Storage",
+    "Electric Vehicle Adoption",
+    "Space Tourism",
+    "Quantum Computing",
+    "Urban Farming",
+]
+
+
+def wait_for_trend_stage(base_url: str, research_ids: List[int], timeout: int) -> Dict[int, str]:
+    """Poll until every run has a trend analysis or failed; returns the final states"""
+    states = {}
+    deadline = time.time() + timeout
+    while len(states) < len(research_ids) and time.time() < deadline:
+        for research_id in research_ids:
+            if research_id in states:
+                continue
+            stages = requests.get(f"{base_url}/research/{research_id}/stages", timeout=10).json()["stages"]
+            if any(stage["stage"] == "trend_research" for stage in stages):
+                states[research_id] = "done"
+                continue
+            status = requests.get(f"{base_url}/research/{research_id}", timeout=10).json()["status"]
+            if status == "failed":
+                states[research_id] = "failed"
+        time.sleep(1)
+    for research_id in research_ids:
+        states.setdefault(research_id, "timeout")
+    return states
+
+
+def trend_usage(base_url: str, research_id: int) -> dict:
+    """Trend stage tokens, LLM calls and cost of one research run"""
+    data = requests.get(f"{base_url}/research/{research_id}/usage", timeout=10).json()
+    rows = [row for row in data["stages"] if row["stage"] == "trend_research"]
+    if any(row["status"] == "memoized" for row in rows):
+        print(f"⚠️  Research {research_id} reused a memoized trend stage; set STAGE_MEMO_TTL=0 on the workers")
+    return {
+        "total_tokens": sum(row["total_tokens"] or 0 for row in rows),
+        "llm_calls": sum(row["llm_calls"] or 0 for row in rows),
+        "cost_usd": sum(row["cost_usd"] or 0 for row in rows),
+    }
+
+
+def run_mode(base_url: str, topics: List[str], batch_trend: bool, timeout: int) -> dict:
+    """Submit the topics once and measure the trend stage"""
+    started = time.time()
+    response = requests.post(
+        f"{base_url}/research/batch",
+        json={"topics": topics, "batch_trend": batch_trend, "max_age": 0},
+        timeout=30
+    )
+    response.raise_for_status()
+    research_ids = [result["id"] for result in response.json()]
+
+    states = wait_for_trend_stage(base_url, research_ids, timeout)
+    wall_seconds = time.time() - started
+
+    usages = [trend_usage(base_url, research_id) for research_id in research_ids]
+    return {
+        "mode": "batched" if batch_trend else "per-topic",
+        "wall_seconds": round(wall_seconds, 1),
+        "completed": sum(1 for state in states.values() if state == "done"),
+        "total_tokens": sum(usage["total_tokens"] for usage in usages),
+        "llm_calls": sum(usage["llm_calls"] for usage in usages),
+        "cost_usd": round(sum(usage["cost_usd"] for usage in usages), 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the batched trend stage against per-topic trend stages")
+    parser.add_argument("--base-url", default="http://localhost:8000", help="API base URL")
+    parser.add_argument("--topics", nargs="+", default=DEFAULT_TOPICS, help="Topics to research")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per mode")
+    parser.add_argument("--timeout", type=int, default=1800, help="Seconds to wait for the trend stages per run")
+    args = parser.parse_args()
+
+    results = {"per-topic": [], "batched": []}
+    for repeat in range(args.repeat):
+        # Batched first, so a memoized per-topic run cannot leak into it
+        for batch_trend in (True, False):
+            result = run_mode(args.base_url, args.topics, batch_trend, args.timeout)
+            print(
+                f"Run {repeat + 1} {result['mode']:>9}: {result['wall_seconds']}s, "
+                f"{result['total_tokens']} tokens, {result['llm_calls']} LLM calls, "
+                f"${result['cost_usd']} ({result['completed']}/{len(args.topics)} topics)"
+            )
+            results[result["mode"]].append(result)
+
+    print(f"\n📊 Trend stage for {len(args.topics)} topics (median of {args.repeat} run(s))")
+    for mode, runs in results.items():
+        print(
+            f"  {mode:>9}: {statistics.median(run['wall_seconds'] for run in runs)}s wall, "
+            f"{statistics.median(run['total_tokens'] for run in runs)} tokens, "
+            f"{statistics.median(run['llm_calls'] for run in runs)} LLM calls"
+        )
+
+    per_topic_tokens = statistics.median(run["total_tokens"] for run in results["per-topic"])
+    batched_tokens = statistics.median(run["total_tokens"] for run in results["batched"])
+    if per_topic_tokens:
+        print(f"  Batched uses {batched_tokens / per_topic_tokens * 100:.0f}% of the per-topic tokens")
+
+    if any(run["completed"] < len(args.topics) for runs in results.values() for run in runs):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
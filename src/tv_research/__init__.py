@@ -7,6 +7,13 @@ aggregate breaking news, and generate production-ready content recommendations.
 
 __version__ = "1.0.0"
 
-from tv_research.crew import TVResearchCrew
-
 __all__ = ['TVResearchCrew']
+
+
+def __getattr__(name):
+    # Imported on first use, so the API and other services that only enqueue
+    # work do not load crewai
+    if name == 'TVResearchCrew':
+        from tv_research.crew import TVResearchCrew
+        return TVResearchCrew
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,19 +1,31 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Depends
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Depends, Query, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from sqlalchemy import func
 from sqlalchemy.orm import Session
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
 import time
 from datetime import datetime
-import redis
-from rq import Queue
+from email.utils import format_datetime, parsedate_to_datetime
 import os
 
-from .models import ResearchResult, get_db, init_db
-from .worker import (
-    trend_queue, news_queue, content_queue, reporting_queue,
-    run_trend_research, run_news_aggregation, run_content_strategy, run_final_reporting
+from .models import ResearchResult, StageHandoff, StageOutput, StageUsage, StatusEvent, get_db, init_db
+from .usage import summarize_usage
+from .reuse import find_fresh_report, normalize_topic, record_reuse, reuse_max_age
+# Stages are enqueued by dotted name, so the API never imports crewai (see queue_client.py)
+from .queue_client import (
+    PRIORITIES, RUN_NEWS_REFRESH, STAGES, TENANT_ID_PATTERN, enqueue_batch_trend, enqueue_stage, lane_counts,
+    stored_tenant, trend_entry_point
 )
+from .tracing import get_trace, render_waterfall, span, start_trace, waterfall
+from .timeline import get_timeline, get_timing_report
+from .cassette import enable_recording
+from .artifacts import ArtifactNotFound, get_store, parse_range, save_report
+from .export import export_rows, to_csv, to_ndjson
+from .retention import bulk_delete, get_retention_report
+from .handoff import get_handoff_report
+from .fairshare import get_tenant_report
 
 app = FastAPI(title="TV Research API", description="API for TV Channel Research", version="1.0.0")
 
@@ -29,27 +41,59 @@ app.add_middleware(
 # Pydantic models for API
 class ResearchRequest(BaseModel):
     topic: Optional[str] = None
+    # Breaking news should use "high"; long-form documentary research "low"
+    priority: Literal['high', 'normal', 'low'] = 'normal'
+    # Seconds a completed report of the same topic may be reused for; 0 forces
+    # a new run, None uses the server default (REPORT_REUSE_MAX_AGE, no reuse
+    # for high priority)
+    max_age: Optional[int] = None
+    # Desk or producer the run is accounted to for fair sharing of the
+    # workers (see fairshare.py); None is the default tenant
+    tenant: Optional[str] = Field(None, pattern=TENANT_ID_PATTERN)
+    # Record the run's LLM and tool calls on the workers for replay (see
+    # cassette.py); a recorded run never reuses a stored report
+    record: bool = False
+
+class BatchResearchRequest(BaseModel):
+    topics: List[str]
+    priority: Literal['high', 'normal', 'low'] = 'normal'
+    # Research the trends of the topics together in one agent run per batch
+    # (see batching.py) instead of one trend stage per topic
+    batch_trend: bool = False
+    max_age: Optional[int] = None
+    tenant: Optional[str] = Field(None, pattern=TENANT_ID_PATTERN)
+
+class RefreshRequest(BaseModel):
+    # Defaults to the priority of the refreshed research
+    priority: Optional[Literal['high', 'normal', 'low']] = None
 
 class ResearchResponse(BaseModel):
     id: int
     topic: Optional[str]
     status: str
+    priority: Optional[str] = 'normal'
     created_at: Optional[str]
     completed_at: Optional[str]
     result_content: Optional[str]
     error_message: Optional[str]
     execution_time: Optional[int]
+    schedule_name: Optional[str] = None
+    ready_by: Optional[str] = None
+    parent_id: Optional[int] = None
+    trace_id: Optional[str] = None
+    report_id: Optional[str] = None
+    tenant: Optional[str] = None
+    reused: bool = False
 
 # Initialize database on startup
 @app.on_event("startup")
 def startup_event():
     init_db()
 
-def enqueue_research_workflow(result_id: int, topic: Optional[str]):
-    """Enqueue the complete research workflow"""
-    # Prepare inputs for the research workflow
+def build_research_inputs(topic: Optional[str]) -> dict:
+    """Prepare inputs for the research workflow"""
     if topic:
-        inputs = {
+        return {
             'channel_type': f'Special Report on {topic}',
             'time_slot': 'Prime Time Documentary/Special Segment',
             'audience_demographic': f'Educated general audience interested in {topic}',
@@ -57,42 +101,220 @@ def enqueue_research_workflow(result_id: int, topic: Optional[str]):
             'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
             'research_focus': topic
         }
-    else:
-        inputs = {
-            'channel_type': 'News and Entertainment',
-            'time_slot': 'Prime Time',
-            'audience_demographic': 'General audience aged 25-54',
-            'production_timeline': '24-48 hours',
-            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        }
+    return {
+        'channel_type': 'News and Entertainment',
+        'time_slot': 'Prime Time',
+        'audience_demographic': 'General audience aged 25-54',
+        'production_timeline': '24-48 hours',
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    }
 
-    # Enqueue trend research first - workers will chain subsequent jobs
-    trend_job = trend_queue.enqueue(run_trend_research, result_id, inputs)
+def enqueue_research_workflow(result_id: int, topic: Optional[str], priority: str = 'normal', tenant: str = None):
+    """Enqueue the complete research workflow"""
+    inputs = build_research_inputs(topic)
+
+    # Enqueue trend research first - workers will chain subsequent jobs;
+    # trending-topic runs stream topics between stages (see streaming.py)
+    trend_job = enqueue_stage(
+        'trend_research', trend_entry_point(inputs), result_id, inputs, priority=priority, tenant=tenant
+    )
 
     return trend_job.id
 
 @app.post("/research", response_model=ResearchResponse)
 async def start_research(request: ResearchRequest, db: Session = Depends(get_db)):
     """Start a new research task using Redis queues"""
-    # Create new research result record
-    result = ResearchResult(topic=request.topic, status='queued')
-    db.add(result)
-    db.commit()
-    db.refresh(result)
+    topic_key = normalize_topic(request.topic)
+    tenant = stored_tenant(request.tenant)
 
-    # Enqueue the research workflow
-    try:
-        job_id = enqueue_research_workflow(result.id, request.topic)
-        # Store job ID for tracking (optional)
-        result.job_id = job_id
-        db.commit()
-    except Exception as e:
-        result.status = 'failed'
-        result.error_message = f"Failed to enqueue job: {str(e)}"
+    # Serve a fresh enough completed report of the same topic from storage;
+    # a topic of punctuation only has no key to match
+    max_age = reuse_max_age(request.max_age, request.priority)
+    if max_age > 0 and topic_key and not request.record:
+        existing = find_fresh_report(db, topic_key, max_age, tenant)
+        record_reuse(existing is not None)
+        if existing:
+            return ResearchResponse(**existing.to_dict(), reused=True)
+
+    # The trace started here follows the run through every stage (see tracing.py)
+    with start_trace('POST /research', topic=request.topic, priority=request.priority) as root:
+        # Create new research result record
+        result = ResearchResult(
+            topic=request.topic,
+            topic_key=topic_key or None,
+            status='queued',
+            priority=request.priority,
+            tenant=tenant,
+            trace_id=root.trace_id if root else None
+        )
+        with span('db insert research_result'):
+            db.add(result)
+            db.commit()
+            db.refresh(result)
+        if root:
+            root.set_attribute('research_id', result.id)
+
+        # Enqueue the research workflow
+        try:
+            if request.record:
+                enable_recording(result.id)
+            job_id = enqueue_research_workflow(result.id, request.topic, request.priority, tenant)
+            # Store job ID for tracking (optional)
+            result.job_id = job_id
+            db.commit()
+        except Exception as e:
+            result.status = 'failed'
+            result.error_message = f"Failed to enqueue job: {str(e)}"
+            db.commit()
+
+    return ResearchResponse(**result.to_dict())
+
+@app.post("/research/batch", response_model=List[ResearchResponse])
+async def start_batch_research(request: BatchResearchRequest, db: Session = Depends(get_db)):
+    """Start research runs for several topics at once"""
+    topics = [topic.strip() for topic in request.topics if topic and topic.strip()]
+    if not topics:
+        raise HTTPException(status_code=400, detail="At least one topic is required")
+
+    max_age = reuse_max_age(request.max_age, request.priority)
+    tenant = stored_tenant(request.tenant)
+    responses = [None] * len(topics)
+    created = []
+    # Repeated topics of the batch share the run of their first occurrence
+    first_index, repeats = {}, []
+    # All runs of the batch share one trace
+    with start_trace('POST /research/batch', topics=len(topics), batch_trend=request.batch_trend) as root:
+        for index, topic in enumerate(topics):
+            topic_key = normalize_topic(topic)
+            if topic_key and topic_key in first_index:
+                repeats.append((index, first_index[topic_key]))
+                continue
+            first_index[topic_key] = index
+            if max_age > 0 and topic_key:
+                existing = find_fresh_report(db, topic_key, max_age, tenant)
+                record_reuse(existing is not None)
+                if existing:
+                    responses[index] = ResearchResponse(**existing.to_dict(), reused=True)
+                    continue
+            result = ResearchResult(
+                topic=topic,
+                topic_key=topic_key or None,
+                status='queued',
+                priority=request.priority,
+                tenant=tenant,
+                trace_id=root.trace_id if root else None
+            )
+            db.add(result)
+            created.append((index, result))
+        with span('db insert research_result', runs=len(created)):
+            db.commit()
+
+        results = [result for _, result in created]
+        try:
+            if request.batch_trend:
+                job_ids = enqueue_batch_trend(
+                    [result.id for result in results],
+                    [build_research_inputs(result.topic) for result in results],
+                    request.priority,
+                    tenant=tenant
+                )
+                for result, job_id in zip(results, job_ids):
+                    result.job_id = job_id
+            else:
+                for result in results:
+                    result.job_id = enqueue_research_workflow(
+                        result.id, result.topic, request.priority, tenant
+                    )
+        except Exception as e:
+            for result in results:
+                if not result.job_id:
+                    result.status = 'failed'
+                    result.error_message = f"Failed to enqueue job: {str(e)}"
         db.commit()
 
+    for index, result in created:
+        db.refresh(result)
+        responses[index] = ResearchResponse(**result.to_dict())
+    for index, first in repeats:
+        responses[index] = responses[first]
+    return responses
+
+@app.post("/research/{result_id}/refresh", response_model=ResearchResponse)
+async def refresh_research(result_id: int, request: Optional[RefreshRequest] = None, db: Session = Depends(get_db)):
+    """Refresh a completed research run with the news published since it ran"""
+    parent = db.query(ResearchResult).filter(ResearchResult.id == result_id).first()
+    if not parent:
+        raise HTTPException(status_code=404, detail="Research result not found")
+    if parent.status != 'completed':
+        raise HTTPException(status_code=400, detail="Only completed research can be refreshed")
+    # Retention compaction deletes the intermediate outputs a refresh builds on
+    stored = {
+        stage for (stage,) in db.query(StageOutput.stage).filter(StageOutput.research_id == parent.id).distinct()
+    }
+    if not set(STAGES) <= stored:
+        raise HTTPException(
+            status_code=409,
+            detail="Research has no stored stage outputs to refresh from (compacted by retention); start a new run"
+        )
+
+    priority = (request.priority if request else None) or parent.priority or 'normal'
+    with start_trace('POST /research/refresh', parent_id=parent.id, priority=priority) as root:
+        result = ResearchResult(
+            topic=parent.topic,
+            topic_key=parent.topic_key or normalize_topic(parent.topic),
+            status='queued',
+            priority=priority,
+            parent_id=parent.id,
+            tenant=parent.tenant,
+            trace_id=root.trace_id if root else None
+        )
+        with span('db insert research_result'):
+            db.add(result)
+            db.commit()
+            db.refresh(result)
+
+        inputs = build_research_inputs(parent.topic)
+        inputs['previous_run_at'] = (parent.completed_at or parent.created_at).strftime('%Y-%m-%d %H:%M UTC')
+        try:
+            job = enqueue_stage(
+                'news_aggregation', RUN_NEWS_REFRESH, result.id, inputs, parent.id,
+                priority=priority, tenant=parent.tenant
+            )
+            result.job_id = job.id
+            db.commit()
+        except Exception as e:
+            result.status = 'failed'
+            result.error_message = f"Failed to enqueue job: {str(e)}"
+            db.commit()
+
     return ResearchResponse(**result.to_dict())
 
+# Declared before /research/{result_id}, which would otherwise match "export"
+@app.get("/research/export")
+async def export_research(
+    format: Literal['ndjson', 'csv'] = 'ndjson',
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    status: Optional[List[str]] = Query(None),
+    topic: Optional[str] = None,
+    include_body: bool = False
+):
+    """Stream research history as NDJSON or CSV, filtered by creation date, status and topic"""
+    if since and until and until <= since:
+        raise HTTPException(status_code=400, detail="until must be after since")
+    # status may be repeated or comma separated
+    statuses = [item.strip() for value in status or [] for item in value.split(',') if item.strip()]
+    rows = export_rows(since, until, statuses, topic, include_body)
+    if format == 'csv':
+        body, media_type = to_csv(rows, include_body), 'text/csv; charset=utf-8'
+    else:
+        body, media_type = to_ndjson(rows), 'application/x-ndjson'
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={'Content-Disposition': f'attachment; filename="research_export.{format}"'}
+    )
+
 @app.get("/research/{result_id}", response_model=ResearchResponse)
 async def get_research_result(result_id: int, db: Session = Depends(get_db)):
     """Get a specific research result"""
@@ -105,6 +327,145 @@ async def get_research_result(result_id: int, db: Session = Depends(get_db)):
         # Handle database connection issues
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
+@app.get("/research/{result_id}/stages")
+async def get_research_stages(result_id: int, db: Session = Depends(get_db)):
+    """Get the full, uncompacted output of every completed stage"""
+    result = db.query(ResearchResult).filter(ResearchResult.id == result_id).first()
+    if not result:
+        raise HTTPException(status_code=404, detail="Research result not found")
+
+    stages = db.query(StageOutput).filter(
+        StageOutput.research_id == result_id
+    ).order_by(StageOutput.created_at.asc()).all()
+    return {
+        "research_id": result_id,
+        "stages": [stage.to_dict() for stage in stages]
+    }
+
+@app.get("/research/{result_id}/usage")
+async def get_research_usage(result_id: int, db: Session = Depends(get_db)):
+    """Get token usage, call counts and estimated cost per stage of a research run"""
+    result = db.query(ResearchResult).filter(ResearchResult.id == result_id).first()
+    if not result:
+        raise HTTPException(status_code=404, detail="Research result not found")
+
+    rows = db.query(StageUsage).filter(
+        StageUsage.research_id == result_id
+    ).order_by(StageUsage.created_at.asc()).all()
+    summary = summarize_usage(rows)
+    return {
+        "research_id": result_id,
+        "stages": [row.to_dict() for row in rows],
+        "by_stage": summary["by_stage"],
+        "totals": summary["totals"]
+    }
+
+def not_modified(request: Request, etag: str, modified: datetime) -> bool:
+    """Whether a conditional GET can be answered with 304"""
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+        return '*' in tags or etag in tags
+    if_modified_since = request.headers.get('if-modified-since')
+    if if_modified_since:
+        try:
+            return modified.replace(microsecond=0) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+@app.api_route("/research/{result_id}/report", methods=["GET", "HEAD"])
+async def download_research_report(result_id: int, request: Request, db: Session = Depends(get_db)):
+    """Stream the final report of a research run, with Range and conditional-GET support"""
+    result = db.query(ResearchResult).filter(ResearchResult.id == result_id).first()
+    if not result:
+        raise HTTPException(status_code=404, detail="Research result not found")
+    if not result.report_id:
+        if result.status != 'completed' or not result.result_content:
+            raise HTTPException(status_code=404, detail="Report not available yet")
+        # Runs completed before the artifact store get their artifact on first download
+        result.report_id = save_report(result.result_content)
+        db.commit()
+
+    store = get_store()
+    try:
+        size, modified = store.stat(result.report_id)
+    except ArtifactNotFound:
+        raise HTTPException(status_code=404, detail="Report artifact missing from the store")
+
+    # Report IDs are content hashes, so they are strong validators
+    etag = f'"{result.report_id}"'
+    last_modified = format_datetime(modified, usegmt=True)
+    headers = {
+        'ETag': etag,
+        'Last-Modified': last_modified,
+        'Accept-Ranges': 'bytes',
+        'Content-Disposition': f'inline; filename="research_{result_id}.md"',
+    }
+    if not_modified(request, etag, modified):
+        return Response(status_code=304, headers=headers)
+
+    byte_range = None
+    if_range = request.headers.get('if-range')
+    if request.headers.get('range') and if_range in (None, etag, last_modified):
+        try:
+            byte_range = parse_range(request.headers['range'], size)
+        except ValueError:
+            return Response(status_code=416, headers={**headers, 'Content-Range': f'bytes */{size}'})
+
+    status_code = 200
+    start, end = 0, size - 1
+    if byte_range:
+        status_code = 206
+        start, end = byte_range
+        headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+    headers['Content-Length'] = str(end - start + 1)
+
+    media_type = 'text/markdown; charset=utf-8'
+    if request.method == 'HEAD':
+        return Response(status_code=status_code, headers=headers, media_type=media_type)
+    return StreamingResponse(
+        store.read(result.report_id, start, end), status_code=status_code, headers=headers, media_type=media_type
+    )
+
+@app.get("/research/{result_id}/timeline")
+async def get_research_timeline(result_id: int, db: Session = Depends(get_db)):
+    """Get the status history of a research run and its queue wait and service time per stage"""
+    result = db.query(ResearchResult).filter(ResearchResult.id == result_id).first()
+    if not result:
+        raise HTTPException(status_code=404, detail="Research result not found")
+
+    return {
+        "research_id": result_id,
+        "status": result.status,
+        **get_timeline(db, result_id)
+    }
+
+@app.get("/research/{result_id}/trace")
+async def get_research_trace(result_id: int, format: Literal['json', 'text'] = 'json', db: Session = Depends(get_db)):
+    """Get the trace waterfall of a research run: queue waits, stages, DB writes, LLM and tool calls"""
+    result = db.query(ResearchResult).filter(ResearchResult.id == result_id).first()
+    if not result:
+        raise HTTPException(status_code=404, detail="Research result not found")
+    if not result.trace_id:
+        raise HTTPException(status_code=404, detail="No trace recorded for this research run")
+
+    try:
+        spans = get_trace(result.trace_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to load trace: {str(e)}")
+    if not spans:
+        raise HTTPException(status_code=404, detail="Trace expired or not yet exported")
+
+    view = waterfall(spans)
+    if format == 'text':
+        return PlainTextResponse(render_waterfall(view))
+    return {
+        "research_id": result_id,
+        "trace_id": result.trace_id,
+        **view
+    }
+
 @app.get("/research", response_model=List[ResearchResponse])
 async def list_research_results(limit: int = 50, offset: int = 0, db: Session = Depends(get_db)):
     """List all research results"""
@@ -115,6 +476,23 @@ async def list_research_results(limit: int = 50, offset: int = 0, db: Session =
         # Handle database connection issues
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
+@app.delete("/research")
+async def bulk_delete_research(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    status: Optional[List[str]] = Query(None),
+    topic: Optional[str] = None,
+    dry_run: bool = False
+):
+    """Delete every finished research run matching the filters, with its outputs and report artifact"""
+    statuses = [item.strip() for value in status or [] for item in value.split(',') if item.strip()]
+    if not (since or until or statuses or topic):
+        raise HTTPException(status_code=400, detail="At least one filter (since, until, status, topic) is required")
+    try:
+        return bulk_delete(since, until, statuses, topic, dry_run)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
 @app.delete("/research/{result_id}")
 async def delete_research_result(result_id: int, db: Session = Depends(get_db)):
     """Delete a research result"""
@@ -122,10 +500,34 @@ async def delete_research_result(result_id: int, db: Session = Depends(get_db)):
     if not result:
         raise HTTPException(status_code=404, detail="Research result not found")
 
+    db.query(StageOutput).filter(StageOutput.research_id == result_id).delete()
+    db.query(StageUsage).filter(StageUsage.research_id == result_id).delete()
+    db.query(StatusEvent).filter(StatusEvent.research_id == result_id).delete()
+    db.query(StageHandoff).filter(StageHandoff.research_id == result_id).delete()
     db.delete(result)
     db.commit()
     return {"message": "Research result deleted successfully"}
 
+@app.get("/schedules")
+async def list_schedules(db: Session = Depends(get_db)):
+    """List recurring research schedules with their next planned run"""
+    from .scheduler import describe_schedules, load_schedules
+    try:
+        return {"schedules": describe_schedules(load_schedules(), db)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Schedule error: {str(e)}")
+
+@app.get("/schedules/{name}/latest", response_model=ResearchResponse)
+async def get_latest_scheduled_report(name: str, db: Session = Depends(get_db)):
+    """Get the most recent completed report of a schedule straight from storage"""
+    result = db.query(ResearchResult).filter(
+        ResearchResult.schedule_name == name,
+        ResearchResult.status == 'completed'
+    ).order_by(ResearchResult.completed_at.desc()).first()
+    if not result:
+        raise HTTPException(status_code=404, detail=f"No completed report for schedule '{name}'")
+    return ResearchResponse(**result.to_dict())
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
@@ -141,12 +543,9 @@ async def get_metrics():
             total_research = db.query(ResearchResult).count()
             completed_research = db.query(ResearchResult).filter(ResearchResult.status == 'completed').count()
             failed_research = db.query(ResearchResult).filter(ResearchResult.status == 'failed').count()
+            # Every intermediate status (queued, *_running, *_completed, *_requeued) is active
             active_research = db.query(ResearchResult).filter(
-                ResearchResult.status.in_([
-                    'running', 'queued', 'trend_research_completed',
-                    'news_aggregation_completed', 'content_strategy_completed',
-                    'final_reporting_running'
-                ])
+                ~ResearchResult.status.in_(['completed', 'failed'])
             ).count()
 
             # Calculate success rate
@@ -175,6 +574,75 @@ async def get_metrics():
 
             avg_execution_time = sum(completed_times) / len(completed_times) if completed_times else 0
 
+            # Stages reclaimed from dead workers
+            try:
+                from .reaper import get_reaper_report
+                reaper_report = get_reaper_report(limit=10)
+            except Exception as e:
+                reaper_report = {"error": str(e)}
+
+            # Circuit breaker state and adaptive concurrency per provider
+            try:
+                from .resilience import get_upstream_report
+                upstreams = get_upstream_report()
+            except Exception as e:
+                upstreams = {"error": str(e)}
+
+            # Completed reports served again instead of starting new runs
+            try:
+                from .reuse import get_reuse_stats
+                report_reuse = get_reuse_stats()
+            except Exception as e:
+                report_reuse = {"error": str(e)}
+
+            # Queue wait vs service time per stage over the last day
+            try:
+                stage_timing = get_timing_report(db)
+            except Exception as e:
+                stage_timing = {"error": str(e)}
+
+            # Stage hand-offs not enqueued yet and those the relay recovered
+            try:
+                handoffs = get_handoff_report(db)
+            except Exception as e:
+                handoffs = {"error": str(e)}
+
+            # Archival and compaction of old runs
+            try:
+                retention = get_retention_report()
+            except Exception as e:
+                retention = {"error": str(e)}
+
+            # Aggregate token usage and estimated cost per stage
+            usage_rows = db.query(
+                StageUsage.stage,
+                func.count(StageUsage.id),
+                func.sum(StageUsage.prompt_tokens),
+                func.sum(StageUsage.completion_tokens),
+                func.sum(StageUsage.total_tokens),
+                func.sum(StageUsage.llm_calls),
+                func.sum(StageUsage.tool_calls),
+                func.sum(StageUsage.cost_usd),
+                func.avg(StageUsage.duration_ms),
+                func.sum(StageUsage.fallback_calls)
+            ).group_by(StageUsage.stage).all()
+
+            token_usage = {}
+            for (stage, runs, prompt, completion, total, llm_calls, tool_calls, cost, avg_ms,
+                 fallback_calls) in usage_rows:
+                token_usage[stage] = {
+                    "runs": runs,
+                    "prompt_tokens": prompt or 0,
+                    "completion_tokens": completion or 0,
+                    "total_tokens": total or 0,
+                    "avg_tokens_per_run": round((total or 0) / runs, 1) if runs else 0,
+                    "llm_calls": llm_calls or 0,
+                    "tool_calls": tool_calls or 0,
+                    "cost_usd": round(cost or 0, 4),
+                    "avg_duration_ms": round(avg_ms or 0),
+                    "fallback_calls": fallback_calls or 0
+                }
+
             return {
                 "research_stats": {
                     "total": total_research,
@@ -191,7 +659,18 @@ async def get_metrics():
                         "slow": len([t for t in completed_times if t >= 120])
                     }
                 },
+                "token_usage": {
+                    "by_stage": token_usage,
+                    "total_tokens": sum(stage["total_tokens"] for stage in token_usage.values()),
+                    "cost_usd": round(sum(stage["cost_usd"] for stage in token_usage.values()), 4)
+                },
+                "stage_timing": stage_timing,
                 "recent_activity": recent_activity,
+                "reaper": reaper_report,
+                "handoffs": handoffs,
+                "upstreams": upstreams,
+                "report_reuse": report_reuse,
+                "retention": retention,
                 "system_status": {
                     "api": "healthy",
                     "database": "connected",
@@ -209,16 +688,18 @@ async def get_metrics():
 async def get_queue_status():
     """Get Redis queue status"""
     try:
-        # Import here to avoid issues if Redis is not available
-        from .worker import trend_queue, news_queue, content_queue, reporting_queue
+        # Every lane of every tenant in one pipelined round trip
+        counts = lane_counts()
+        lanes = {stage: {priority: 0 for priority in PRIORITIES} for stage in STAGES}
+        for stages in counts.values():
+            for stage, priorities in stages.items():
+                for priority, lane in priorities.items():
+                    lanes[stage][priority] += lane['queued']
 
         return {
-            "queues": {
-                "trend_research": trend_queue.count,
-                "news_aggregation": news_queue.count,
-                "content_strategy": content_queue.count,
-                "final_reporting": reporting_queue.count
-            },
+            "queues": {stage: sum(depths.values()) for stage, depths in lanes.items()},
+            "lanes": lanes,
+            "tenants": get_tenant_report(counts),
             "timestamp": datetime.utcnow().isoformat()
         }
 
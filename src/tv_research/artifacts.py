@@ -0,0 +1,184 @@
+"""
+Content-addressed store for report artifacts.
+
+Final reports are saved under the SHA-256 of their content, so concurrent
+workers never collide on a filename, identical reports are stored once and a
+report ID doubles as a strong ETag. The research row keeps the report ID
+(``ResearchResult.report_id``) and ``GET /research/{id}/report`` streams the
+artifact with Range and conditional-GET support.
+
+Backends, selected with ``ARTIFACT_STORE``:
+
+- ``local`` (default): files below ``REPORT_OUTPUT_DIR``/artifacts, e.g. the
+  ``reports`` bind mount shared by the reporting workers and the API
+- ``s3``: any S3-compatible object store (``ARTIFACT_S3_BUCKET``, plus
+  ``ARTIFACT_S3_ENDPOINT_URL`` for MinIO and the like); needs ``boto3``
+"""
+
+import os
+import hashlib
+import tempfile
+from datetime import datetime, timezone
+
+ARTIFACT_STORE = os.getenv('ARTIFACT_STORE', 'local')
+REPORT_OUTPUT_DIR = os.getenv('REPORT_OUTPUT_DIR', 'reports')
+ARTIFACT_S3_BUCKET = os.getenv('ARTIFACT_S3_BUCKET')
+ARTIFACT_S3_PREFIX = os.getenv('ARTIFACT_S3_PREFIX', 'reports/')
+ARTIFACT_S3_ENDPOINT_URL = os.getenv('ARTIFACT_S3_ENDPOINT_URL')
+
+# Bytes per chunk when streaming an artifact
+CHUNK_SIZE = 64 * 1024
+
+_store = None
+
+
+class ArtifactNotFound(Exception):
+    """No artifact is stored under the requested report ID"""
+
+
+def report_id_for(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+class LocalArtifactStore:
+    """Artifacts as files below ``root``, fanned out by the first two hex digits"""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, report_id: str) -> str:
+        return os.path.join(self.root, report_id[:2], f'{report_id}.md')
+
+    def put(self, content: bytes) -> str:
+        report_id = report_id_for(content)
+        path = self._path(report_id)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temporary file and rename, so readers never see a partial report
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        return report_id
+
+    def stat(self, report_id: str) -> tuple:
+        """Size in bytes and modification time of an artifact"""
+        try:
+            info = os.stat(self._path(report_id))
+        except FileNotFoundError:
+            raise ArtifactNotFound(report_id)
+        return info.st_size, datetime.fromtimestamp(info.st_mtime, timezone.utc)
+
+    def delete(self, report_id: str):
+        try:
+            os.remove(self._path(report_id))
+        except FileNotFoundError:
+            pass
+
+    def read(self, report_id: str, start: int = 0, end: int = None):
+        """Yield the bytes ``start``..``end`` (inclusive) of an artifact in chunks"""
+        try:
+            f = open(self._path(report_id), 'rb')
+        except FileNotFoundError:
+            raise ArtifactNotFound(report_id)
+        with f:
+            f.seek(start)
+            remaining = None if end is None else end - start + 1
+            while remaining is None or remaining > 0:
+                chunk = f.read(CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+
+class S3ArtifactStore:
+    """Artifacts as objects of an S3-compatible bucket"""
+
+    def __init__(self, bucket: str, prefix: str = '', endpoint_url: str = None):
+        try:
+            import boto3
+        except ImportError:
+            raise RuntimeError("ARTIFACT_STORE=s3 needs boto3 (pip install boto3)")
+        self.client = boto3.client('s3', endpoint_url=endpoint_url)
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def _key(self, report_id: str) -> str:
+        return f'{self.prefix}{report_id[:2]}/{report_id}.md'
+
+    def put(self, content: bytes) -> str:
+        report_id = report_id_for(content)
+        try:
+            self.stat(report_id)
+        except ArtifactNotFound:
+            self.client.put_object(
+                Bucket=self.bucket, Key=self._key(report_id), Body=content,
+                ContentType='text/markdown; charset=utf-8'
+            )
+        return report_id
+
+    def stat(self, report_id: str) -> tuple:
+        from botocore.exceptions import ClientError
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=self._key(report_id))
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                raise ArtifactNotFound(report_id)
+            raise
+        return head['ContentLength'], head['LastModified']
+
+    def delete(self, report_id: str):
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(report_id))
+
+    def read(self, report_id: str, start: int = 0, end: int = None):
+        byte_range = f"bytes={start}-{'' if end is None else end}"
+        body = self.client.get_object(Bucket=self.bucket, Key=self._key(report_id), Range=byte_range)['Body']
+        try:
+            yield from body.iter_chunks(CHUNK_SIZE)
+        finally:
+            body.close()
+
+
+def get_store():
+    """The configured artifact store"""
+    global _store
+    if _store is None:
+        if ARTIFACT_STORE == 's3':
+            if not ARTIFACT_S3_BUCKET:
+                raise RuntimeError("ARTIFACT_STORE=s3 needs ARTIFACT_S3_BUCKET")
+            _store = S3ArtifactStore(ARTIFACT_S3_BUCKET, ARTIFACT_S3_PREFIX, ARTIFACT_S3_ENDPOINT_URL)
+        else:
+            _store = LocalArtifactStore(os.path.join(REPORT_OUTPUT_DIR, 'artifacts'))
+    return _store
+
+
+def save_report(content: str) -> str:
+    """Store a report and return its report ID"""
+    return get_store().put(content.encode('utf-8'))
+
+
+def parse_range(header: str, size: int):
+    """First and last byte of a single ``bytes=`` range, or None for the whole artifact.
+
+    Malformed and multi-range headers are ignored, as RFC 9110 allows; a range
+    starting beyond the end raises ValueError (HTTP 416).
+    """
+    spec = (header or '').strip()
+    if not spec.startswith('bytes=') or ',' in spec:
+        return None
+    first, separator, last = (part.strip() for part in spec[len('bytes='):].partition('-'))
+    if not separator or not (first or last) or not all(part.isdigit() for part in (first, last) if part):
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        if int(last) == 0 or size == 0:
+            raise ValueError(f"Range not satisfiable: {header}")
+        return max(0, size - int(last)), size - 1
+    start, end = int(first), int(last) if last else None
+    if end is not None and end < start:
+        return None
+    if start >= size:
+        raise ValueError(f"Range not satisfiable: {header}")
+    return start, size - 1 if end is None else min(end, size - 1)
@@ -0,0 +1,124 @@
+"""
+Batched trend research for multi-topic requests.
+
+``POST /research/batch`` with ``batch_trend`` researches the trends of up to
+``TREND_BATCH_MAX_TOPICS`` topics in a single trend agent run instead of one
+run per topic. The agent answers with one JSON object holding an analysis per
+topic, which is split back into the trend stage output of each research run;
+the downstream stages then run per topic as usual. Token usage of the shared
+run is split evenly between the research runs.
+
+Topics missing from the batched answer get their own trend stage, so a
+partially parsed answer never fails a research run.
+"""
+
+import re
+import json
+
+from crewai import Task
+
+from .crew import TVResearchCrew
+# Enqueuing a batch needs no crewai, so the API imports it from queue_client
+from .queue_client import TREND_BATCH_MAX_TOPICS, chunk_batch, enqueue_batch_trend
+from .refresh import split_sections
+from .resilience import CircuitOpenError
+from .reuse import normalize_topic
+from .usage import track_stage_usage
+from .worker import (
+    complete_stage, current_job_id, defer_stage, enqueue_stage, run_news_aggregation, run_trend_research,
+    update_task_status, with_heartbeat
+)
+
+_FENCE_RE = re.compile(r'^```[\w-]*\s*|\s*```\s*$')
+
+
+def batch_context(inputs_list: list) -> dict:
+    """Agent context of a batch: the topics plus the inputs all runs share"""
+    shared = {
+        key: value for key, value in inputs_list[0].items()
+        if key != 'research_focus' and all(inputs.get(key) == value for inputs in inputs_list)
+    }
+    topics = [inputs['research_focus'] for inputs in inputs_list]
+    return {**shared, 'research_topics': '\n'.join(f'- {topic}' for topic in topics)}
+
+
+def parse_json_object(text: str):
+    """The JSON object in an agent answer, ignoring code fences and surrounding prose"""
+    text = _FENCE_RE.sub('', text.strip())
+    start, end = text.find('{'), text.rfind('}')
+    if start < 0 or end <= start:
+        return None
+    try:
+        return json.loads(text[start:end + 1])
+    except ValueError:
+        return None
+
+
+def parse_batch_result(text: str, topics: list) -> dict:
+    """Map the normalized key of each topic to its analysis in a batched answer.
+
+    Falls back to markdown sections headed by the topic when the answer is not
+    valid JSON or misses topics.
+    """
+    wanted = {normalize_topic(topic) for topic in topics}
+    analyses = {}
+
+    payload = parse_json_object(text or '')
+    items = payload.get('topics') if isinstance(payload, dict) else None
+    for item in items if isinstance(items, list) else []:
+        if not isinstance(item, dict):
+            continue
+        key = normalize_topic(str(item.get('topic') or ''))
+        analysis = item.get('analysis')
+        if not isinstance(analysis, str):
+            analysis = json.dumps(analysis, indent=2) if analysis else ''
+        if key in wanted and analysis.strip():
+            analyses.setdefault(key, analysis.strip())
+
+    if len(analyses) < len(wanted):
+        _, sections = split_sections(text)
+        for _, title, body in sections:
+            key = normalize_topic(title)
+            if key in wanted and body:
+                analyses.setdefault(key, body)
+    return analyses
+
+
+@with_heartbeat('trend_research')
+def run_batch_trend_research(task_ids: list, inputs_list: list, priority: str = 'normal'):
+    """Research the trends of several topics in one agent run"""
+    try:
+        for task_id in task_ids:
+            update_task_status(task_id, 'running', job_id=current_job_id())
+
+        crew = TVResearchCrew()
+        trend_agent = crew.trend_researcher()
+        trend_task = Task(config=crew.tasks_config['trend_research_batch_task'])
+
+        with track_stage_usage(task_ids, 'trend_research', trend_agent, trend_task):
+            output = str(trend_agent.execute_task(trend_task, batch_context(inputs_list)))
+
+        analyses = parse_batch_result(output, [inputs['research_focus'] for inputs in inputs_list])
+        for task_id, inputs in zip(task_ids, inputs_list):
+            analysis = analyses.get(normalize_topic(inputs['research_focus']))
+            if not analysis:
+                # Not in the batched answer: research the topic on its own
+                print(f"Batched trend stage missed topic of task {task_id}; running it separately")
+                job = enqueue_stage('trend_research', run_trend_research, task_id, inputs, priority=priority)
+                update_task_status(task_id, 'queued', job_id=job.id)
+                continue
+            complete_stage(
+                task_id, 'trend_research', analysis,
+                'news_aggregation', run_news_aggregation, task_id, inputs, analysis, priority=priority
+            )
+
+        print(f"Batched trend stage split into {len(analyses)} of {len(task_ids)} topics")
+        return output
+
+    except CircuitOpenError as e:
+        defer_stage(task_ids, 'trend_research', run_batch_trend_research, e, inputs_list, priority=priority)
+        return None
+    except Exception as e:
+        for task_id in task_ids:
+            update_task_status(task_id, 'failed', error_message=str(e))
+        raise
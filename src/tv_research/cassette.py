@@ -0,0 +1,211 @@
+"""
+Record and replay of crew runs.
+
+While a cassette is recording, every LLM completion (``RateLimitedLLM.call``)
+and every search or scrape call (``tools/rate_limited.py``) of the run is
+appended to a gzip-compressed JSON lines file together with its duration. The
+first line holds the research inputs, so a replay sends the same prompts.
+
+Replaying a cassette serves the recorded responses in order instead of
+calling the providers, either with the recorded durations (``timing=
+'recorded'``) or immediately (``timing='zero'``). Replays are deterministic
+and free, which makes them suitable for profiling the pipeline and storage
+overheads in isolation and for re-running production incidents locally.
+Replayed LLM calls do not report token usage.
+
+Research runs of the API are recorded by the workers: with ``"record": true``
+on ``POST /research``, or for every run of a tenant in
+``CASSETTE_RECORD_TENANTS``, each stage job records a cassette part to
+``CASSETTE_DIR/research-{id}/``. A cassette opened on that directory replays
+the parts of the run in the order they were recorded.
+"""
+
+import os
+import json
+import gzip
+import time
+import hashlib
+import threading
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from datetime import datetime
+
+CASSETTE_VERSION = 1
+
+# Worker-side recordings, one directory per research run
+CASSETTE_DIR = os.getenv('CASSETTE_DIR', 'data/cassettes')
+# Tenants whose research runs are always recorded
+CASSETTE_RECORD_TENANTS = {
+    tenant.strip() for tenant in os.getenv('CASSETTE_RECORD_TENANTS', '').split(',') if tenant.strip()
+}
+RECORD_KEY_PREFIX = 'tv_research:cassette:record'
+# Seconds a run stays marked for recording
+RECORD_TTL = 7 * 86400
+
+_active = None
+
+
+class CassetteError(Exception):
+    """A replayed run asked for a call the cassette does not contain"""
+
+
+def _digest(payload) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+class Cassette:
+    """LLM and tool calls of one crew run, recorded to or replayed from ``path``"""
+
+    def __init__(self, path: str, mode: str = 'replay', timing: str = 'recorded'):
+        if mode not in ('record', 'replay'):
+            raise ValueError(f"Cassette mode must be 'record' or 'replay', not {mode!r}")
+        if timing not in ('recorded', 'zero'):
+            raise ValueError(f"Cassette timing must be 'recorded' or 'zero', not {timing!r}")
+        self.path = path
+        self.mode = mode
+        self.timing = timing
+        self.header = {}
+        self.mismatches = 0
+        self._lock = threading.Lock()
+        self._file = None
+        self._streams = defaultdict(deque)
+
+        if mode == 'replay':
+            # A directory holds the parts of a run recorded by the workers
+            parts = sorted(
+                os.path.join(path, name) for name in os.listdir(path) if name.endswith('.jsonl.gz')
+            ) if os.path.isdir(path) else [path]
+            for part in parts:
+                with gzip.open(part, 'rt', encoding='utf-8') as f:
+                    header = json.loads(f.readline())
+                    self.header = self.header or header
+                    for line in f:
+                        entry = json.loads(line)
+                        self._streams[entry['stream']].append(entry)
+
+    @property
+    def inputs(self) -> dict:
+        """Research inputs of the recorded run"""
+        return self.header.get('inputs') or {}
+
+    def start(self, inputs: dict = None, **metadata):
+        """Begin recording; writes the header line"""
+        if self.mode != 'record':
+            return
+        self.header = {
+            'version': CASSETTE_VERSION,
+            'recorded_at': datetime.utcnow().isoformat(),
+            'inputs': inputs or {},
+            **metadata,
+        }
+        self._file = gzip.open(self.path, 'wt', encoding='utf-8')
+        self._write(self.header)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _write(self, entry: dict):
+        self._file.write(json.dumps(entry, default=str, separators=(',', ':')) + '\n')
+        self._file.flush()
+
+    def call(self, stream: str, request, func):
+        """Run ``func`` and record its result, or replay the next result of ``stream``"""
+        if self.mode == 'replay':
+            return self._replay(stream, request)
+
+        started = time.monotonic()
+        entry = {'stream': stream, 'request': request, 'request_hash': _digest(request)}
+        try:
+            entry['response'] = func()
+            return entry['response']
+        except Exception as e:
+            entry['error'] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            entry['duration'] = round(time.monotonic() - started, 3)
+            with self._lock:
+                if self._file is not None:
+                    self._write(entry)
+
+    def _replay(self, stream: str, request):
+        with self._lock:
+            if not self._streams[stream]:
+                raise CassetteError(f"Cassette {self.path} has no more recorded {stream} calls")
+            entry = self._streams[stream].popleft()
+            if entry.get('request_hash') != _digest(request):
+                self.mismatches += 1
+        if self.timing == 'recorded':
+            time.sleep(entry.get('duration') or 0)
+        if 'error' in entry:
+            raise CassetteError(f"Recorded failure: {entry['error']}")
+        return entry.get('response')
+
+    def remaining(self) -> dict:
+        """Recorded calls per stream that were not replayed"""
+        return {stream: len(entries) for stream, entries in self._streams.items() if entries}
+
+
+def active_cassette():
+    """The cassette of the current run, if any"""
+    return _active
+
+
+@contextmanager
+def use_cassette(cassette: Cassette):
+    """Route the LLM and tool calls of the enclosed run through ``cassette``"""
+    global _active
+    previous, _active = _active, cassette
+    try:
+        yield cassette
+    finally:
+        _active = previous
+        cassette.close()
+
+
+def _redis():
+    # Only worker-side recording needs Redis; in-process runs never connect
+    from .queue_client import redis_conn
+    return redis_conn
+
+
+def run_cassette_dir(research_id: int) -> str:
+    """Directory of the cassette parts recorded for a research run"""
+    return os.path.join(CASSETTE_DIR, f'research-{research_id}')
+
+
+def enable_recording(research_id: int):
+    """Have the workers record every stage of a research run"""
+    _redis().set(f'{RECORD_KEY_PREFIX}:{research_id}', 1, ex=RECORD_TTL)
+
+
+def recording_enabled(research_id: int, tenant: str = None) -> bool:
+    if tenant in CASSETTE_RECORD_TENANTS:
+        return True
+    try:
+        return bool(_redis().exists(f'{RECORD_KEY_PREFIX}:{research_id}'))
+    except Exception as e:
+        print(f"Could not look up cassette recording of research {research_id}: {e}")
+        return False
+
+
+@contextmanager
+def record_stage(research_id: int, stage: str, inputs: dict = None, **metadata):
+    """Record the enclosed stage job as the next cassette part of its research run"""
+    part = _redis().incr(f'{RECORD_KEY_PREFIX}:{research_id}:parts')
+    _redis().expire(f'{RECORD_KEY_PREFIX}:{research_id}:parts', RECORD_TTL)
+    directory = run_cassette_dir(research_id)
+    os.makedirs(directory, exist_ok=True)
+    cassette = Cassette(os.path.join(directory, f'{part:03d}-{stage}.jsonl.gz'), 'record')
+    cassette.start(inputs, research_id=research_id, stage=stage, **metadata)
+    with use_cassette(cassette):
+        yield cassette
+
+
+def cassette_call(stream: str, request, func):
+    """Call ``func`` through the active cassette, or directly without one"""
+    cassette = _active
+    if cassette is None:
+        return func()
+    return cassette.call(stream, request, func)
@@ -0,0 +1,317 @@
+"""
+Context compaction between pipeline stages.
+
+Each worker stage passes the raw output of every previous stage on to the next
+agent. This module shrinks those upstream outputs to a per-stage token budget
+before they are placed into the agent's context, while the full text is kept
+in the database (see ``StageOutput``) for reference and for the final report.
+"""
+
+import os
+import re
+from functools import lru_cache
+
+DEFAULT_MODEL = os.getenv('MODEL') or os.getenv('OPENAI_MODEL_NAME') or os.getenv('OPENAI_MODEL', 'gpt-4o-mini')
+
+# Total token budget for upstream context, per consuming stage
+STAGE_BUDGETS = {
+    'news_aggregation': 2000,
+    'content_strategy': 3000,
+    'final_reporting': 4000,
+    # Incremental refresh stages (see refresh.py)
+    'news_refresh': 3000,
+    'content_strategy_refresh': 4000,
+    'reporting_refresh': 3000,
+}
+
+# How each stage's budget is shared between upstream outputs. The most recent
+# upstream output gets the largest share; unused share is redistributed.
+STAGE_CONTEXT_WEIGHTS = {
+    'news_aggregation': {'trend_analysis': 1.0},
+    'content_strategy': {'trend_analysis': 0.35, 'news_analysis': 0.65},
+    'final_reporting': {'trend_analysis': 0.2, 'news_analysis': 0.3, 'content_strategy': 0.5},
+    'news_refresh': {'trend_analysis': 0.3, 'previous_news': 0.7},
+    'content_strategy_refresh': {'previous_strategy': 0.6, 'news_delta': 0.4},
+    'reporting_refresh': {'news_delta': 0.4, 'strategy_delta': 0.6},
+}
+
+COMPACTION_MODES = ('extractive', 'llm', 'off')
+
+# Share of an extractive summary's budget headings may take, so body text always fits
+HEADING_BUDGET_SHARE = 0.5
+
+# Pipeline stage whose agent reads the context of each refresh stage
+REFRESH_STAGES = {
+    'news_refresh': 'news_aggregation',
+    'content_strategy_refresh': 'content_strategy',
+    'reporting_refresh': 'final_reporting',
+}
+
+_TOP_HEADING_RE = re.compile(r'^\s*(#{1,2})\s')
+_HEADING_RE = re.compile(r'^\s*(#{3,6}\s|\*\*[^*]+\*\*\s*:?\s*$|\d+\.\s+[A-Z][A-Z0-9 &/\-]{3,}:?\s*$|[A-Z0-9][A-Z0-9 &/\-]{3,}:?\s*$)')
+_LIST_ITEM_RE = re.compile(r'^\s*([-*•]|\d+[.)])\s+')
+_SENTENCE_RE = re.compile(r'(?<=[.!?])\s+')
+
+
+def get_compaction_mode() -> str:
+    """Return the configured compaction mode (extractive, llm or off)"""
+    mode = os.getenv('CONTEXT_COMPACTION_MODE', 'extractive').strip().lower()
+    return mode if mode in COMPACTION_MODES else 'extractive'
+
+
+def get_stage_budget(stage: str) -> int:
+    """Return the upstream context token budget for a stage.
+
+    Can be overridden per stage with e.g. ``CONTEXT_BUDGET_FINAL_REPORTING=6000``.
+    """
+    override = os.getenv(f'CONTEXT_BUDGET_{stage.upper()}')
+    if override:
+        try:
+            return int(override)
+        except ValueError:
+            print(f"Ignoring invalid CONTEXT_BUDGET_{stage.upper()}={override!r}")
+    return STAGE_BUDGETS.get(stage, 0)
+
+
+@lru_cache(maxsize=8)
+def _get_encoding(model: str):
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        pass
+    except Exception:
+        # Encoding files could not be loaded (e.g. no network access)
+        return None
+    try:
+        return tiktoken.get_encoding('cl100k_base')
+    except Exception:
+        return None
+
+
+def count_tokens(text: str, model: str = None) -> int:
+    """Count tokens with the model's tokenizer, falling back to ~4 chars per token"""
+    if not text:
+        return 0
+    encoding = _get_encoding(model or DEFAULT_MODEL)
+    if encoding is None:
+        return max(1, len(text) // 4)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def allocate_budget(sizes: dict, weights: dict, total: int) -> dict:
+    """Split ``total`` tokens between keys proportionally to ``weights``.
+
+    Keys whose content is already smaller than their share keep their full size
+    and the remainder is redistributed to the others.
+    """
+    allocation = {}
+    remaining = dict(sizes)
+    budget = total
+    while remaining:
+        weight_sum = sum(weights.get(key, 1.0) for key in remaining) or 1.0
+        fits = {
+            key: size for key, size in remaining.items()
+            if size <= budget * weights.get(key, 1.0) / weight_sum
+        }
+        if not fits:
+            for key in remaining:
+                allocation[key] = int(budget * weights.get(key, 1.0) / weight_sum)
+            break
+        for key, size in fits.items():
+            allocation[key] = size
+            budget -= size
+            del remaining[key]
+    return allocation
+
+
+def _split_units(text: str) -> list:
+    """Split text into ``(priority, block, line, heading, text)`` units; lower priority is kept first"""
+    units = []
+    for block_index, block in enumerate(re.split(r'\n\s*\n', text.strip())):
+        lines = [line for line in block.splitlines() if line.strip()]
+        for index, line in enumerate(lines):
+            top = _TOP_HEADING_RE.match(line)
+            if top:
+                # A '#' title outranks '##' sections
+                units.append((0 if top.group(1) == '#' else 1, block_index, index, True, line.strip()))
+            elif _HEADING_RE.match(line):
+                units.append((2, block_index, index, True, line.strip()))
+            elif _LIST_ITEM_RE.match(line):
+                sentences = _SENTENCE_RE.split(line.strip(), maxsplit=1)
+                units.append((2, block_index, index, False, sentences[0]))
+                if len(sentences) > 1:
+                    units.append((4, block_index, index, False, sentences[1]))
+            else:
+                sentences = _SENTENCE_RE.split(line.strip())
+                for position, sentence in enumerate(sentences):
+                    priority = 2 if index == 0 and position == 0 else 3 if position == 0 else 4
+                    units.append((priority, block_index, index, False, sentence))
+    return units
+
+
+def truncate_tokens(text: str, max_tokens: int, model: str = None) -> str:
+    """Cut text to at most ``max_tokens`` tokens"""
+    if count_tokens(text, model) <= max_tokens:
+        return text
+    encoding = _get_encoding(model or DEFAULT_MODEL)
+    if encoding is None:
+        return text[:max_tokens * 4].rstrip()
+    return encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens]).rstrip()
+
+
+def _lead_paragraph(units: list) -> str:
+    """Body text of the first block that has any, else the first block"""
+    blocks = {}
+    for _, block, _, heading, unit in units:
+        blocks.setdefault(block, []).append((heading, unit))
+    for block in sorted(blocks):
+        body = [unit for heading, unit in blocks[block] if not heading]
+        if body:
+            return ' '.join(body)
+    return ' '.join(unit for _, unit in blocks.get(0, []))
+
+
+def _top_level(unit: tuple) -> int:
+    """1 for a '#' heading, 2 for '##', 0 for anything else"""
+    match = _TOP_HEADING_RE.match(unit[4]) if unit[3] else None
+    return len(match.group(1)) if match else 0
+
+
+def extractive_summary(text: str, max_tokens: int, model: str = None) -> str:
+    """Shrink text to ``max_tokens`` by keeping headings, list items and lead sentences.
+
+    Units are selected by priority but emitted in their original order, so the
+    structure of the upstream report is preserved. Headings may take at most
+    ``HEADING_BUDGET_SHARE`` of the budget so body text always fits; when none
+    does, the lead paragraph is cut to the budget instead.
+    """
+    if count_tokens(text, model) <= max_tokens:
+        return text
+    max_tokens = max(1, max_tokens)
+
+    units = _split_units(text)
+    order = sorted(range(len(units)), key=lambda i: (units[i][0], i))
+    costs = [count_tokens(unit[4], model) + 1 for unit in units]
+    selected = set()
+    used = 0
+    heading_budget = int(max_tokens * HEADING_BUDGET_SHARE)
+    for i in order:
+        if units[i][3] and used + costs[i] <= heading_budget:
+            selected.add(i)
+            used += costs[i]
+    for i in order:
+        if units[i][3]:
+            continue
+        if used + costs[i] > max_tokens:
+            break
+        selected.add(i)
+        used += costs[i]
+
+    kept = sorted(selected)
+    # Drop top-level headings whose section content did not make the cut: a
+    # '#' title needs anything after it, a '##' section some text of its own
+    kept = [
+        i for position, i in enumerate(kept)
+        if not _top_level(units[i])
+        or (position + 1 < len(kept) and (
+            _top_level(units[i]) == 1 or _top_level(units[kept[position + 1]]) == 0
+        ))
+    ]
+    if not any(not units[i][3] for i in kept):
+        return truncate_tokens(_lead_paragraph(units), max_tokens, model)
+
+    parts = []
+    previous = None
+    for i in kept:
+        _, block, line, _, unit = units[i]
+        if previous is not None:
+            parts.append(' ' if previous == (block, line) else '\n' if previous[0] == block else '\n\n')
+        parts.append(unit)
+        previous = (block, line)
+    return ''.join(parts).strip()
+
+
+def llm_summary(text: str, max_tokens: int, model: str = None) -> str:
+    """Summarize text with an LLM, falling back to extractive summarization"""
+    try:
+        from .llm import build_llm
+
+        llm = build_llm(os.getenv('COMPACTION_MODEL', model or DEFAULT_MODEL), max_tokens=max_tokens)
+        summary = llm.call([
+            {
+                'role': 'system',
+                'content': (
+                    'You compress research notes for a TV newsroom. Keep every topic, '
+                    'named source, figure and date. Drop repetition and filler.'
+                ),
+            },
+            {
+                'role': 'user',
+                'content': f"Summarize in at most {max_tokens} tokens:\n\n{text}",
+            },
+        ])
+        summary = str(summary).strip()
+        if summary and count_tokens(summary, model) <= max_tokens:
+            return summary
+        return extractive_summary(summary or text, max_tokens, model)
+    except Exception as e:
+        print(f"LLM compaction failed, using extractive summary: {e}")
+        return extractive_summary(text, max_tokens, model)
+
+
+def compact_text(text: str, max_tokens: int, model: str = None, mode: str = None) -> str:
+    """Compact a single upstream output to ``max_tokens``"""
+    mode = mode or get_compaction_mode()
+    original_tokens = count_tokens(text, model)
+    if mode == 'off' or original_tokens <= max_tokens:
+        return text
+
+    # Leave room for the compaction note appended below
+    target = max(1, max_tokens - 24)
+    if mode == 'llm':
+        compacted = llm_summary(text, target, model)
+    else:
+        compacted = extractive_summary(text, target, model)
+
+    return (
+        f"{compacted}\n\n[Compacted from {original_tokens} to "
+        f"{count_tokens(compacted, model)} tokens; full text stored with the research run]"
+    )
+
+
+def compact_context(inputs: dict, stage: str, model: str = None) -> tuple:
+    """Return a copy of ``inputs`` with upstream outputs compacted for ``stage``.
+
+    Returns a ``(compacted_inputs, stats)`` tuple where ``stats`` maps each
+    compacted key to its original and compacted token counts.
+    """
+    weights = STAGE_CONTEXT_WEIGHTS.get(stage, {})
+    keys = [key for key in weights if inputs.get(key)]
+    compacted = dict(inputs)
+    stats = {}
+    if not keys or get_compaction_mode() == 'off':
+        return compacted, stats
+
+    if model is None:
+        # Tokens are counted for the model of the agent reading the context
+        from .routing import stage_model
+        model = stage_model(REFRESH_STAGES.get(stage, stage))
+
+    sizes = {key: count_tokens(str(inputs[key]), model) for key in keys}
+    allocation = allocate_budget(sizes, weights, get_stage_budget(stage))
+
+    for key in keys:
+        compacted[key] = compact_text(str(inputs[key]), allocation[key], model)
+        stats[key] = {
+            'original_tokens': sizes[key],
+            'compacted_tokens': count_tokens(compacted[key], model),
+        }
+
+    original = sum(s['original_tokens'] for s in stats.values())
+    final = sum(s['compacted_tokens'] for s in stats.values())
+    print(f"[{stage}] context compacted from {original} to {final} tokens")
+    return compacted, stats
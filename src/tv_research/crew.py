@@ -1,8 +1,10 @@
 from crewai import Agent, Crew, Process, Task
 from crewai.project import CrewBase, agent, crew, task
-from crewai_tools import SerperDevTool, ScrapeWebsiteTool
 from datetime import datetime
 
+from .routing import build_stage_llm
+from .tools import RateLimitedScrapeWebsiteTool, RateLimitedSerperDevTool
+
 
 @CrewBase
 class TVResearchCrew:
@@ -13,14 +15,15 @@ class TVResearchCrew:
 
     def __init__(self):
         # Initialize tools that will be shared across agents
-        self.search_tool = SerperDevTool()
-        self.scrape_tool = ScrapeWebsiteTool()
+        self.search_tool = RateLimitedSerperDevTool()
+        self.scrape_tool = RateLimitedScrapeWebsiteTool()
 
     @agent
     def trend_researcher(self) -> Agent:
         return Agent(
             config=self.agents_config['trend_researcher'],
             tools=[self.search_tool, self.scrape_tool],
+            llm=build_stage_llm('trend_research'),
             verbose=True,
             allow_delegation=False
         )
@@ -30,6 +33,7 @@ class TVResearchCrew:
         return Agent(
             config=self.agents_config['news_aggregator'],
             tools=[self.search_tool, self.scrape_tool],
+            llm=build_stage_llm('news_aggregation'),
             verbose=True,
             allow_delegation=False
         )
@@ -38,6 +42,7 @@ class TVResearchCrew:
     def content_strategist(self) -> Agent:
         return Agent(
             config=self.agents_config['content_strategist'],
+            llm=build_stage_llm('content_strategy'),
             verbose=True,
             allow_delegation=False
         )
@@ -46,6 +51,7 @@ class TVResearchCrew:
     def reporting_analyst(self) -> Agent:
         return Agent(
             config=self.agents_config['reporting_analyst'],
+            llm=build_stage_llm('final_reporting'),
             verbose=True,
             allow_delegation=False
         )
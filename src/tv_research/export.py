@@ -0,0 +1,93 @@
+"""
+Streaming export of research history.
+
+``GET /research/export`` writes research runs as NDJSON or CSV while they are
+read from the database, so a year of history is one request with constant
+memory. Rows are fetched in batches of ``EXPORT_BATCH_SIZE`` through a
+streaming cursor (server-side on PostgreSQL) in ID order; report bodies are
+only selected when requested.
+"""
+
+import io
+import os
+import csv
+import json
+from datetime import datetime
+
+from .models import ResearchResult, SessionLocal
+
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', '500'))
+
+EXPORT_FIELDS = [
+    'id', 'topic', 'status', 'priority', 'created_at', 'completed_at', 'execution_time',
+    'schedule_name', 'parent_id', 'report_id', 'tenant', 'error_message',
+]
+BODY_FIELD = 'result_content'
+
+
+def filter_research(query, since: datetime = None, until: datetime = None, statuses: list = None, topic: str = None):
+    """Restrict a ResearchResult query by creation date range, status and topic substring"""
+    if since:
+        query = query.filter(ResearchResult.created_at >= since)
+    if until:
+        query = query.filter(ResearchResult.created_at < until)
+    if statuses:
+        query = query.filter(ResearchResult.status.in_(statuses))
+    if topic:
+        pattern = topic.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        query = query.filter(ResearchResult.topic.ilike(f'%{pattern}%', escape='\\'))
+    return query
+
+
+def export_rows(since: datetime = None, until: datetime = None, statuses: list = None,
+                topic: str = None, include_body: bool = False):
+    """Yield matching research runs as dicts, oldest first"""
+    fields = EXPORT_FIELDS + ([BODY_FIELD] if include_body else [])
+    db = SessionLocal()
+    try:
+        query = db.query(*[getattr(ResearchResult, field) for field in fields])
+        query = filter_research(query, since, until, statuses, topic)
+        query = query.order_by(ResearchResult.id.asc()).execution_options(
+            stream_results=True, yield_per=EXPORT_BATCH_SIZE
+        )
+        for row in query:
+            yield {
+                field: value.isoformat() if isinstance(value, datetime) else value
+                for field, value in zip(fields, row)
+            }
+    finally:
+        db.close()
+
+
+def _chunked(lines, size: int = 64 * 1024):
+    """Join lines into chunks of about ``size`` characters"""
+    chunk, length = [], 0
+    for line in lines:
+        chunk.append(line)
+        length += len(line)
+        if length >= size:
+            yield ''.join(chunk)
+            chunk, length = [], 0
+    if chunk:
+        yield ''.join(chunk)
+
+
+def to_ndjson(rows):
+    return _chunked(json.dumps(row) + '\n' for row in rows)
+
+
+def to_csv(rows, include_body: bool = False):
+    fields = EXPORT_FIELDS + ([BODY_FIELD] if include_body else [])
+
+    def lines():
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=fields)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+
+    return _chunked(lines())
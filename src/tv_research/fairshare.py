@@ -0,0 +1,136 @@
+"""
+Weighted fair sharing of the stage workers between tenants.
+
+Every tenant has its own lanes (see queue_client.py), so one producer
+submitting a large batch no longer queues everyone else behind it. Before
+each dequeue a worker orders the lanes it listens to by priority first, then
+by tenant in start-time fair queuing order: each stage keeps a virtual time per
+tenant in Redis that advances by ``1 / weight`` for every job the tenant
+starts, and lanes of the tenant with the lowest virtual time come first. A
+tenant that was idle restarts at the stage's virtual clock (the start tag of
+the latest job), so it cannot claim the time it did not use.
+
+Configuration, as comma separated ``tenant=value`` pairs where ``*`` sets the
+value of unlisted tenants:
+
+- ``TENANT_WEIGHTS``: share of the workers, e.g. ``newsdesk=4,archive=1``
+  (default 1)
+- ``TENANT_MAX_CONCURRENCY``: jobs a tenant may run at once in each stage
+  across all workers, e.g. ``archive=2`` (default 0, unlimited). Lanes of a
+  tenant at its quota are left out of the dequeue order; workers check the
+  quota independently, so it can be exceeded briefly by concurrent dequeues.
+
+Worker order is re-evaluated before every job and at least every
+``FAIR_SHARE_REFRESH_SECONDS`` while the workers wait.
+"""
+
+import os
+
+from .queue_client import PRIORITIES, get_queue, known_tenants, lane_counts, redis_conn
+
+FAIR_SHARE_REFRESH_SECONDS = int(os.getenv('FAIR_SHARE_REFRESH_SECONDS', '5'))
+
+KEY_PREFIX = 'tv_research:fair'
+CLOCK_FIELD = '__clock__'
+
+# KEYS[1] virtual times of a stage; ARGV[1] tenant, ARGV[2] cost (1 / weight).
+# Returns the start tag of the job.
+CHARGE_SCRIPT = """
+local clock = tonumber(redis.call('HGET', KEYS[1], '__clock__') or '0')
+local start = math.max(tonumber(redis.call('HGET', KEYS[1], ARGV[1]) or '0'), clock)
+redis.call('HSET', KEYS[1], '__clock__', tostring(start), ARGV[1], tostring(start + tonumber(ARGV[2])))
+return tostring(start)
+"""
+
+_charge = None
+
+
+def parse_tenant_map(value: str) -> dict:
+    """``{tenant: number}`` from ``tenant=number`` pairs separated by commas"""
+    mapping = {}
+    for item in (value or '').split(','):
+        tenant, separator, number = item.partition('=')
+        if not separator or not tenant.strip():
+            continue
+        try:
+            mapping[tenant.strip()] = float(number)
+        except ValueError:
+            print(f"Ignoring invalid tenant setting '{item.strip()}'")
+    return mapping
+
+
+TENANT_WEIGHTS = parse_tenant_map(os.getenv('TENANT_WEIGHTS', ''))
+TENANT_MAX_CONCURRENCY = parse_tenant_map(os.getenv('TENANT_MAX_CONCURRENCY', ''))
+
+
+def tenant_weight(tenant: str) -> float:
+    weight = TENANT_WEIGHTS.get(tenant, TENANT_WEIGHTS.get('*', 1.0))
+    return weight if weight > 0 else 1.0
+
+
+def tenant_quota(tenant: str) -> int:
+    """Jobs the tenant may run at once per stage; 0 means unlimited"""
+    return int(TENANT_MAX_CONCURRENCY.get(tenant, TENANT_MAX_CONCURRENCY.get('*', 0)))
+
+
+def vtime_key(stage: str) -> str:
+    return f'{KEY_PREFIX}:{stage}'
+
+
+def virtual_times(stages: list) -> dict:
+    """``{stage: {tenant: virtual time}}``, including the stage's ``__clock__``"""
+    pipe = redis_conn.pipeline(transaction=False)
+    for stage in stages:
+        pipe.hgetall(vtime_key(stage))
+    return {
+        stage: {field.decode(): float(value) for field, value in values.items()}
+        for stage, values in zip(stages, pipe.execute())
+    }
+
+
+def charge(stage: str, tenant: str) -> float:
+    """Advance the tenant's virtual time for a job it starts in ``stage``"""
+    global _charge
+    if _charge is None:
+        _charge = redis_conn.register_script(CHARGE_SCRIPT)
+    return float(_charge(keys=[vtime_key(stage)], args=[tenant, 1.0 / tenant_weight(tenant)]))
+
+
+def fair_lanes(stages: list) -> list:
+    """Queues of ``stages`` in dequeue order: by priority, then fair share between tenants under quota"""
+    tenants = known_tenants()
+    counts = lane_counts(tenants, stages)
+    vtimes = virtual_times(stages)
+
+    lanes = []
+    for priority in PRIORITIES:
+        for stage in stages:
+            clock = vtimes[stage].get(CLOCK_FIELD, 0.0)
+            eligible = []
+            for tenant in tenants:
+                quota = tenant_quota(tenant)
+                running = sum(lane['running'] for lane in counts[tenant][stage].values())
+                if quota and running >= quota:
+                    continue
+                start = max(vtimes[stage].get(tenant, 0.0), clock)
+                eligible.append((start, -tenant_weight(tenant), tenant))
+            lanes.extend(get_queue(stage, priority, tenant) for _, _, tenant in sorted(eligible))
+    return lanes
+
+
+def get_tenant_report(counts: dict) -> dict:
+    """Per-tenant queued and running jobs per stage with weight and quota, from ``lane_counts``"""
+    return {
+        tenant: {
+            'weight': tenant_weight(tenant),
+            'max_concurrency': tenant_quota(tenant),
+            'stages': {
+                stage: {
+                    'queued': sum(lane['queued'] for lane in lanes.values()),
+                    'running': sum(lane['running'] for lane in lanes.values()),
+                }
+                for stage, lanes in stages.items()
+            },
+        }
+        for tenant, stages in counts.items()
+    }
@@ -0,0 +1,159 @@
+"""
+Transactional hand-off between pipeline stages.
+
+A stage used to store its output and then enqueue the next stage as two
+separate steps, so a worker crash or Redis error in between left the run
+stuck after an expensive stage. Stages now complete through
+``complete_stage`` in worker.py, which writes the run status, the stage output
+and a ``stage_handoffs`` row holding the next stage's function and arguments
+in one database transaction (an outbox). The hand-off is then dispatched
+right away; hand-offs still pending after ``HANDOFF_RELAY_GRACE`` seconds are
+dispatched by the relay, which runs with every reaper pass.
+
+Every completion has an attempt key, ``{research_id}-{stage}``, that is unique
+in the table:
+
+- a duplicate delivery of a stage that already completed is skipped before it
+  runs (see ``with_heartbeat``) and its completion is never written twice
+- the next stage is enqueued under a job ID derived from the attempt key, so
+  a dispatch repeated after a crash finds the job instead of enqueuing a copy
+"""
+
+import os
+import json
+from datetime import datetime, timedelta
+
+from rq.job import Job
+
+from .models import SessionLocal, StageHandoff
+from .queue_client import current_tenant, enqueue_stage, function_name, redis_conn, stage_trace
+from .tracing import span
+
+# Pending hand-offs younger than this are left to the stage that wrote them
+HANDOFF_RELAY_GRACE = int(os.getenv('HANDOFF_RELAY_GRACE', '30'))
+HANDOFF_RELAY_BATCH_SIZE = int(os.getenv('HANDOFF_RELAY_BATCH_SIZE', '100'))
+
+LOCK_PREFIX = 'tv_research:handoff:lock'
+STATS_KEY = 'tv_research:handoff:stats'
+# Seconds a dispatch may hold its lock; a crashed dispatcher releases it this way
+LOCK_TTL = 60
+
+
+def attempt_key(research_id: int, stage: str) -> str:
+    return f'{research_id}-{stage}'
+
+
+def handoff_job_id(key: str) -> str:
+    """RQ job ID of the stage a hand-off continues with"""
+    return f'handoff-{key}'
+
+
+def new_handoff(research_id: int, stage: str, next_stage: str = None, func=None, args: tuple = (),
+                priority: str = 'normal', tenant: str = None, depends_on: list = None) -> StageHandoff:
+    """Outbox row of a completed stage, to be added in the transaction storing its output"""
+    if next_stage is None:
+        # The run ends here; the row only records the completion
+        return StageHandoff(
+            research_id=research_id, stage=stage, attempt_key=attempt_key(research_id, stage),
+            dispatched_at=datetime.utcnow()
+        )
+    return StageHandoff(
+        research_id=research_id,
+        stage=stage,
+        attempt_key=attempt_key(research_id, stage),
+        next_stage=next_stage,
+        function=function_name(func),
+        payload=json.dumps({
+            'args': list(args), 'priority': priority, 'tenant': tenant or current_tenant(), 'trace': stage_trace(),
+            'depends_on': depends_on
+        }),
+        attempts=0
+    )
+
+
+def completed_stages(research_ids: list, stage: str) -> set:
+    """Research IDs among ``research_ids`` whose ``stage`` already completed"""
+    db = SessionLocal()
+    try:
+        keys = [attempt_key(research_id, stage) for research_id in research_ids]
+        return {
+            research_id for (research_id,) in
+            db.query(StageHandoff.research_id).filter(StageHandoff.attempt_key.in_(keys))
+        }
+    finally:
+        db.close()
+
+
+def dispatch(handoff_id: int) -> bool:
+    """Enqueue the next stage of a pending hand-off once; errors are logged, never raised"""
+    lock = f'{LOCK_PREFIX}:{handoff_id}'
+    try:
+        if not redis_conn.set(lock, 1, nx=True, ex=LOCK_TTL):
+            return False
+    except Exception as e:
+        print(f"Could not dispatch hand-off {handoff_id}: {e}")
+        return False
+
+    db = SessionLocal()
+    try:
+        handoff = db.query(StageHandoff).filter(StageHandoff.id == handoff_id).first()
+        if handoff is None or handoff.dispatched_at is not None:
+            return False
+        with span('handoff dispatch', research_id=handoff.research_id, stage=handoff.next_stage):
+            handoff.attempts = (handoff.attempts or 0) + 1
+            job_id = handoff_job_id(handoff.attempt_key)
+            # Enqueued before a crash kept the hand-off from being marked
+            if not Job.exists(job_id, connection=redis_conn):
+                payload = json.loads(handoff.payload)
+                enqueue_stage(
+                    handoff.next_stage, handoff.function, *payload['args'], priority=payload['priority'],
+                    meta={'trace': payload['trace']} if payload.get('trace') else None, job_id=job_id,
+                    tenant=payload.get('tenant'), depends_on=payload.get('depends_on')
+                )
+            handoff.job_id = job_id
+            handoff.dispatched_at = datetime.utcnow()
+            # The arguments repeat the stage output, which is stored already
+            handoff.payload = None
+            db.commit()
+        return True
+    except Exception as e:
+        print(f"Could not dispatch hand-off {handoff_id}: {e}")
+        db.rollback()
+        return False
+    finally:
+        db.close()
+        try:
+            redis_conn.delete(lock)
+        except Exception:
+            pass
+
+
+def relay_pending(grace: int = HANDOFF_RELAY_GRACE) -> list:
+    """Dispatch hand-offs left pending for longer than ``grace`` seconds; returns their research IDs"""
+    cutoff = datetime.utcnow() - timedelta(seconds=grace)
+    db = SessionLocal()
+    try:
+        pending = db.query(StageHandoff.id, StageHandoff.research_id).filter(
+            StageHandoff.dispatched_at.is_(None),
+            StageHandoff.created_at < cutoff
+        ).order_by(StageHandoff.id).limit(HANDOFF_RELAY_BATCH_SIZE).all()
+    finally:
+        db.close()
+
+    relayed = [research_id for handoff_id, research_id in pending if dispatch(handoff_id)]
+    if relayed:
+        redis_conn.hincrby(STATS_KEY, 'relayed', len(relayed))
+    return relayed
+
+
+def get_handoff_report(db) -> dict:
+    """Pending hand-offs and how many the relay had to dispatch, for /metrics"""
+    pending = db.query(StageHandoff.created_at).filter(StageHandoff.dispatched_at.is_(None))
+    oldest = pending.order_by(StageHandoff.created_at.asc()).first()
+    return {
+        'pending': pending.count(),
+        'oldest_pending_seconds': (
+            round((datetime.utcnow() - oldest[0]).total_seconds()) if oldest and oldest[0] else None
+        ),
+        'relayed': int(redis_conn.hget(STATS_KEY, 'relayed') or 0),
+    }
@@ -0,0 +1,68 @@
+"""
+LLM construction for the research crew.
+
+Every agent gets a ``RateLimitedLLM`` for its stage's model (see routing.py),
+which runs every completion request
+behind the provider's circuit breaker and concurrency limit (see
+resilience.py) and waits for cluster-wide RPM/TPM capacity (see ratelimit.py).
+Calls go through the active cassette when a run is recorded or replayed and
+are traced as ``llm call`` spans.
+"""
+
+import os
+
+from crewai import LLM
+
+from .cassette import cassette_call
+from .compaction import DEFAULT_MODEL, count_tokens
+from .ratelimit import llm_provider, llm_rate_limit
+from .resilience import guarded
+from .tracing import span
+
+# Completion tokens reserved up front when the call sets no max_tokens
+DEFAULT_COMPLETION_RESERVE = int(os.getenv('RATE_LIMIT_COMPLETION_RESERVE', '1000'))
+
+
+def _prompt_text(messages) -> str:
+    if isinstance(messages, str):
+        return messages
+    return '\n'.join(str(message.get('content') or '') for message in messages)
+
+
+class RateLimitedLLM(LLM):
+    """crewai LLM that honours the shared breakers and rate limits on each call"""
+
+    def __init__(self, *args, budget=None, fallback=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Budget of the agent run and the LLM serving it once over budget (see routing.py)
+        self.budget = budget
+        self.fallback = fallback
+
+    def call(self, messages, *args, **kwargs):
+        if self.budget is not None:
+            self.budget.start()
+            if self.fallback is not None and self.budget.exceeded():
+                return self.fallback.call(messages, *args, **kwargs)
+        with span('llm call', model=self.model, messages=len(messages) if isinstance(messages, list) else 1):
+            # Recorded or replayed when the run uses a cassette (see cassette.py)
+            return cassette_call(
+                'llm', {'model': self.model, 'messages': messages},
+                lambda: self._limited_call(messages, *args, **kwargs)
+            )
+
+    def _limited_call(self, messages, *args, **kwargs):
+        prompt_tokens = count_tokens(_prompt_text(messages), self.model)
+        reserve = self.max_tokens or self.max_completion_tokens or DEFAULT_COMPLETION_RESERVE
+        with guarded(llm_provider(self.model)):
+            with llm_rate_limit(self.model, prompt_tokens + reserve) as reconcile:
+                response = super().call(messages, *args, **kwargs)
+                completion_tokens = count_tokens(str(response or ''), self.model)
+                reconcile(prompt_tokens + completion_tokens)
+                if self.budget is not None:
+                    self.budget.charge(self.model, prompt_tokens, completion_tokens)
+                return response
+
+
+def build_llm(model: str = None, **kwargs) -> RateLimitedLLM:
+    """Return the rate-limited LLM used by the crew agents"""
+    return RateLimitedLLM(model=model or DEFAULT_MODEL, **kwargs)
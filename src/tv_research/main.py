@@ -1,19 +1,31 @@
 #!/usr/bin/env python
 import sys
+from contextlib import nullcontext
 from datetime import datetime
+from tv_research.artifacts import save_report
+from tv_research.cassette import Cassette, use_cassette
 from tv_research.crew import TVResearchCrew
 from tv_research.models import ResearchResult, get_db, init_db
+from tv_research.usage import record_crew_usage
 import os
 
 
-def run(topic=None, store_in_db=False):
+def run(topic=None, store_in_db=False, cassette=None, cassette_mode='record', cassette_timing='recorded'):
     """
     Run the TV Channel Research crew.
 
     Args:
         topic: The specific topic to research (optional, defaults to trending topics)
         store_in_db: Whether to store the result in database (default: False)
+        cassette: Path of a cassette file to record the run to or replay it from (optional)
+        cassette_mode: 'record' calls the providers and records every LLM and tool call,
+            'replay' serves them from the cassette with the recorded inputs
+        cassette_timing: 'recorded' replays calls with their recorded durations, 'zero' instantly
     """
+    recording = Cassette(cassette, cassette_mode, cassette_timing) if cassette else None
+    if recording is not None and recording.mode == 'replay' and recording.inputs:
+        topic = recording.inputs.get('research_focus')
+
     print("\n" + "="*80)
     if topic:
         print(f"🎬 TV CHANNEL RESEARCH & REPORTING TOOL - TOPIC: {topic}")
@@ -40,6 +52,15 @@ def run(topic=None, store_in_db=False):
             'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         }
 
+    if recording is not None:
+        if recording.mode == 'replay':
+            # The recorded inputs reproduce the recorded prompts
+            inputs = recording.inputs or inputs
+            print(f"📼 Replaying cassette {cassette} ({cassette_timing} timing)")
+        else:
+            recording.start(inputs, topic=topic)
+            print(f"📼 Recording cassette {cassette}")
+
     print("📋 Research Parameters:")
     print(f"   Channel Type: {inputs['channel_type']}")
     print(f"   Time Slot: {inputs['time_slot']}")
@@ -62,7 +83,12 @@ def run(topic=None, store_in_db=False):
         print("✅ Crew initialized successfully!")
         print("\n🔍 Starting research process...\n")
 
-        result = crew.kickoff(inputs=inputs)
+        with use_cassette(recording) if recording is not None else nullcontext():
+            result = crew.kickoff(inputs=inputs)
+
+        if recording is not None and recording.mode == 'replay':
+            print(f"\n📼 Replay finished: {recording.mismatches} request(s) differed from the recording, "
+                  f"unused calls: {recording.remaining() or 'none'}")
 
         end_time = datetime.utcnow()
         execution_time = int((end_time - start_time).total_seconds())
@@ -72,6 +98,15 @@ def run(topic=None, store_in_db=False):
         print("="*80)
         print(f"\n📄 Report saved to: reports/tv_research_report_*.md")
         print(f"⏱️  Total execution time: {execution_time} seconds")
+
+        stage_usage = record_crew_usage(None, crew)
+        print("\n🧮 Token usage by stage:")
+        for usage in stage_usage:
+            cost = f"${usage['cost_usd']:.4f}" if usage['cost_usd'] is not None else "n/a"
+            print(f"   {usage['stage']}: {usage['prompt_tokens']} prompt / "
+                  f"{usage['completion_tokens']} completion tokens, "
+                  f"{usage['llm_calls']} LLM calls, {usage['tool_calls']} tool calls, "
+                  f"{cost} ({usage['model']})")
         print("\n💡 The crew has completed comprehensive research on trending topics")
         print("   and compiled actionable recommendations for your TV channel.\n")
 
@@ -84,10 +119,12 @@ def run(topic=None, store_in_db=False):
                     status='completed',
                     completed_at=end_time,
                     result_content=str(result),
-                    execution_time=execution_time
+                    execution_time=execution_time,
+                    report_id=save_report(str(result))
                 )
                 db.add(research_result)
                 db.commit()
+                record_crew_usage(research_result.id, crew)
                 print(f"📊 Result stored in database with ID: {research_result.id}")
             except Exception as db_error:
                 print(f"⚠️  Warning: Failed to store result in database: {db_error}")
@@ -156,6 +193,17 @@ def replay():
         raise Exception(f"An error occurred while replaying the crew: {e}")
 
 
+def replay_cassette():
+    """
+    Replay a recorded crew run from a cassette without calling any provider.
+    """
+    timing = sys.argv[2] if len(sys.argv) > 2 else 'recorded'
+    try:
+        return run(cassette=sys.argv[1], cassette_mode='replay', cassette_timing=timing)
+    except Exception as e:
+        raise Exception(f"An error occurred while replaying the cassette: {e}")
+
+
 def test():
     """
     Test the crew execution and return the results.
@@ -187,4 +235,12 @@ if __name__ == "__main__":
         import os
         topic = os.getenv('RESEARCH_TOPIC')
 
-    run(topic)
+    # CASSETTE_RECORD=path records the run, CASSETTE_REPLAY=path replays one
+    # (CASSETTE_TIMING=zero replays without the recorded delays)
+    if os.getenv('CASSETTE_REPLAY'):
+        run(topic, cassette=os.getenv('CASSETTE_REPLAY'), cassette_mode='replay',
+            cassette_timing=os.getenv('CASSETTE_TIMING', 'recorded'))
+    elif os.getenv('CASSETTE_RECORD'):
+        run(topic, cassette=os.getenv('CASSETTE_RECORD'), cassette_mode='record')
+    else:
+        run(topic)
@@ -6,31 +6,78 @@ This script helps manage and monitor Redis Queue workers.
 
 import os
 import sys
+import math
 import subprocess
 import signal
+import threading
 import time
-from typing import List, Optional
+from typing import Dict, List, Optional
 import argparse
 
+# Autoscaling bounds per stage: (min workers, max workers). Override with
+# e.g. AUTOSCALE_NEWS_AGGREGATION_MIN=2 / AUTOSCALE_NEWS_AGGREGATION_MAX=6.
+SCALING_BOUNDS = {
+    'trend_research': (1, 4),
+    'news_aggregation': (1, 4),
+    'content_strategy': (1, 2),
+    'final_reporting': (1, 2),
+}
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+from tv_research.queue_client import PRIORITIES, STAGES, known_tenants, lane_counts
+
+_output_lock = threading.Lock()
+
+def stage_totals(counts: dict, stage: str) -> dict:
+    """Queued and running jobs of a stage per priority, summed over the tenants of ``lane_counts``"""
+    return {
+        priority: {
+            field: sum(stages[stage][priority][field] for stages in counts.values())
+            for field in ('queued', 'running')
+        }
+        for priority in PRIORITIES
+    }
+
+def _pump_output(process: subprocess.Popen, label: str):
+    """Forward a worker's combined stdout/stderr line by line with a prefix.
+
+    Runs in a background thread per worker so that the pipe is always
+    drained and a chatty worker can never block on a full pipe buffer.
+    """
+    for line in iter(process.stdout.readline, ''):
+        with _output_lock:
+            sys.stdout.write(f"[{label}] {line}")
+            sys.stdout.flush()
+    process.stdout.close()
+
 def start_worker(queue_name: str, worker_id: Optional[str] = None) -> subprocess.Popen:
     """Start a worker process for a specific queue"""
     env = os.environ.copy()
     env['WORKER_QUEUE'] = queue_name
+    env['PYTHONUNBUFFERED'] = '1'
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [SRC_DIR, env.get('PYTHONPATH')]))
 
     if worker_id:
         env['WORKER_ID'] = worker_id
 
-    cmd = [sys.executable, 'src/tv_research/worker.py']
+    cmd = [sys.executable, '-m', 'tv_research.worker']
 
     print(f"Starting worker for queue: {queue_name}")
     process = subprocess.Popen(
         cmd,
         env=env,
         stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        text=True
+        stderr=subprocess.STDOUT,
+        text=True,
+        bufsize=1
     )
 
+    label = worker_id or f"{queue_name}-{process.pid}"
+    threading.Thread(target=_pump_output, args=(process, label), daemon=True).start()
+
     return process
 
 def start_all_workers():
@@ -80,13 +127,173 @@ def monitor_workers(workers: List[tuple]):
             if process.poll() is None:
                 process.kill()
 
+def get_scaling_bounds(stage: str) -> tuple:
+    """Return (min, max) worker counts for a stage, honouring env overrides"""
+    default_min, default_max = SCALING_BOUNDS[stage]
+    minimum = int(os.getenv(f'AUTOSCALE_{stage.upper()}_MIN', default_min))
+    maximum = int(os.getenv(f'AUTOSCALE_{stage.upper()}_MAX', default_max))
+    return minimum, max(minimum, maximum)
+
+def sample_stage_metrics() -> Dict[str, dict]:
+    """Sample queue depth, in-flight jobs and recent service time per stage, over every tenant's lanes"""
+    counts = lane_counts(known_tenants())
+    metrics = {}
+    for stage in STAGES:
+        lanes = stage_totals(counts, stage).values()
+        metrics[stage] = {
+            'depth': sum(lane['queued'] for lane in lanes),
+            'in_flight': sum(lane['running'] for lane in lanes),
+        }
+
+    default_seconds = float(os.getenv('AUTOSCALE_DEFAULT_STAGE_SECONDS', '120'))
+    latencies = {}
+    try:
+        from tv_research.models import StageUsage, get_db
+
+        db = get_db()
+        try:
+            for stage in STAGES:
+                rows = db.query(StageUsage.duration_ms).filter(
+                    StageUsage.stage == stage,
+                    StageUsage.duration_ms.isnot(None)
+                ).order_by(StageUsage.created_at.desc()).limit(20).all()
+                durations = [row[0] for row in rows]
+                if durations:
+                    latencies[stage] = sum(durations) / len(durations) / 1000
+        finally:
+            db.close()
+    except Exception as e:
+        print(f"Could not read stage latencies, using defaults: {e}")
+
+    for stage in STAGES:
+        metrics[stage]['service_seconds'] = latencies.get(stage, default_seconds)
+    return metrics
+
+class Supervisor:
+    """Scales each stage's worker pool with its queue depth.
+
+    The desired worker count is the number of workers needed to drain the
+    stage's backlog within ``target_drain_seconds`` at the recently observed
+    service time, never fewer than the jobs currently in flight, and clamped
+    to the stage's min/max. Scale-ups and scale-downs have separate cooldowns.
+    Scaling down sends SIGTERM, which RQ treats as a warm shutdown: the worker
+    finishes its current job before exiting.
+    """
+
+    def __init__(self, interval: int = 15, target_drain_seconds: int = 300,
+                 scale_up_cooldown: int = 60, scale_down_cooldown: int = 300,
+                 drain_timeout: int = 900):
+        self.interval = interval
+        self.target_drain_seconds = target_drain_seconds
+        self.scale_up_cooldown = scale_up_cooldown
+        self.scale_down_cooldown = scale_down_cooldown
+        self.drain_timeout = drain_timeout
+        self.workers: Dict[str, List[subprocess.Popen]] = {stage: [] for stage in STAGES}
+        self.draining: List[tuple] = []  # (stage, process, drain started at)
+        self.last_scaled: Dict[str, float] = {stage: 0.0 for stage in STAGES}
+        self._sequence = 0
+
+    def desired_workers(self, stage: str, metrics: dict) -> int:
+        minimum, maximum = get_scaling_bounds(stage)
+        backlog_seconds = metrics['depth'] * metrics['service_seconds']
+        needed = math.ceil(backlog_seconds / self.target_drain_seconds) if backlog_seconds else 0
+        needed = max(needed, metrics['in_flight'])
+        return max(minimum, min(maximum, needed))
+
+    def _spawn(self, stage: str):
+        self._sequence += 1
+        process = start_worker(stage, f"{stage}-{self._sequence}")
+        self.workers[stage].append(process)
+
+    def _drain(self, stage: str):
+        process = self.workers[stage].pop()
+        print(f"Draining worker {process.pid} for {stage}")
+        process.send_signal(signal.SIGTERM)
+        self.draining.append((stage, process, time.time()))
+
+    def reap(self):
+        """Restart crashed workers and clean up drained ones"""
+        for stage, processes in self.workers.items():
+            for process in list(processes):
+                if process.poll() is not None:
+                    print(f"Worker {process.pid} for {stage} exited with code {process.returncode}")
+                    processes.remove(process)
+                    self._spawn(stage)
+
+        still_draining = []
+        for stage, process, started in self.draining:
+            if process.poll() is not None:
+                print(f"Worker {process.pid} for {stage} drained")
+            elif time.time() - started > self.drain_timeout:
+                print(f"Worker {process.pid} for {stage} did not drain in {self.drain_timeout}s, killing")
+                process.kill()
+            else:
+                still_draining.append((stage, process, started))
+        self.draining = still_draining
+
+    def scale(self, metrics: Dict[str, dict]):
+        now = time.time()
+        for stage in STAGES:
+            current = len(self.workers[stage])
+            desired = self.desired_workers(stage, metrics[stage])
+            if desired == current:
+                continue
+            cooldown = self.scale_up_cooldown if desired > current else self.scale_down_cooldown
+            if current and now - self.last_scaled[stage] < cooldown:
+                continue
+
+            print(f"Scaling {stage}: {current} -> {desired} workers "
+                  f"(depth={metrics[stage]['depth']}, in_flight={metrics[stage]['in_flight']}, "
+                  f"service={metrics[stage]['service_seconds']:.0f}s)")
+            while len(self.workers[stage]) < desired:
+                self._spawn(stage)
+            while len(self.workers[stage]) > desired:
+                self._drain(stage)
+            self.last_scaled[stage] = now
+
+    def run(self):
+        print("Starting autoscaling supervisor")
+        try:
+            while True:
+                self.reap()
+                try:
+                    metrics = sample_stage_metrics()
+                except Exception as e:
+                    print(f"Could not sample queue metrics: {e}")
+                    metrics = None
+                if metrics:
+                    self.scale(metrics)
+                time.sleep(self.interval)
+        except KeyboardInterrupt:
+            self.shutdown()
+
+    def shutdown(self):
+        print("Shutting down workers...")
+        for stage in STAGES:
+            while self.workers[stage]:
+                self._drain(stage)
+        deadline = time.time() + 30
+        while self.draining and time.time() < deadline:
+            time.sleep(1)
+            self.draining = [(s, p, t) for s, p, t in self.draining if p.poll() is None]
+        for _, process, _ in self.draining:
+            process.kill()
+
 def main():
     parser = argparse.ArgumentParser(description='Manage TV Research workers')
-    parser.add_argument('action', choices=['start', 'monitor', 'status'],
+    parser.add_argument('action', choices=['start', 'monitor', 'status', 'supervise'],
                        help='Action to perform')
     parser.add_argument('--queue', help='Specific queue to manage')
     parser.add_argument('--workers', type=int, default=1,
                        help='Number of workers to start (for start action)')
+    parser.add_argument('--interval', type=int, default=15,
+                       help='Seconds between queue samples (for supervise action)')
+    parser.add_argument('--target-drain', type=int, default=300,
+                       help='Seconds in which a stage backlog should be drained (for supervise action)')
+    parser.add_argument('--scale-up-cooldown', type=int, default=60,
+                       help='Minimum seconds between scale-ups of a stage')
+    parser.add_argument('--scale-down-cooldown', type=int, default=300,
+                       help='Minimum seconds between scale-downs of a stage')
 
     args = parser.parse_args()
 
@@ -102,9 +309,9 @@ def main():
             if args.workers == 1:
                 # Just run single worker
                 try:
-                    worker[1].wait()
+                    worker.wait()
                 except KeyboardInterrupt:
-                    worker[1].terminate()
+                    worker.terminate()
             else:
                 # Monitor multiple workers
                 monitor_workers(workers)
@@ -114,6 +321,15 @@ def main():
             workers = start_all_workers()
             monitor_workers(workers)
 
+    elif args.action == 'supervise':
+        Supervisor(
+            interval=args.interval,
+            target_drain_seconds=args.target_drain,
+            scale_up_cooldown=args.scale_up_cooldown,
+            scale_down_cooldown=args.scale_down_cooldown,
+            drain_timeout=int(os.getenv('AUTOSCALE_DRAIN_TIMEOUT', '900'))
+        ).run()
+
     elif args.action == 'monitor':
         # This would require keeping track of running workers
         print("Monitoring functionality requires workers to be started first")
@@ -122,15 +338,15 @@ def main():
     elif args.action == 'status':
         # Check Redis queue status
         try:
-            import redis
-            from rq import Queue
-
-            redis_conn = redis.from_url(os.getenv('REDIS_URL', 'redis://localhost:6379'))
-
-            queues = ['trend_research', 'news_aggregation', 'content_strategy', 'final_reporting']
-            for queue_name in queues:
-                queue = Queue(queue_name, connection=redis_conn)
-                print(f"{queue_name}: {queue.count} jobs")
+            counts = lane_counts(known_tenants())
+            for queue_name in STAGES:
+                lanes = {priority: lane['queued'] for priority, lane in stage_totals(counts, queue_name).items()}
+                lane_summary = ', '.join(f"{priority}: {count}" for priority, count in lanes.items())
+                print(f"{queue_name}: {sum(lanes.values())} jobs ({lane_summary})")
+            if len(counts) > 1:
+                for tenant, stages in counts.items():
+                    queued = sum(lane['queued'] for lanes in stages.values() for lane in lanes.values())
+                    print(f"  tenant {tenant}: {queued} jobs")
 
         except ImportError:
             print("Redis/RQ not available. Make sure dependencies are installed.")
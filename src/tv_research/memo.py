@@ -0,0 +1,137 @@
+"""
+Stage-level memoization shared across research requests.
+
+Requests with the same inputs (ignoring ``timestamp``) produce the same trend
+stage, so its output is cached in Redis for ``STAGE_MEMO_TTL`` seconds. When
+several requests arrive together, the first one becomes the leader and runs
+the stage; the others register as followers and are handed the leader's
+result, so they only run their own downstream stages.
+
+A follower that registers just as the leader publishes could be missed by the
+hand-off. Followers therefore check the cache again after registering and
+take themselves off the waiter list with ``LREM``: if they removed their own
+entry the leader never saw them and they continue with the cached result,
+otherwise the leader already handed the result over.
+"""
+
+import os
+import json
+import time
+import hashlib
+
+from .queue_client import redis_conn
+
+STAGE_MEMO_TTL = int(os.getenv('STAGE_MEMO_TTL', '1800'))
+# Upper bound on how long followers wait for a leader that died without
+# releasing its lock (the reaper then requeues them)
+STAGE_MEMO_LOCK_TTL = int(os.getenv('STAGE_MEMO_LOCK_TTL', '900'))
+
+# Inputs that differ between otherwise identical requests
+VOLATILE_INPUTS = ('timestamp',)
+
+KEY_PREFIX = 'tv_research:memo'
+WAITING_KEY = f'{KEY_PREFIX}:waiting'
+
+def get_redis():
+    return redis_conn
+
+
+def memo_enabled() -> bool:
+    return STAGE_MEMO_TTL > 0
+
+
+def stage_memo_key(stage: str, inputs: dict, *extra) -> str:
+    """Cache key of a stage for inputs normalized without volatile fields.
+
+    ``extra`` takes anything else the output depends on, such as the model
+    and the task definition.
+    """
+    normalized = {
+        key: ' '.join(str(value).split()).casefold()
+        for key, value in inputs.items()
+        if key not in VOLATILE_INPUTS and value is not None
+    }
+    payload = json.dumps([stage, normalized, [str(item) for item in extra]], sort_keys=True)
+    return f'{KEY_PREFIX}:{stage}:{hashlib.sha256(payload.encode()).hexdigest()[:32]}'
+
+
+def get_memoized(key: str):
+    """Return the cached ``{'result', 'research_id', 'created_at'}`` or None"""
+    cached = get_redis().get(key)
+    return json.loads(cached) if cached else None
+
+
+def claim_leader(key: str, task_id: int) -> bool:
+    """Try to become the run that computes the stage for ``key``"""
+    connection = get_redis()
+    if connection.set(f'{key}:lock', task_id, nx=True, ex=STAGE_MEMO_LOCK_TTL):
+        return True
+    # A requeued leader keeps its lock
+    owner = connection.get(f'{key}:lock')
+    return owner is not None and owner.decode() == str(task_id)
+
+
+def join_as_follower(key: str, task_id: int, inputs: dict, priority: str, tenant: str = None):
+    """Wait for the leader's result.
+
+    Returns the cached entry if it became available while registering (the
+    caller continues by itself), or None when the leader will hand it over.
+    """
+    connection = get_redis()
+    entry = json.dumps({'task_id': task_id, 'inputs': inputs, 'priority': priority, 'tenant': tenant}, sort_keys=True)
+    pipe = connection.pipeline()
+    pipe.rpush(f'{key}:waiters', entry)
+    pipe.expire(f'{key}:waiters', STAGE_MEMO_LOCK_TTL * 2)
+    pipe.hset(WAITING_KEY, task_id, json.dumps({'key': key, 'entry': entry, 'since': time.time()}))
+    pipe.execute()
+
+    cached = get_memoized(key)
+    if cached is not None and connection.lrem(f'{key}:waiters', 1, entry):
+        connection.hdel(WAITING_KEY, task_id)
+        return cached
+    return None
+
+
+def _take_waiters(key: str) -> list:
+    connection = get_redis()
+    pipe = connection.pipeline()
+    pipe.lrange(f'{key}:waiters', 0, -1)
+    pipe.delete(f'{key}:waiters')
+    pipe.delete(f'{key}:lock')
+    entries, _, _ = pipe.execute()
+    waiters = [json.loads(entry) for entry in entries]
+    if waiters:
+        connection.hdel(WAITING_KEY, *[waiter['task_id'] for waiter in waiters])
+    return waiters
+
+
+def publish(key: str, task_id: int, result: str) -> list:
+    """Cache the leader's result and return the followers to hand it to"""
+    get_redis().set(key, json.dumps({
+        'result': result,
+        'research_id': task_id,
+        'created_at': time.time(),
+    }), ex=STAGE_MEMO_TTL)
+    return _take_waiters(key)
+
+
+def abandon(key: str) -> list:
+    """Release a failed leader's lock and return its followers to be requeued"""
+    return _take_waiters(key)
+
+
+def stranded_followers(min_age: float) -> list:
+    """Followers waiting longer than ``min_age`` for a leader whose lock is gone"""
+    connection = get_redis()
+    stranded = []
+    for task_id, info in connection.hgetall(WAITING_KEY).items():
+        info = json.loads(info)
+        if time.time() - info['since'] < min_age or connection.exists(f"{info['key']}:lock"):
+            continue
+        # Only the caller that removed the entry may requeue the follower
+        if not connection.lrem(f"{info['key']}:waiters", 1, info['entry']):
+            connection.hdel(WAITING_KEY, task_id)
+            continue
+        connection.hdel(WAITING_KEY, task_id)
+        stranded.append(json.loads(info['entry']))
+    return stranded
@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Boolean
+from sqlalchemy import create_engine, inspect, text, Column, BigInteger, Integer, String, Text, DateTime, Boolean, Float
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime
@@ -11,6 +11,7 @@ class ResearchResult(Base):
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     topic = Column(String(500), nullable=True)
+    topic_key = Column(String(500), nullable=True, index=True)  # normalized topic for report reuse
     status = Column(String(50), default='pending')  # pending, queued, running, completed, failed
     created_at = Column(DateTime, default=datetime.utcnow)
     completed_at = Column(DateTime, nullable=True)
@@ -18,17 +19,145 @@ class ResearchResult(Base):
     error_message = Column(Text, nullable=True)
     execution_time = Column(Integer, nullable=True)  # in seconds
     job_id = Column(String(100), nullable=True)  # Redis job ID for tracking
+    priority = Column(String(10), nullable=True, default='normal')  # high, normal, low
+    schedule_name = Column(String(100), nullable=True, index=True)  # set for scheduled runs
+    ready_by = Column(DateTime, nullable=True)  # deadline of a scheduled run
+    parent_id = Column(Integer, nullable=True, index=True)  # research this run refreshed
+    trace_id = Column(String(32), nullable=True)  # distributed trace of the run
+    report_id = Column(String(64), nullable=True)  # content address of the report artifact
+    tenant = Column(String(64), nullable=True, index=True)  # desk or producer the run is accounted to
 
     def to_dict(self):
         return {
             'id': self.id,
             'topic': self.topic,
             'status': self.status,
+            'priority': self.priority or 'normal',
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'completed_at': self.completed_at.isoformat() if self.completed_at else None,
             'result_content': self.result_content,
             'error_message': self.error_message,
-            'execution_time': self.execution_time
+            'execution_time': self.execution_time,
+            'schedule_name': self.schedule_name,
+            'ready_by': self.ready_by.isoformat() if self.ready_by else None,
+            'parent_id': self.parent_id,
+            'trace_id': self.trace_id,
+            'report_id': self.report_id,
+            'tenant': self.tenant
+        }
+
+class StageOutput(Base):
+    """Full, uncompacted output of a single pipeline stage"""
+    __tablename__ = 'stage_outputs'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    research_id = Column(Integer, index=True, nullable=False)
+    stage = Column(String(50), nullable=False)  # trend_research, news_aggregation, ...
+    content = Column(Text, nullable=True)
+    token_count = Column(Integer, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'research_id': self.research_id,
+            'stage': self.stage,
+            'content': self.content,
+            'token_count': self.token_count,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+class StageUsage(Base):
+    """Token usage, LLM/tool call counts and estimated cost of a single stage"""
+    __tablename__ = 'stage_usage'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    research_id = Column(Integer, index=True, nullable=False)
+    stage = Column(String(50), nullable=False)
+    status = Column(String(50), default='completed')  # completed, failed, deferred, memoized
+    model = Column(String(100), nullable=True)
+    prompt_tokens = Column(Integer, default=0)
+    completion_tokens = Column(Integer, default=0)
+    cached_prompt_tokens = Column(Integer, default=0)
+    total_tokens = Column(Integer, default=0)
+    llm_calls = Column(Integer, default=0)
+    tool_calls = Column(Integer, default=0)
+    cost_usd = Column(Float, nullable=True)  # estimated, None for unpriced models
+    duration_ms = Column(Integer, nullable=True)
+    fallback_model = Column(String(100), nullable=True)  # set when calls fell back (see routing.py)
+    fallback_calls = Column(Integer, default=0)
+    budget_outcome = Column(String(20), nullable=True)  # within_budget, latency_exceeded, cost_exceeded
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'stage': self.stage,
+            'status': self.status,
+            'model': self.model,
+            'fallback_model': self.fallback_model,
+            'fallback_calls': self.fallback_calls,
+            'budget_outcome': self.budget_outcome,
+            'prompt_tokens': self.prompt_tokens,
+            'completion_tokens': self.completion_tokens,
+            'cached_prompt_tokens': self.cached_prompt_tokens,
+            'total_tokens': self.total_tokens,
+            'llm_calls': self.llm_calls,
+            'tool_calls': self.tool_calls,
+            'cost_usd': self.cost_usd,
+            'duration_ms': self.duration_ms,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+class StatusEvent(Base):
+    """One step of a research run: a stage enqueued, started or finished, or a status change"""
+    __tablename__ = 'status_events'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    research_id = Column(Integer, index=True, nullable=False)
+    event = Column(String(20), nullable=False)  # enqueued, started, finished, failed, status
+    stage = Column(String(50), nullable=True)
+    status = Column(String(50), nullable=True)  # new run status of 'status' events
+    job_id = Column(String(100), nullable=True)
+    at_ms = Column(BigInteger, nullable=False, index=True)  # unix time in milliseconds
+    duration_ms = Column(Integer, nullable=True)  # monotonic run time of finished/failed stages
+
+    def to_dict(self):
+        return {
+            'event': self.event,
+            'stage': self.stage,
+            'status': self.status,
+            'job_id': self.job_id,
+            'at': datetime.utcfromtimestamp(self.at_ms / 1000).isoformat(timespec='milliseconds'),
+            'at_ms': self.at_ms,
+            'duration_ms': self.duration_ms
+        }
+
+class StageHandoff(Base):
+    """Completion of a stage and the job continuing its run, written with the stage output (see handoff.py)"""
+    __tablename__ = 'stage_handoffs'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    research_id = Column(Integer, index=True, nullable=False)
+    stage = Column(String(50), nullable=False)  # the completed stage
+    attempt_key = Column(String(100), unique=True, nullable=False)  # one completion per run and stage
+    next_stage = Column(String(50), nullable=True)  # None when the stage ended the run
+    function = Column(String(200), nullable=True)  # dotted name of the next stage function
+    payload = Column(Text, nullable=True)  # JSON arguments of the next stage, cleared once dispatched
+    job_id = Column(String(100), nullable=True)
+    attempts = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    dispatched_at = Column(DateTime, nullable=True, index=True)
+
+    def to_dict(self):
+        return {
+            'stage': self.stage,
+            'attempt_key': self.attempt_key,
+            'next_stage': self.next_stage,
+            'function': self.function,
+            'job_id': self.job_id,
+            'attempts': self.attempts,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'dispatched_at': self.dispatched_at.isoformat() if self.dispatched_at else None
         }
 
 # Database setup
@@ -43,9 +172,35 @@ engine = create_engine(
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+def add_missing_columns():
+    """Add columns and indexes introduced after a table was first created.
+
+    ``create_all`` only creates missing tables, so databases created by an
+    older version would otherwise lack newly added nullable columns and the
+    indexes on them.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                print(f"Added column {table.name}.{column.name}")
+            indexed = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in indexed:
+                    index.create(conn)
+                    print(f"Added index {index.name}")
+
 def init_db():
     try:
         Base.metadata.create_all(bind=engine)
+        add_missing_columns()
     except Exception as e:
         # Table might already exist, which is fine
         print(f"Database initialization note: {e}")
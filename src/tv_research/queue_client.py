@@ -0,0 +1,221 @@
+"""
+Thin client for the research stage queues.
+
+The API, the scheduler and the other services that only enqueue work use this
+module instead of worker.py: stage functions are enqueued by dotted name and
+imported by RQ inside the worker, so these processes never import crewai, the
+crew or the agent tools. Importing ``tv_research.api`` stays fast and its
+memory footprint small.
+
+Every tenant (a desk, a batch producer, ...) has its own lanes, named
+``{lane}@{tenant}``; the default tenant keeps the plain lane names. Workers
+share their capacity between the tenants (see fairshare.py).
+
+All Redis clients of a process share one blocking connection pool of at most
+``REDIS_MAX_CONNECTIONS`` connections; callers wait up to
+``REDIS_POOL_TIMEOUT`` seconds for a free connection instead of opening more.
+"""
+
+import os
+import time
+from datetime import timedelta
+
+import redis
+from rq import Queue, get_current_job
+from rq.registry import StartedJobRegistry
+
+from .timeline import record_events
+from .tracing import current_context
+
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379')
+REDIS_MAX_CONNECTIONS = int(os.getenv('REDIS_MAX_CONNECTIONS', '50'))
+REDIS_POOL_TIMEOUT = int(os.getenv('REDIS_POOL_TIMEOUT', '20'))
+
+redis_pool = redis.BlockingConnectionPool.from_url(
+    REDIS_URL, max_connections=REDIS_MAX_CONNECTIONS, timeout=REDIS_POOL_TIMEOUT
+)
+redis_conn = redis.Redis(connection_pool=redis_pool)
+
+# Worker queues: every stage has a high, normal and low priority lane. The
+# normal lane keeps the plain stage name so existing queues keep working.
+STAGES = ['trend_research', 'news_aggregation', 'content_strategy', 'final_reporting']
+PRIORITIES = ['high', 'normal', 'low']
+
+# Lanes of the default tenant keep the plain names; other tenants are
+# registered in TENANTS_KEY when they first enqueue a stage
+DEFAULT_TENANT = 'default'
+TENANTS_KEY = 'tv_research:tenants'
+# Tenant IDs become part of queue names
+TENANT_ID_PATTERN = r'^[A-Za-z0-9_-]{1,64}$'
+
+
+def stored_tenant(tenant: str):
+    """Tenant as stored on research runs: None for the default tenant, however it was named"""
+    return None if not tenant or tenant == DEFAULT_TENANT else tenant
+
+# Entry points of research runs, by dotted name (see enqueue_stage)
+RUN_TREND_RESEARCH = 'tv_research.worker.run_trend_research'
+RUN_BATCH_TREND_RESEARCH = 'tv_research.batching.run_batch_trend_research'
+RUN_NEWS_REFRESH = 'tv_research.refresh.run_news_refresh'
+RUN_TREND_STREAM = 'tv_research.streaming.run_trend_stream'
+RUN_NEWS_STREAM = 'tv_research.streaming.run_news_stream'
+RUN_STRATEGY_STREAM = 'tv_research.streaming.run_strategy_stream'
+
+# Trending-topic runs stream topics between their stages (see streaming.py)
+STREAM_TRENDING_TOPICS = os.getenv('STREAM_TRENDING_TOPICS', 'false').lower() not in ('0', 'false', 'no')
+# Streaming consumers work through every topic available in one job, so they may take longer
+STREAM_JOB_TIMEOUT = int(os.getenv('STREAM_JOB_TIMEOUT', '3600'))
+STREAM_CONSUMERS = (RUN_NEWS_STREAM, RUN_STRATEGY_STREAM)
+
+# Topics researched together by one batched trend stage (see batching.py)
+TREND_BATCH_MAX_TOPICS = int(os.getenv('TREND_BATCH_MAX_TOPICS', '8'))
+
+
+def lane_name(stage: str, priority: str = 'normal', tenant: str = None) -> str:
+    """Return the queue name of a stage's priority lane of a tenant"""
+    lane = stage if priority == 'normal' else f'{stage}_{priority}'
+    return lane if tenant in (None, DEFAULT_TENANT) else f'{lane}@{tenant}'
+
+
+queues = {
+    stage: {priority: Queue(lane_name(stage, priority), connection=redis_conn) for priority in PRIORITIES}
+    for stage in STAGES
+}
+_tenant_queues = {}
+
+
+def get_queue(stage: str, priority: str = 'normal', tenant: str = None) -> Queue:
+    """Return the queue for a stage and priority lane of a tenant"""
+    if priority not in PRIORITIES:
+        priority = 'normal'
+    if tenant in (None, DEFAULT_TENANT):
+        return queues[stage][priority]
+    name = lane_name(stage, priority, tenant)
+    if name not in _tenant_queues:
+        _tenant_queues[name] = Queue(name, connection=redis_conn)
+    return _tenant_queues[name]
+
+
+def known_tenants() -> list:
+    """The default tenant followed by every tenant that enqueued a stage"""
+    return [DEFAULT_TENANT] + sorted(tenant.decode() for tenant in redis_conn.smembers(TENANTS_KEY))
+
+
+def current_tenant():
+    """Tenant of the stage job running in this process, if any"""
+    job = get_current_job()
+    return job.meta.get('tenant') if job else None
+
+
+def lane_counts(tenants: list = None, stages: list = None) -> dict:
+    """Queued and running jobs of every lane, read in one pipelined round trip.
+
+    Returns ``{tenant: {stage: {priority: {'queued': n, 'running': n}}}}``.
+    """
+    tenants = tenants or known_tenants()
+    stages = stages or STAGES
+    lanes = [
+        (tenant, stage, priority, get_queue(stage, priority, tenant))
+        for tenant in tenants for stage in stages for priority in PRIORITIES
+    ]
+    pipe = redis_conn.pipeline(transaction=False)
+    for _, _, _, queue in lanes:
+        pipe.llen(queue.key)
+        pipe.zcard(StartedJobRegistry(queue=queue).key)
+    results = iter(pipe.execute())
+    counts = {}
+    for tenant, stage, priority, _ in lanes:
+        counts.setdefault(tenant, {}).setdefault(stage, {})[priority] = {
+            'queued': next(results), 'running': next(results)
+        }
+    return counts
+
+
+def function_name(func) -> str:
+    """Dotted name of a stage function"""
+    return func if isinstance(func, str) else f'{func.__module__}.{func.__qualname__}'
+
+
+def trend_entry_point(inputs: dict) -> str:
+    """Dotted name of the trend stage a research run starts with"""
+    if STREAM_TRENDING_TOPICS and not inputs.get('research_focus'):
+        return RUN_TREND_STREAM
+    return RUN_TREND_RESEARCH
+
+
+def job_task_ids(task_id) -> list:
+    """Research IDs a stage job works on (batched stages take a list)"""
+    return list(task_id) if isinstance(task_id, (list, tuple)) else [task_id]
+
+
+def job_research_ids(job) -> list:
+    """Research IDs of a queued stage job, from its first argument"""
+    return job_task_ids(job.args[0]) if job.args else []
+
+
+def stage_trace():
+    """Trace context a stage enqueued from here joins (see tracing.py).
+
+    Follow-up stages keep the current job's parent context, so the stages of
+    a run are siblings.
+    """
+    trace = current_context()
+    current_job = get_current_job()
+    job_trace = current_job.meta.get('trace') if current_job else None
+    if job_trace and (not trace or trace['trace_id'] == job_trace['trace_id']):
+        trace = job_trace
+    return trace
+
+
+def enqueue_stage(stage: str, func, *args, priority: str = 'normal', delay: int = None, meta: dict = None,
+                  job_id: str = None, tenant: str = None, depends_on: list = None):
+    """Enqueue a stage job on the tenant's lane matching the research priority.
+
+    ``func`` is the stage function or its dotted name, e.g.
+    ``RUN_TREND_RESEARCH``. Follow-up stages inherit the tenant of the job
+    that enqueues them. With ``delay`` (seconds) the job is scheduled
+    instead; the workers move it onto the lane when it is due. With
+    ``depends_on`` (job IDs) it waits until those jobs have finished.
+    """
+    tenant = tenant or current_tenant() or DEFAULT_TENANT
+    if tenant != DEFAULT_TENANT:
+        redis_conn.sadd(TENANTS_KEY, tenant)
+    queue = get_queue(stage, priority, tenant)
+    ready_at = time.time() + (delay or 0)
+    job_meta = {
+        'priority': priority, 'tenant': tenant, 'lane_entered_at': ready_at, 'ready_at': ready_at, **(meta or {})
+    }
+    trace = stage_trace()
+    if trace:
+        job_meta.setdefault('trace', trace)
+    options = {'meta': job_meta, 'job_id': job_id}
+    if depends_on:
+        options['depends_on'] = depends_on
+    if function_name(func) in STREAM_CONSUMERS:
+        options['job_timeout'] = STREAM_JOB_TIMEOUT
+    if delay:
+        job = queue.enqueue_in(timedelta(seconds=delay), func, *args, priority=priority, **options)
+    else:
+        job = queue.enqueue(func, *args, priority=priority, **options)
+    # Queue wait is measured from the time the stage is due
+    record_events(job_research_ids(job), 'enqueued', stage, job_id=job.id, at_ms=int(ready_at * 1000))
+    return job
+
+
+def chunk_batch(items: list, size: int = None) -> list:
+    """Split ``items`` into batches of at most ``size`` (TREND_BATCH_MAX_TOPICS)"""
+    size = max(1, size or TREND_BATCH_MAX_TOPICS)
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
+
+def enqueue_batch_trend(task_ids: list, inputs_list: list, priority: str = 'normal', tenant: str = None) -> list:
+    """Enqueue batched trend stages; returns the job ID of every research run"""
+    job_ids = []
+    for batch in chunk_batch(list(zip(task_ids, inputs_list))):
+        batch_ids = [task_id for task_id, _ in batch]
+        job = enqueue_stage(
+            'trend_research', RUN_BATCH_TREND_RESEARCH,
+            batch_ids, [inputs for _, inputs in batch], priority=priority, tenant=tenant
+        )
+        job_ids.extend(job.id for _ in batch)
+    return job_ids
@@ -0,0 +1,242 @@
+"""
+Cluster-wide rate limiting for LLM and search API calls.
+
+Every worker replica shares the same token buckets in Redis, so the whole
+cluster stays under the provider's requests-per-minute (RPM) and
+tokens-per-minute (TPM) limits. Callers that cannot be served immediately wait
+in a FIFO queue per scope instead of failing.
+
+Limits are configured per scope with ``RATE_LIMIT_<SCOPE>_RPM`` and
+``RATE_LIMIT_<SCOPE>_TPM``, where the scope is a provider (``OPENAI``,
+``SERPER``, ``SCRAPE``) or a model name (``GPT_4O_MINI``).
+"""
+
+import os
+import re
+import time
+import uuid
+from contextlib import contextmanager
+
+import redis
+
+from .queue_client import redis_conn
+
+# Provider-level defaults (per minute). Model-level limits are only applied
+# when configured through the environment.
+DEFAULT_LIMITS = {
+    'openai': {'rpm': 500, 'tpm': 200000},
+    'anthropic': {'rpm': 50, 'tpm': 40000},
+    'llm': {'rpm': 500, 'tpm': 200000},  # any other LLM provider
+    'serper': {'rpm': 300},
+    'scrape': {'rpm': 120},
+}
+
+RATE_LIMIT_MAX_WAIT = float(os.getenv('RATE_LIMIT_MAX_WAIT', '600'))
+# Waiters that stop polling for this long lose their place in the queue
+RATE_LIMIT_STALE_MS = 30000
+POLL_INTERVAL = 0.1
+
+KEY_PREFIX = 'tv_research:ratelimit'
+
+# KEYS: waiter queue, waiter last-seen hash, bucket keys...
+# ARGV: ticket, stale ms, then (capacity, refill per ms, cost) per bucket
+# Returns 0 when acquired, -1 when another waiter is ahead, else ms to wait.
+ACQUIRE_SCRIPT = """
+local queue, seen = KEYS[1], KEYS[2]
+local ticket = ARGV[1]
+local stale = tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+
+redis.call('ZADD', queue, 'NX', now, ticket)
+redis.call('HSET', seen, ticket, now)
+redis.call('PEXPIRE', queue, stale * 4)
+redis.call('PEXPIRE', seen, stale * 4)
+
+local head = redis.call('ZRANGE', queue, 0, 0)[1]
+while head and head ~= ticket do
+    local last = tonumber(redis.call('HGET', seen, head) or '0')
+    if now - last <= stale then
+        return -1
+    end
+    redis.call('ZREM', queue, head)
+    redis.call('HDEL', seen, head)
+    head = redis.call('ZRANGE', queue, 0, 0)[1]
+end
+
+local wait = 0
+local levels = {}
+for i = 3, #KEYS do
+    local offset = 3 + (i - 3) * 3
+    local capacity = tonumber(ARGV[offset])
+    local rate = tonumber(ARGV[offset + 1])
+    local cost = math.min(tonumber(ARGV[offset + 2]), capacity)
+    local state = redis.call('HMGET', KEYS[i], 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+    levels[i] = {tokens, cost}
+    if tokens < cost then
+        wait = math.max(wait, math.ceil((cost - tokens) / rate))
+    end
+end
+if wait > 0 then
+    return wait
+end
+
+for i = 3, #KEYS do
+    redis.call('HSET', KEYS[i], 'tokens', tostring(levels[i][1] - levels[i][2]), 'ts', now)
+    redis.call('PEXPIRE', KEYS[i], 120000)
+end
+redis.call('ZREM', queue, ticket)
+redis.call('HDEL', seen, ticket)
+return 0
+"""
+
+
+class RateLimitTimeout(Exception):
+    """Raised when a caller waited longer than RATE_LIMIT_MAX_WAIT for capacity"""
+
+
+def _scope_env(scope: str) -> str:
+    return re.sub(r'[^A-Z0-9]+', '_', scope.upper()).strip('_')
+
+
+def get_limits(scope: str, default: dict = None) -> dict:
+    """Return ``{'rpm': ..., 'tpm': ...}`` for a scope, env overrides first"""
+    limits = dict(default or {})
+    for unit in ('rpm', 'tpm'):
+        value = os.getenv(f'RATE_LIMIT_{_scope_env(scope)}_{unit.upper()}')
+        if value:
+            limits[unit] = int(value)
+    return {unit: value for unit, value in limits.items() if value and value > 0}
+
+
+def llm_provider(model: str) -> str:
+    """Provider part of a LiteLLM-style model name (``anthropic/claude-...``)"""
+    if '/' in model:
+        return model.split('/', 1)[0].lower()
+    if model.lower().startswith('claude'):
+        return 'anthropic'
+    return 'openai'
+
+
+def rate_limiting_enabled() -> bool:
+    return os.getenv('RATE_LIMIT_ENABLED', 'true').lower() not in ('0', 'false', 'no')
+
+
+class RateLimiter:
+    """Redis-backed token buckets with fair FIFO waiting"""
+
+    def __init__(self, connection=None):
+        self.connection = connection or redis_conn
+        self._acquire = self.connection.register_script(ACQUIRE_SCRIPT)
+
+    def acquire(self, queue_scope: str, buckets: list, max_wait: float = None) -> float:
+        """Block until every bucket has capacity; returns seconds waited.
+
+        ``buckets`` is a list of ``(scope, unit, limit_per_minute, cost)``.
+        """
+        if not buckets:
+            return 0.0
+        max_wait = RATE_LIMIT_MAX_WAIT if max_wait is None else max_wait
+        ticket = uuid.uuid4().hex
+        keys = [f'{KEY_PREFIX}:queue:{queue_scope}', f'{KEY_PREFIX}:seen:{queue_scope}']
+        args = [ticket, RATE_LIMIT_STALE_MS]
+        for scope, unit, limit, cost in buckets:
+            keys.append(f'{KEY_PREFIX}:bucket:{scope}:{unit}')
+            args.extend([limit, limit / 60000.0, max(1, int(cost))])
+
+        started = time.monotonic()
+        while True:
+            wait_ms = self._acquire(keys=keys, args=args)
+            if wait_ms == 0:
+                return time.monotonic() - started
+            waited = time.monotonic() - started
+            if max_wait and waited >= max_wait:
+                self.connection.zrem(keys[0], ticket)
+                self.connection.hdel(keys[1], ticket)
+                raise RateLimitTimeout(f"Waited {waited:.0f}s for {queue_scope} rate limit capacity")
+            delay = POLL_INTERVAL if wait_ms < 0 else min(wait_ms / 1000.0, 5.0)
+            time.sleep(delay)
+
+    def refund(self, scope: str, unit: str, amount: float):
+        """Adjust a bucket after the real cost is known (negative amount charges more)"""
+        key = f'{KEY_PREFIX}:bucket:{scope}:{unit}'
+        if amount and self.connection.exists(key):
+            self.connection.hincrbyfloat(key, 'tokens', amount)
+
+
+_limiter = None
+
+
+def get_rate_limiter() -> RateLimiter:
+    global _limiter
+    if _limiter is None:
+        _limiter = RateLimiter()
+    return _limiter
+
+
+def _buckets(scopes: list, tokens: int) -> list:
+    buckets = []
+    for scope, default in scopes:
+        limits = get_limits(scope, default)
+        if 'rpm' in limits:
+            buckets.append((scope, 'rpm', limits['rpm'], 1))
+        if 'tpm' in limits and tokens:
+            buckets.append((scope, 'tpm', limits['tpm'], tokens))
+    return buckets
+
+
+@contextmanager
+def llm_rate_limit(model: str, estimated_tokens: int):
+    """Wait for provider and model RPM/TPM capacity before an LLM call.
+
+    Yields a callback that reconciles the TPM buckets with the actual token
+    count once the response is known.
+    """
+    provider = llm_provider(model)
+    model_scope = model.split('/')[-1]
+    scopes = [(provider, DEFAULT_LIMITS.get(provider, DEFAULT_LIMITS['llm'])), (model_scope, None)]
+    buckets = _buckets(scopes, estimated_tokens)
+
+    if not rate_limiting_enabled() or not buckets:
+        yield lambda actual_tokens: None
+        return
+
+    limiter = None
+    try:
+        limiter = get_rate_limiter()
+        waited = limiter.acquire(model_scope, buckets)
+        if waited > 1:
+            print(f"Rate limited {model} call for {waited:.1f}s")
+    except RateLimitTimeout:
+        raise
+    except redis.RedisError as e:
+        # Never let the limiter take the pipeline down with it
+        print(f"Rate limiter unavailable, calling {model} without limiting: {e}")
+        limiter = None
+
+    def reconcile(actual_tokens: int):
+        if limiter is None or not actual_tokens:
+            return
+        for scope, unit, _, cost in buckets:
+            if unit == 'tpm':
+                try:
+                    limiter.refund(scope, unit, cost - actual_tokens)
+                except redis.RedisError:
+                    pass
+
+    yield reconcile
+
+
+@contextmanager
+def tool_rate_limit(scope: str):
+    """Wait for RPM capacity before a search or scrape API call"""
+    buckets = _buckets([(scope, DEFAULT_LIMITS.get(scope))], 0)
+    if rate_limiting_enabled() and buckets:
+        try:
+            get_rate_limiter().acquire(scope, buckets)
+        except redis.RedisError as e:
+            print(f"Rate limiter unavailable, calling {scope} without limiting: {e}")
+    yield
@@ -0,0 +1,250 @@
+"""
+Stuck-job reaper for the research pipeline.
+
+Running stages keep a heartbeat alive in Redis (see ``with_heartbeat`` in
+worker.py). If a worker dies mid-stage, the heartbeat expires while the job is
+left in RQ's StartedJobRegistry and the ResearchResult stays in a ``*_running``
+status. The reaper scans both, and requeues the orphaned stage or fails the
+research run according to ``REAPER_POLICY``. Each pass also relays stage
+hand-offs that were written but never enqueued (see handoff.py).
+
+Run periodically with ``python -m tv_research.reaper``. The worker helpers
+are only imported when reaping, so reading the reaper report from the API
+(``GET /metrics``) does not import crewai.
+"""
+
+import os
+import json
+import time
+from datetime import datetime, timezone
+
+from rq import Queue
+from rq.exceptions import NoSuchJobError
+from rq.job import Job, JobStatus
+from rq.registry import FailedJobRegistry, StartedJobRegistry
+
+from .handoff import relay_pending
+from .memo import stranded_followers
+from .models import ResearchResult, get_db, init_db
+from .queue_client import STAGES, PRIORITIES, get_queue, job_task_ids, known_tenants, redis_conn
+from .timeline import record_events
+
+# Status a research run has while each stage is executing
+RUNNING_STATUSES = {
+    'running': 'trend_research',
+    'news_aggregation_running': 'news_aggregation',
+    'content_strategy_running': 'content_strategy',
+    'final_reporting_running': 'final_reporting',
+}
+
+REAPER_INTERVAL = int(os.getenv('REAPER_INTERVAL', '60'))
+# Started jobs younger than this are left alone even without a heartbeat
+REAPER_GRACE_SECONDS = int(os.getenv('REAPER_GRACE_SECONDS', '120'))
+REAPER_MAX_ATTEMPTS = int(os.getenv('REAPER_MAX_ATTEMPTS', '2'))
+REAPER_POLICY = os.getenv('REAPER_POLICY', 'requeue')  # requeue or fail
+
+EVENTS_KEY = 'tv_research:reaper:events'
+STATS_KEY = 'tv_research:reaper:stats'
+
+
+def _age_seconds(moment) -> float:
+    if moment is None:
+        return float('inf')
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return (datetime.now(timezone.utc) - moment).total_seconds()
+
+
+def _fetch_job(job_id):
+    if not job_id:
+        return None
+    try:
+        return Job.fetch(job_id, connection=redis_conn)
+    except NoSuchJobError:
+        return None
+
+
+def has_heartbeat(task_id: int) -> bool:
+    from .worker import heartbeat_key
+    return redis_conn.zcount(heartbeat_key(task_id), time.time(), '+inf') > 0
+
+
+def find_orphans() -> dict:
+    """Return ``{task_id: (stage, job_or_None)}`` for stages with a dead worker"""
+    orphans = {}
+    claimed = set()
+
+    # Jobs RQ still believes are running
+    lanes = [
+        (stage, get_queue(stage, priority, tenant))
+        for tenant in known_tenants() for stage in STAGES for priority in PRIORITIES
+    ]
+    for stage, queue in lanes:
+        registry = StartedJobRegistry(queue=queue)
+        for job_id in registry.get_job_ids():
+            job = _fetch_job(job_id)
+            if job is None:
+                continue
+            if not job.args:
+                continue
+            task_ids = job_task_ids(job.args[0])
+            if any(has_heartbeat(task_id) for task_id in task_ids):
+                continue
+            if _age_seconds(job.started_at) < REAPER_GRACE_SECONDS:
+                continue
+            # A batched job is reclaimed once, for all of its research runs
+            orphans[task_ids[0]] = (stage, job)
+            claimed.update(task_ids)
+
+    # Research runs stuck in a running status, e.g. after RQ moved the
+    # abandoned job to the FailedJobRegistry or the job expired entirely
+    db = get_db()
+    try:
+        rows = db.query(ResearchResult).filter(
+            ResearchResult.status.in_(list(RUNNING_STATUSES))
+        ).all()
+        for row in rows:
+            if row.id in claimed or has_heartbeat(row.id):
+                continue
+            job = _fetch_job(row.job_id)
+            if job is not None:
+                status = job.get_status()
+                if status in (JobStatus.QUEUED, JobStatus.DEFERRED, JobStatus.SCHEDULED):
+                    continue
+                if status == JobStatus.STARTED and _age_seconds(job.started_at) < REAPER_GRACE_SECONDS:
+                    continue
+            if job is not None and job.args:
+                task_ids = job_task_ids(job.args[0])
+                if any(task_id in claimed or has_heartbeat(task_id) for task_id in task_ids):
+                    continue
+                claimed.update(task_ids)
+            orphans[row.id] = (RUNNING_STATUSES[row.status], job)
+    finally:
+        db.close()
+
+    return orphans
+
+
+def _remove_started(job: Job):
+    registry = StartedJobRegistry(queue=Queue(job.origin, connection=redis_conn))
+    if not hasattr(registry, 'remove_executions'):
+        registry.remove(job)
+        return
+    # RQ >= 2 stores "{job_id}:{execution_id}" entries instead of job IDs
+    stale = [
+        entry for entry in redis_conn.zrange(registry.key, 0, -1)
+        if registry.parse_job_id(entry.decode()) == job.id
+    ]
+    if stale:
+        redis_conn.zrem(registry.key, *stale)
+
+
+def _remove_from_registries(job: Job):
+    _remove_started(job)
+    FailedJobRegistry(queue=Queue(job.origin, connection=redis_conn)).remove(job)
+
+
+def reclaim(task_id: int, stage: str, job) -> dict:
+    """Requeue or fail one orphaned stage according to the reaper policy"""
+    from .worker import update_task_status
+    attempts = int(job.meta.get('reap_attempts', 0)) if job is not None else 0
+    task_ids = job_task_ids(job.args[0]) if job is not None and job.args else [task_id]
+    event = {
+        'research_id': task_id,
+        'stage': stage,
+        'job_id': job.id if job is not None else None,
+        'attempt': attempts + 1,
+        'at': datetime.utcnow().isoformat(),
+    }
+
+    if job is not None and REAPER_POLICY == 'requeue' and attempts < REAPER_MAX_ATTEMPTS:
+        _remove_from_registries(job)
+        job.meta['reap_attempts'] = attempts + 1
+        job.meta['lane_entered_at'] = job.meta['ready_at'] = time.time()
+        job.save_meta()
+        Queue(job.origin, connection=redis_conn).enqueue_job(job, at_front=True)
+        record_events(task_ids, 'enqueued', stage, job_id=job.id)
+        for research_id in task_ids:
+            update_task_status(research_id, f'{stage}_requeued')
+        event['action'] = 'requeued'
+    else:
+        reason = (
+            f"Worker lost during {stage}; "
+            + (f"gave up after {attempts} requeue attempts" if job is not None else "job could not be recovered")
+        )
+        if job is not None:
+            _remove_started(job)
+            FailedJobRegistry(queue=Queue(job.origin, connection=redis_conn)).add(job, exc_string=reason)
+        for research_id in task_ids:
+            update_task_status(research_id, 'failed', error_message=reason)
+        event['action'] = 'failed'
+
+    pipe = redis_conn.pipeline()
+    pipe.lpush(EVENTS_KEY, json.dumps(event))
+    pipe.ltrim(EVENTS_KEY, 0, 99)
+    pipe.hincrby(STATS_KEY, event['action'], 1)
+    pipe.execute()
+
+    print(f"Reaper {event['action']} {stage} for research {task_id} (job {event['job_id']})")
+    return event
+
+
+def reclaim_stranded_followers() -> list:
+    """Requeue runs waiting for a memoized trend stage whose leader is gone"""
+    from .worker import requeue_followers
+    followers = stranded_followers(REAPER_GRACE_SECONDS)
+    requeue_followers(followers)
+    for follower in followers:
+        print(f"Reaper requeued trend stage for research {follower['task_id']} (memo leader lost)")
+    return [follower['task_id'] for follower in followers]
+
+
+def reap_once() -> list:
+    """Scan for orphaned stages once and reclaim them; returns the reclaim events"""
+    events = []
+    for task_id, (stage, job) in find_orphans().items():
+        try:
+            events.append(reclaim(task_id, stage, job))
+        except Exception as e:
+            print(f"Reaper could not reclaim research {task_id}: {e}")
+    try:
+        reclaim_stranded_followers()
+    except Exception as e:
+        print(f"Reaper could not reclaim memo followers: {e}")
+    # Stage hand-offs whose enqueue was lost (see handoff.py)
+    try:
+        relayed = relay_pending()
+        if relayed:
+            print(f"Reaper relayed pending stage hand-offs of research {', '.join(map(str, relayed))}")
+    except Exception as e:
+        print(f"Reaper could not relay stage hand-offs: {e}")
+    return events
+
+
+def get_reaper_report(limit: int = 20) -> dict:
+    """Counts of reclaimed stages and the most recent reclaim events"""
+    stats = {key.decode(): int(value) for key, value in redis_conn.hgetall(STATS_KEY).items()}
+    recent = [json.loads(item) for item in redis_conn.lrange(EVENTS_KEY, 0, limit - 1)]
+    return {
+        'requeued': stats.get('requeued', 0),
+        'failed': stats.get('failed', 0),
+        'recent': recent
+    }
+
+
+def run_reaper(interval: int = REAPER_INTERVAL):
+    """Reap orphaned stages forever"""
+    print(f"Starting reaper (policy={REAPER_POLICY}, interval={interval}s)")
+    while True:
+        try:
+            events = reap_once()
+            if events:
+                print(f"Reaper reclaimed {len(events)} stage(s)")
+        except Exception as e:
+            print(f"Reaper error: {e}")
+        time.sleep(interval)
+
+
+if __name__ == '__main__':
+    init_db()
+    run_reaper()
@@ -0,0 +1,278 @@
+"""
+Incremental refresh of a completed research run.
+
+``POST /research/{id}/refresh`` creates a new research run that reuses the
+stored trend analysis of the previous run and only looks for news published
+since then. The news delta is merged into the previous content strategy, and
+only the report sections affected by it are regenerated and spliced into the
+previous report by markdown heading.
+
+The news searches of a refresh are bounded in code: every query gets an
+``after:`` operator with the date of the previous run, so stories published
+earlier are not found even if the agent leaves the bound out of its query.
+The bound has day granularity; the news task skips stories of that day that
+are already in the previous news.
+"""
+
+import re
+from datetime import datetime
+
+from .artifacts import save_report
+from .compaction import compact_context
+from .crew import TVResearchCrew
+from .models import StageOutput
+from .resilience import CircuitOpenError
+from .usage import track_stage_usage
+from .worker import (
+    complete_stage, current_job_id, defer_stage, get_db, store_stage_output, update_task_status, with_heartbeat
+)
+from crewai import Task
+
+NO_NEW_DEVELOPMENTS = 'NO NEW DEVELOPMENTS'
+
+_MD_HEADING_RE = re.compile(r'^(#{1,6})\s+(.+?)\s*#*\s*$')
+
+
+def load_stage_outputs(research_id: int) -> dict:
+    """Latest stored output of every stage of a research run"""
+    db = get_db()
+    try:
+        rows = db.query(StageOutput).filter(
+            StageOutput.research_id == research_id
+        ).order_by(StageOutput.created_at.asc(), StageOutput.id.asc()).all()
+        return {row.stage: row.content for row in rows}
+    finally:
+        db.close()
+
+
+def section_key(title: str) -> str:
+    """Heading text without numbering, emphasis, punctuation and case"""
+    title = re.sub(r'^[\s*_`]*(\d+[.)]\s*)?', '', title)
+    title = re.sub(r'[^\w\s]', ' ', title.casefold())
+    return ' '.join(title.split())
+
+
+def split_sections(text: str) -> tuple:
+    """Split markdown into ``(preamble, [(level, title, body)])``.
+
+    Sections are cut at the highest heading level that occurs more than once,
+    so a single document title stays in the preamble.
+    """
+    lines = (text or '').splitlines()
+    headings = []
+    for index, line in enumerate(lines):
+        match = _MD_HEADING_RE.match(line)
+        if match:
+            headings.append((index, len(match.group(1)), match.group(2)))
+    if not headings:
+        return text or '', []
+
+    levels = [level for _, level, _ in headings]
+    level = min((lvl for lvl in set(levels) if levels.count(lvl) > 1), default=min(levels))
+    cuts = [(index, title) for index, lvl, title in headings if lvl == level]
+
+    preamble = '\n'.join(lines[:cuts[0][0]]).strip()
+    sections = []
+    for position, (index, title) in enumerate(cuts):
+        end = cuts[position + 1][0] if position + 1 < len(cuts) else len(lines)
+        sections.append((level, title, '\n'.join(lines[index + 1:end]).strip()))
+    return preamble, sections
+
+
+def merge_sections(base: str, updates: str, fallback_title: str = 'Updates') -> tuple:
+    """Replace sections of ``base`` with same-titled sections of ``updates``.
+
+    Sections only present in ``updates`` are added before the appendix (or at
+    the end). Returns ``(merged_text, changed_titles)``.
+    """
+    base_preamble, base_sections = split_sections(base)
+    _, update_sections = split_sections(updates)
+    level = base_sections[0][0] if base_sections else 2
+    if not update_sections:
+        if not (updates or '').strip():
+            return base, []
+        update_sections = [(level, fallback_title, updates.strip())]
+
+    replacements = {section_key(title): body for _, title, body in update_sections}
+    existing = {section_key(title) for _, title, _ in base_sections}
+    additions = [(level, title, body) for _, title, body in update_sections if section_key(title) not in existing]
+
+    merged = []
+    changed = []
+    for lvl, title, body in base_sections:
+        key = section_key(title)
+        if additions and 'appendix' in key:
+            merged.extend(additions)
+            changed.extend(title for _, title, _ in additions)
+            additions = []
+        if key in replacements:
+            body = replacements[key]
+            changed.append(title)
+        merged.append((lvl, title, body))
+    merged.extend(additions)
+    changed.extend(title for _, title, _ in additions)
+
+    parts = [base_preamble] if base_preamble else []
+    parts.extend(f"{'#' * lvl} {title}\n\n{body}".rstrip() for lvl, title, body in merged)
+    return '\n\n'.join(parts), changed
+
+
+def refreshed_report(report: str, parent_id: int, changed: list) -> str:
+    """``report`` with a note on the refresh it went through, replacing the note of an earlier one"""
+    report = '\n'.join(line for line in report.splitlines() if not line.startswith('> Refreshed ')).strip()
+    note = (
+        f"> Refreshed {datetime.now().strftime('%Y-%m-%d %H:%M')} from research #{parent_id}; "
+        f"updated sections: {', '.join(changed) or 'none'}"
+    )
+    return f"{note}\n\n{report}"
+
+
+def _refresh_task(crew: TVResearchCrew, name: str, **kwargs) -> Task:
+    return Task(config=crew.tasks_config[name], **kwargs)
+
+
+def _missing_outputs(parent_id: int, previous: dict) -> str:
+    missing = [
+        stage for stage in ('trend_research', 'news_aggregation', 'content_strategy', 'final_reporting')
+        if not previous.get(stage)
+    ]
+    if missing:
+        return f"Research {parent_id} has no stored {', '.join(missing)} output to refresh from"
+    return None
+
+
+@with_heartbeat('news_aggregation')
+def run_news_refresh(task_id: int, inputs: dict, parent_id: int, priority: str = 'normal'):
+    """Aggregate only the news published since the previous run"""
+    try:
+        update_task_status(task_id, 'news_aggregation_running', job_id=current_job_id())
+
+        previous = load_stage_outputs(parent_id)
+        error = _missing_outputs(parent_id, previous)
+        if error:
+            update_task_status(task_id, 'failed', error_message=error)
+            return None
+
+        # The trend analysis is reused as is
+        store_stage_output(task_id, 'trend_research', previous['trend_research'])
+
+        crew = TVResearchCrew()
+        # previous_run_at is formatted '%Y-%m-%d %H:%M UTC'
+        crew.search_tool.published_after = inputs.get('previous_run_at', '')[:10] or None
+        news_agent = crew.news_aggregator()
+        news_task = _refresh_task(crew, 'news_refresh_task')
+
+        inputs['trend_analysis'] = previous['trend_research']
+        stage_inputs, _ = compact_context(
+            {**inputs, 'previous_news': previous['news_aggregation']}, 'news_refresh'
+        )
+
+        with track_stage_usage(task_id, 'news_aggregation', news_agent, news_task):
+            delta = str(news_agent.execute_task(news_task, stage_inputs)).strip()
+
+        if delta.upper().startswith(NO_NEW_DEVELOPMENTS):
+            # Nothing changed: the previous outputs are still current
+            for stage in ('news_aggregation', 'content_strategy'):
+                store_stage_output(task_id, stage, previous[stage])
+            report = refreshed_report(previous['final_reporting'], parent_id, [])
+            complete_stage(task_id, 'final_reporting', report, report_id=save_report(report))
+            print(f"Refresh {task_id} of research {parent_id}: no new developments")
+            return report
+
+        news, _ = merge_sections(
+            previous['news_aggregation'], delta,
+            fallback_title=f"Developments since {inputs.get('previous_run_at', 'the previous run')}"
+        )
+        complete_stage(
+            task_id, 'news_aggregation', news,
+            'content_strategy', run_strategy_refresh, task_id, inputs, delta, parent_id, priority=priority
+        )
+        return delta
+
+    except CircuitOpenError as e:
+        defer_stage(task_id, 'news_aggregation', run_news_refresh, e, inputs, parent_id, priority=priority)
+        return None
+    except Exception as e:
+        update_task_status(task_id, 'failed', error_message=str(e))
+        raise
+
+
+@with_heartbeat('content_strategy')
+def run_strategy_refresh(task_id: int, inputs: dict, news_delta: str, parent_id: int, priority: str = 'normal'):
+    """Revise only the story proposals affected by the news delta"""
+    try:
+        update_task_status(task_id, 'content_strategy_running', job_id=current_job_id())
+
+        previous = load_stage_outputs(parent_id)
+        crew = TVResearchCrew()
+        content_agent = crew.content_strategist()
+        content_task = _refresh_task(crew, 'content_strategy_refresh_task')
+
+        stage_inputs, _ = compact_context({
+            **inputs,
+            'previous_strategy': previous['content_strategy'],
+            'news_delta': news_delta,
+        }, 'content_strategy_refresh')
+
+        with track_stage_usage(task_id, 'content_strategy', content_agent, content_task):
+            strategy_delta = str(content_agent.execute_task(content_task, stage_inputs)).strip()
+
+        strategy, changed = merge_sections(previous['content_strategy'], strategy_delta, 'Updated Proposals')
+        print(f"Refresh {task_id}: revised {len(changed)} strategy section(s)")
+        complete_stage(
+            task_id, 'content_strategy', strategy,
+            'final_reporting', run_report_refresh,
+            task_id, inputs, news_delta, strategy_delta, parent_id, priority=priority
+        )
+        return strategy_delta
+
+    except CircuitOpenError as e:
+        defer_stage(
+            task_id, 'content_strategy', run_strategy_refresh, e, inputs, news_delta, parent_id, priority=priority
+        )
+        return None
+    except Exception as e:
+        update_task_status(task_id, 'failed', error_message=str(e))
+        raise
+
+
+@with_heartbeat('final_reporting')
+def run_report_refresh(task_id: int, inputs: dict, news_delta: str, strategy_delta: str, parent_id: int,
+                       priority: str = 'normal'):
+    """Regenerate the affected report sections and splice them into the previous report"""
+    try:
+        update_task_status(task_id, 'final_reporting_running', job_id=current_job_id())
+
+        previous = load_stage_outputs(parent_id)
+        _, sections = split_sections(previous['final_reporting'])
+
+        crew = TVResearchCrew()
+        reporting_agent = crew.reporting_analyst()
+        reporting_task = _refresh_task(crew, 'reporting_refresh_task')
+
+        stage_inputs, _ = compact_context({
+            **inputs,
+            'report_sections': '\n'.join(f"{'#' * level} {title}" for level, title, _ in sections),
+            'news_delta': news_delta,
+            'strategy_delta': strategy_delta,
+        }, 'reporting_refresh')
+
+        with track_stage_usage(task_id, 'final_reporting', reporting_agent, reporting_task):
+            sections_delta = str(reporting_agent.execute_task(reporting_task, stage_inputs)).strip()
+
+        report, changed = merge_sections(previous['final_reporting'], sections_delta, 'Latest Developments')
+        report = refreshed_report(report, parent_id, changed)
+
+        report_id = save_report(report)
+        complete_stage(task_id, 'final_reporting', report, report_id=report_id)
+        return report
+
+    except CircuitOpenError as e:
+        defer_stage(
+            task_id, 'final_reporting', run_report_refresh, e,
+            inputs, news_delta, strategy_delta, parent_id, priority=priority
+        )
+        return None
+    except Exception as e:
+        update_task_status(task_id, 'failed', error_message=str(e))
+        raise
@@ -0,0 +1,378 @@
+"""
+Circuit breakers and adaptive concurrency limits for external providers.
+
+Every upstream (an LLM provider such as ``openai``, ``serper``, or a scraped
+host ``scrape:<host>``) has a circuit breaker and an AIMD concurrency limit
+whose state lives in Redis, so all workers see the same picture:
+
+- After ``BREAKER_FAILURE_THRESHOLD`` failures (timeouts, connection errors,
+  429s and 5xx responses) within ``BREAKER_WINDOW_SECONDS`` the breaker opens
+  and calls fail fast with ``CircuitOpenError``. Once the cooldown has passed a
+  single probe call is let through (half-open); its outcome closes the breaker
+  or reopens it with a doubled cooldown.
+- The number of concurrent calls is capped by a limit that grows by one per
+  round of successful calls and is halved on failure (AIMD).
+
+Worker stages catch ``CircuitOpenError`` and re-enqueue themselves with a delay
+instead of failing, and workers stop dequeuing while a breaker their stage
+depends on is open (see worker.py). crewai hands errors raised by tools back to
+the agent as text, so breakers that refuse a tool call are also recorded for the
+running stage and raised once its agent returns (see ``stage_breakers``).
+"""
+
+import os
+import re
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from urllib.parse import urlparse
+
+import redis
+import requests
+
+from .queue_client import redis_conn
+
+KEY_PREFIX = 'tv_research'
+
+BREAKER_FAILURE_THRESHOLD = int(os.getenv('BREAKER_FAILURE_THRESHOLD', '5'))
+BREAKER_WINDOW_SECONDS = int(os.getenv('BREAKER_WINDOW_SECONDS', '60'))
+BREAKER_COOLDOWN_SECONDS = int(os.getenv('BREAKER_COOLDOWN_SECONDS', '30'))
+BREAKER_MAX_COOLDOWN_SECONDS = int(os.getenv('BREAKER_MAX_COOLDOWN_SECONDS', '600'))
+# A probe that has not reported back after this long lets another one through
+BREAKER_PROBE_TIMEOUT = int(os.getenv('BREAKER_PROBE_TIMEOUT', '300'))
+
+CONCURRENCY_INITIAL = float(os.getenv('CONCURRENCY_INITIAL', '8'))
+CONCURRENCY_MIN = float(os.getenv('CONCURRENCY_MIN', '1'))
+CONCURRENCY_MAX = float(os.getenv('CONCURRENCY_MAX', '32'))
+# Slots of crashed callers are released after this long
+CONCURRENCY_LEASE_SECONDS = int(os.getenv('CONCURRENCY_LEASE_SECONDS', '600'))
+CONCURRENCY_MAX_WAIT = float(os.getenv('CONCURRENCY_MAX_WAIT', '600'))
+# At most one multiplicative decrease per interval, so a burst of failures
+# from calls that were already in flight only halves the limit once
+CONCURRENCY_DECREASE_INTERVAL = float(os.getenv('CONCURRENCY_DECREASE_INTERVAL', '5'))
+
+# Returns 0 when the call may proceed, -1 when it is the half-open probe, or
+# the number of milliseconds until the breaker may be probed again.
+ALLOW_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local state = redis.call('HGET', KEYS[1], 'state') or 'closed'
+if state == 'closed' then
+    return 0
+end
+local open_until = tonumber(redis.call('HGET', KEYS[1], 'open_until') or '0')
+if state == 'open' and now < open_until then
+    return open_until - now
+end
+if redis.call('SET', KEYS[2], '1', 'NX', 'PX', ARGV[1]) then
+    redis.call('HSET', KEYS[1], 'state', 'half_open')
+    return -1
+end
+return math.max(1000, redis.call('PTTL', KEYS[2]))
+"""
+
+# ARGV: success flag, threshold, window ms, cooldown ms, max cooldown ms
+RECORD_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local state = redis.call('HGET', KEYS[1], 'state') or 'closed'
+redis.call('PEXPIRE', KEYS[1], 86400000)
+
+if ARGV[1] == '1' then
+    if state ~= 'closed' then
+        redis.call('HSET', KEYS[1], 'state', 'closed', 'failures', 0, 'opens', 0, 'closed_at', now)
+        redis.call('DEL', KEYS[2])
+    end
+    return 'closed'
+end
+
+if state == 'half_open' then
+    local opens = tonumber(redis.call('HINCRBY', KEYS[1], 'opens', 1))
+    local cooldown = math.min(tonumber(ARGV[5]), tonumber(ARGV[4]) * 2 ^ (opens - 1))
+    redis.call('HSET', KEYS[1], 'state', 'open', 'open_until', now + cooldown, 'opened_at', now)
+    redis.call('DEL', KEYS[2])
+    return 'open'
+end
+if state == 'open' then
+    -- Late failure of a call that started before the breaker opened
+    return 'open'
+end
+
+local window_start = tonumber(redis.call('HGET', KEYS[1], 'window_start') or '0')
+if now - window_start > tonumber(ARGV[3]) then
+    redis.call('HSET', KEYS[1], 'window_start', now, 'failures', 0)
+end
+local failures = tonumber(redis.call('HINCRBY', KEYS[1], 'failures', 1))
+if failures >= tonumber(ARGV[2]) then
+    redis.call('HSET', KEYS[1], 'state', 'open', 'opens', 1, 'open_until', now + tonumber(ARGV[4]), 'opened_at', now)
+    return 'open'
+end
+return 'closed'
+"""
+
+# KEYS: in-flight zset, limit hash. ARGV: slot id, lease ms, initial limit
+ACQUIRE_SLOT_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - tonumber(ARGV[2]))
+local limit = tonumber(redis.call('HGET', KEYS[2], 'limit') or ARGV[3])
+if redis.call('ZCARD', KEYS[1]) < math.max(1, math.floor(limit)) then
+    redis.call('ZADD', KEYS[1], now, ARGV[1])
+    redis.call('PEXPIRE', KEYS[1], tonumber(ARGV[2]) * 2)
+    return 1
+end
+return 0
+"""
+
+# ARGV: success flag, initial, min, max, decrease interval ms
+ADJUST_LIMIT_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local limit = tonumber(redis.call('HGET', KEYS[1], 'limit') or ARGV[2])
+if ARGV[1] == '1' then
+    limit = math.min(tonumber(ARGV[4]), limit + 1 / limit)
+else
+    local decreased_at = tonumber(redis.call('HGET', KEYS[1], 'decreased_at') or '0')
+    if now - decreased_at < tonumber(ARGV[5]) then
+        return tostring(limit)
+    end
+    limit = math.max(tonumber(ARGV[3]), limit / 2)
+    redis.call('HSET', KEYS[1], 'decreased_at', now)
+end
+redis.call('HSET', KEYS[1], 'limit', tostring(limit))
+redis.call('PEXPIRE', KEYS[1], 86400000)
+return tostring(limit)
+"""
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit breaker is open"""
+
+    def __init__(self, upstream: str, retry_after: float):
+        self.upstream = upstream
+        self.retry_after = retry_after
+        super().__init__(f"Circuit breaker for {upstream} is open; retry in {retry_after:.0f}s")
+
+
+# Calls refused by an open breaker during the running stage (see stage_breakers)
+_refused_calls = ContextVar('refused_calls', default=None)
+
+
+def get_redis():
+    return redis_conn
+
+
+def upstream_setting(name: str, upstream: str, default: float) -> float:
+    """Read ``<NAME>_<UPSTREAM>`` (e.g. ``CONCURRENCY_MAX_SERPER``), then the default"""
+    suffix = re.sub(r'[^A-Z0-9]+', '_', upstream.upper()).strip('_')
+    value = os.getenv(f'{name}_{suffix}')
+    return float(value) if value else default
+
+
+def scrape_upstream(url: str) -> str:
+    """Scraped sites get one breaker per host, so one bad site does not block the rest"""
+    host = urlparse(url or '').hostname or 'unknown'
+    return f'scrape:{host}'
+
+
+def is_upstream_failure(exc: Exception) -> bool:
+    """True for errors that indicate a degraded provider rather than a bad request"""
+    if isinstance(exc, CircuitOpenError):
+        return False
+    status = getattr(exc, 'status_code', None)
+    if status is None:
+        status = getattr(getattr(exc, 'response', None), 'status_code', None)
+    if isinstance(status, int):
+        return status == 429 or status >= 500
+    if isinstance(exc, (TimeoutError, ConnectionError, requests.Timeout, requests.ConnectionError)):
+        return True
+    name = type(exc).__name__
+    return any(marker in name for marker in ('Timeout', 'Connection', 'RateLimit', 'ServiceUnavailable', 'InternalServer'))
+
+
+class CircuitBreaker:
+    """Shared circuit breaker for one upstream"""
+
+    def __init__(self, upstream: str, connection=None):
+        self.upstream = upstream
+        self.connection = connection or get_redis()
+        self.key = f'{KEY_PREFIX}:breaker:{upstream}'
+        self.probe_key = f'{self.key}:probe'
+        self.probing = False
+
+    def allow(self) -> bool:
+        """Return True if a call may proceed, raise CircuitOpenError otherwise"""
+        script = self.connection.register_script(ALLOW_SCRIPT)
+        result = script(keys=[self.key, self.probe_key], args=[BREAKER_PROBE_TIMEOUT * 1000])
+        if result > 0:
+            raise CircuitOpenError(self.upstream, result / 1000.0)
+        if result == -1:
+            self.probing = True
+            print(f"Circuit breaker for {self.upstream} half-open, probing")
+        return True
+
+    def release_probe(self):
+        """Give up the half-open probe without an outcome, so the next call probes instead"""
+        if self.probing:
+            self.connection.delete(self.probe_key)
+            self.probing = False
+
+    def record(self, success: bool) -> str:
+        script = self.connection.register_script(RECORD_SCRIPT)
+        state = script(keys=[self.key, self.probe_key], args=[
+            1 if success else 0,
+            int(upstream_setting('BREAKER_FAILURE_THRESHOLD', self.upstream, BREAKER_FAILURE_THRESHOLD)),
+            BREAKER_WINDOW_SECONDS * 1000,
+            BREAKER_COOLDOWN_SECONDS * 1000,
+            BREAKER_MAX_COOLDOWN_SECONDS * 1000,
+        ])
+        return state.decode() if isinstance(state, bytes) else state
+
+    def retry_after(self) -> float:
+        """Seconds until the breaker may be probed; 0 if calls may be attempted"""
+        state, open_until = self.connection.hmget(self.key, 'state', 'open_until')
+        if state != b'open' or not open_until:
+            return 0.0
+        return max(0.0, float(open_until) / 1000.0 - time.time())
+
+
+class AdaptiveLimiter:
+    """Shared AIMD concurrency limit for one upstream"""
+
+    def __init__(self, upstream: str, connection=None):
+        self.upstream = upstream
+        self.connection = connection or get_redis()
+        self.inflight_key = f'{KEY_PREFIX}:concurrency:{upstream}:inflight'
+        self.limit_key = f'{KEY_PREFIX}:concurrency:{upstream}'
+        self.initial = upstream_setting('CONCURRENCY_INITIAL', upstream, CONCURRENCY_INITIAL)
+        self.minimum = upstream_setting('CONCURRENCY_MIN', upstream, CONCURRENCY_MIN)
+        self.maximum = upstream_setting('CONCURRENCY_MAX', upstream, CONCURRENCY_MAX)
+
+    def acquire(self, max_wait: float = None) -> str:
+        """Wait for a free slot and return its id"""
+        max_wait = CONCURRENCY_MAX_WAIT if max_wait is None else max_wait
+        script = self.connection.register_script(ACQUIRE_SLOT_SCRIPT)
+        slot = uuid.uuid4().hex
+        started = time.monotonic()
+        while not script(
+            keys=[self.inflight_key, self.limit_key],
+            args=[slot, CONCURRENCY_LEASE_SECONDS * 1000, self.initial]
+        ):
+            if time.monotonic() - started >= max_wait:
+                raise TimeoutError(f"No {self.upstream} concurrency slot free after {max_wait:.0f}s")
+            time.sleep(0.2)
+        return slot
+
+    def release(self, slot: str, success: bool) -> float:
+        """Free a slot and grow (success) or halve (failure) the limit"""
+        self.connection.zrem(self.inflight_key, slot)
+        script = self.connection.register_script(ADJUST_LIMIT_SCRIPT)
+        limit = script(keys=[self.limit_key], args=[
+            1 if success else 0, self.initial, self.minimum, self.maximum,
+            int(CONCURRENCY_DECREASE_INTERVAL * 1000)
+        ])
+        return float(limit)
+
+
+@contextmanager
+def guarded(upstream: str):
+    """Run an upstream call behind its circuit breaker and concurrency limit.
+
+    Raises ``CircuitOpenError`` without calling the upstream while the breaker
+    is open. Redis errors disable protection rather than failing the call.
+    """
+    try:
+        breaker = CircuitBreaker(upstream)
+        breaker.allow()
+        limiter = AdaptiveLimiter(upstream)
+        try:
+            slot = limiter.acquire()
+        except (TimeoutError, redis.RedisError):
+            # The upstream was never called, so there is no outcome to record
+            try:
+                breaker.release_probe()
+            except redis.RedisError as e:
+                print(f"Could not release the {upstream} probe: {e}")
+            raise
+    except CircuitOpenError as e:
+        refused = _refused_calls.get()
+        if refused is not None:
+            refused.append(e)
+        raise
+    except redis.RedisError as e:
+        print(f"Resilience state unavailable, calling {upstream} unprotected: {e}")
+        yield
+        return
+
+    success = True
+    try:
+        yield
+    except Exception as e:
+        # Errors caused by the request itself (4xx, parsing) still prove the
+        # upstream is healthy
+        success = not is_upstream_failure(e)
+        raise
+    finally:
+        try:
+            limiter.release(slot, success)
+            state = breaker.record(success)
+            if not success and state == 'open':
+                print(f"Circuit breaker for {upstream} is open")
+        except redis.RedisError as e:
+            print(f"Could not record {upstream} call outcome: {e}")
+
+
+@contextmanager
+def stage_breakers():
+    """Raise ``CircuitOpenError`` after a stage block if an open breaker refused any of its calls.
+
+    The error is raised even when the agent swallowed it, as crewai does with
+    tool errors, so the stage is deferred instead of completing on error text.
+    Breakers of single scraped sites are left out: the agent moves on to other
+    sources instead.
+    """
+    refused = []
+    token = _refused_calls.set(refused)
+    try:
+        yield
+    finally:
+        _refused_calls.reset(token)
+    refused = [error for error in refused if not error.upstream.startswith('scrape:')]
+    if refused:
+        raise max(refused, key=lambda error: error.retry_after)
+
+
+def paused_for(upstreams: list) -> float:
+    """Seconds until every open breaker in ``upstreams`` may be probed again"""
+    try:
+        return max([CircuitBreaker(upstream).retry_after() for upstream in upstreams] or [0.0])
+    except redis.RedisError:
+        return 0.0
+
+
+def get_upstream_report() -> dict:
+    """Breaker state and concurrency limit of every upstream seen so far"""
+    connection = get_redis()
+    report = {}
+    for key in connection.scan_iter(f'{KEY_PREFIX}:breaker:*'):
+        key = key.decode()
+        if key.endswith(':probe'):
+            continue
+        upstream = key.split(':', 2)[2]
+        state = connection.hgetall(key)
+        report[upstream] = {
+            'state': (state.get(b'state') or b'closed').decode(),
+            'failures': int(state.get(b'failures') or 0),
+            'retry_after': round(CircuitBreaker(upstream, connection).retry_after(), 1),
+        }
+    for key in connection.scan_iter(f'{KEY_PREFIX}:concurrency:*'):
+        key = key.decode()
+        if key.endswith(':inflight'):
+            continue
+        upstream = key.split(':', 2)[2]
+        limiter = AdaptiveLimiter(upstream, connection)
+        entry = report.setdefault(upstream, {'state': 'closed', 'failures': 0, 'retry_after': 0.0})
+        entry['concurrency_limit'] = round(float(connection.hget(key, 'limit') or limiter.initial), 2)
+        entry['in_flight'] = connection.zcard(limiter.inflight_key)
+    return report
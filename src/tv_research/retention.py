@@ -0,0 +1,259 @@
+"""
+Retention, archival and compaction of research history.
+
+Each pass of the retention service (``python -m tv_research.retention``):
+
+1. Archives finished runs older than ``RETENTION_DAYS`` to gzip-compressed
+   JSON lines files in ``RETENTION_ARCHIVE_DIR``: one line per run with the
+   full row, its stage outputs, token usage and status events. The runs are
+   deleted once their file is written, together with report artifacts no
+   remaining run refers to.
+2. Compacts runs finished more than ``STAGE_OUTPUT_RETENTION_DAYS`` ago: their
+   intermediate stage outputs and status-change events are deleted. The final
+   report stays on the run and the stage timing events are kept. Compacted
+   runs cannot be refreshed any more (``POST /research/{id}/refresh`` answers
+   409), since a refresh builds on their intermediate outputs.
+3. Runs ANALYZE after passes that deleted rows, and VACUUM at most every
+   ``RETENTION_VACUUM_INTERVAL`` seconds to return the freed space.
+
+A Redis lock keeps concurrent services from working at the same time; a pass
+only releases the lock while it still holds it, so a pass that outlived the
+lock's expiry does not release the lock of the next one.
+``bulk_delete`` backs ``DELETE /research`` with the filters of the export.
+"""
+
+import os
+import json
+import gzip
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, text
+
+from .artifacts import get_store
+from .export import filter_research
+from .models import ResearchResult, StageHandoff, StageOutput, StageUsage, StatusEvent, engine, get_db, init_db
+from .queue_client import redis_conn
+
+# Days after which finished runs are archived and deleted (0 keeps them forever)
+RETENTION_DAYS = int(os.getenv('RETENTION_DAYS', '0'))
+# Days after which intermediate outputs of finished runs are deleted (0 keeps them)
+STAGE_OUTPUT_RETENTION_DAYS = int(os.getenv('STAGE_OUTPUT_RETENTION_DAYS', '0'))
+RETENTION_ARCHIVE_DIR = os.getenv('RETENTION_ARCHIVE_DIR', 'data/archive')
+RETENTION_BATCH_SIZE = int(os.getenv('RETENTION_BATCH_SIZE', '500'))
+RETENTION_INTERVAL = int(os.getenv('RETENTION_INTERVAL', '3600'))
+RETENTION_VACUUM_INTERVAL = int(os.getenv('RETENTION_VACUUM_INTERVAL', '86400'))
+
+FINISHED_STATUSES = ['completed', 'failed']
+
+LOCK_KEY = 'tv_research:retention:lock'
+LAST_RUN_KEY = 'tv_research:retention:last'
+VACUUM_KEY = 'tv_research:retention:vacuumed_at'
+
+# Deletes the lock only if it still holds this pass's token
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+def get_redis():
+    return redis_conn
+
+
+def _row(obj) -> dict:
+    """Every column of a model instance, JSON serializable"""
+    return {
+        column.name: value.isoformat() if isinstance(value, datetime) else value
+        for column in obj.__table__.columns
+        for value in [getattr(obj, column.name)]
+    }
+
+
+def _finished_before(query, cutoff: datetime):
+    return query.filter(
+        ResearchResult.status.in_(FINISHED_STATUSES),
+        func.coalesce(ResearchResult.completed_at, ResearchResult.created_at) < cutoff
+    )
+
+
+def delete_runs(db, research_ids: list) -> int:
+    """Delete runs with their stage outputs, usage, events and hand-offs, then orphaned report artifacts"""
+    if not research_ids:
+        return 0
+    report_ids = {
+        report_id for (report_id,) in db.query(ResearchResult.report_id).filter(
+            ResearchResult.id.in_(research_ids), ResearchResult.report_id.isnot(None)
+        )
+    }
+    for model in (StageOutput, StageUsage, StatusEvent, StageHandoff):
+        db.query(model).filter(model.research_id.in_(research_ids)).delete(synchronize_session=False)
+    deleted = db.query(ResearchResult).filter(ResearchResult.id.in_(research_ids)).delete(synchronize_session=False)
+    db.commit()
+
+    # Artifacts are content-addressed, so another run may share the report
+    shared = {
+        report_id for (report_id,) in db.query(ResearchResult.report_id).filter(
+            ResearchResult.report_id.in_(report_ids)
+        )
+    } if report_ids else set()
+    store = get_store()
+    for report_id in report_ids - shared:
+        try:
+            store.delete(report_id)
+        except Exception as e:
+            print(f"Could not delete report artifact {report_id}: {e}")
+    return deleted
+
+
+def _write_archive(db, runs: list) -> str:
+    """Write runs with their related rows to a new archive file; returns its path"""
+    research_ids = [run.id for run in runs]
+    related = {}
+    for name, model in (('stages', StageOutput), ('usage', StageUsage), ('events', StatusEvent)):
+        for item in db.query(model).filter(model.research_id.in_(research_ids)).order_by(model.id):
+            related.setdefault((item.research_id, name), []).append(_row(item))
+
+    os.makedirs(RETENTION_ARCHIVE_DIR, exist_ok=True)
+    name = f"research-{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}-{research_ids[0]}-{research_ids[-1]}.jsonl.gz"
+    path = os.path.join(RETENTION_ARCHIVE_DIR, name)
+    # Written under a temporary name, so a crash never leaves a partial archive behind
+    with gzip.open(path + '.tmp', 'wt', encoding='utf-8') as f:
+        for run in runs:
+            f.write(json.dumps({
+                'research': _row(run),
+                'stages': related.get((run.id, 'stages'), []),
+                'usage': related.get((run.id, 'usage'), []),
+                'events': related.get((run.id, 'events'), []),
+            }) + '\n')
+    os.replace(path + '.tmp', path)
+    return path
+
+
+def archive_runs(cutoff: datetime, batch_size: int = RETENTION_BATCH_SIZE) -> dict:
+    """Archive and delete finished runs older than ``cutoff``, a batch per file"""
+    report = {'archived': 0, 'files': []}
+    db = get_db()
+    try:
+        while True:
+            runs = _finished_before(db.query(ResearchResult), cutoff).order_by(
+                ResearchResult.id.asc()
+            ).limit(batch_size).all()
+            if not runs:
+                break
+            report['files'].append(_write_archive(db, runs))
+            report['archived'] += delete_runs(db, [run.id for run in runs])
+            db.expunge_all()
+    finally:
+        db.close()
+    return report
+
+
+def compact_runs(cutoff: datetime) -> dict:
+    """Delete intermediate stage outputs and status-change events of runs finished before ``cutoff``"""
+    db = get_db()
+    try:
+        finished = _finished_before(db.query(ResearchResult.id), cutoff).subquery()
+        stage_outputs = db.query(StageOutput).filter(
+            StageOutput.research_id.in_(db.query(finished.c.id)),
+            StageOutput.stage != 'final_reporting'
+        ).delete(synchronize_session=False)
+        events = db.query(StatusEvent).filter(
+            StatusEvent.research_id.in_(db.query(finished.c.id)),
+            StatusEvent.event == 'status'
+        ).delete(synchronize_session=False)
+        db.commit()
+        return {'stage_outputs': stage_outputs, 'status_events': events}
+    finally:
+        db.close()
+
+
+def maintain_database(vacuum: bool = False):
+    """Refresh planner statistics and optionally reclaim free space"""
+    postgres = engine.dialect.name == 'postgresql'
+    # VACUUM cannot run inside a transaction
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        if vacuum:
+            conn.execute(text('VACUUM (ANALYZE)' if postgres else 'VACUUM'))
+        if not (vacuum and postgres):
+            conn.execute(text('ANALYZE'))
+
+
+def bulk_delete(since: datetime = None, until: datetime = None, statuses: list = None,
+                topic: str = None, dry_run: bool = False) -> dict:
+    """Delete finished runs matching the export filters; queued and running runs are never touched"""
+    statuses = [status for status in statuses or FINISHED_STATUSES if status in FINISHED_STATUSES]
+    if not statuses:
+        return {'matched': 0, 'deleted': 0, 'dry_run': dry_run}
+    db = get_db()
+    try:
+        query = filter_research(db.query(ResearchResult.id), since, until, statuses, topic)
+        research_ids = [research_id for (research_id,) in query.order_by(ResearchResult.id)]
+        deleted = 0
+        if not dry_run:
+            for start in range(0, len(research_ids), RETENTION_BATCH_SIZE):
+                deleted += delete_runs(db, research_ids[start:start + RETENTION_BATCH_SIZE])
+        return {'matched': len(research_ids), 'deleted': deleted, 'dry_run': dry_run}
+    finally:
+        db.close()
+
+
+def retention_pass(now: datetime = None) -> dict:
+    """Archive, compact and maintain the database once; None if another service holds the lock"""
+    conn = get_redis()
+    token = uuid.uuid4().hex
+    if not conn.set(LOCK_KEY, token, nx=True, ex=max(RETENTION_INTERVAL, 300)):
+        return None
+    try:
+        now = now or datetime.utcnow()
+        started = time.time()
+        report = {'at': now.isoformat(), 'archived': 0, 'files': [], 'stage_outputs': 0, 'status_events': 0}
+        if RETENTION_DAYS > 0:
+            report.update(archive_runs(now - timedelta(days=RETENTION_DAYS)))
+        if STAGE_OUTPUT_RETENTION_DAYS > 0:
+            report.update(compact_runs(now - timedelta(days=STAGE_OUTPUT_RETENTION_DAYS)))
+
+        vacuumed_at = float(conn.get(VACUUM_KEY) or 0)
+        vacuum = time.time() - vacuumed_at >= RETENTION_VACUUM_INTERVAL
+        if vacuum or report['archived'] or report['stage_outputs'] or report['status_events']:
+            maintain_database(vacuum)
+            if vacuum:
+                conn.set(VACUUM_KEY, time.time())
+        report['vacuumed'] = vacuum
+        report['duration_seconds'] = round(time.time() - started, 1)
+        conn.set(LAST_RUN_KEY, json.dumps(report))
+        return report
+    finally:
+        conn.register_script(RELEASE_LOCK_SCRIPT)(keys=[LOCK_KEY], args=[token])
+
+
+def get_retention_report() -> dict:
+    """Policy and result of the last retention pass, for /metrics"""
+    last = get_redis().get(LAST_RUN_KEY)
+    return {
+        'retention_days': RETENTION_DAYS,
+        'stage_output_retention_days': STAGE_OUTPUT_RETENTION_DAYS,
+        'last_run': json.loads(last) if last else None,
+    }
+
+
+def run_retention(interval: int = RETENTION_INTERVAL):
+    """Run retention passes forever"""
+    print(f"Starting retention (archive after {RETENTION_DAYS or 'never'} days, "
+          f"compact after {STAGE_OUTPUT_RETENTION_DAYS or 'never'} days, interval={interval}s)")
+    while True:
+        try:
+            report = retention_pass()
+            if report and (report['archived'] or report['stage_outputs'] or report['status_events']):
+                print(f"Retention archived {report['archived']} run(s) to {len(report['files'])} file(s), "
+                      f"deleted {report['stage_outputs']} stage output(s) and {report['status_events']} event(s)")
+        except Exception as e:
+            print(f"Retention error: {e}")
+        time.sleep(interval)
+
+
+if __name__ == '__main__':
+    init_db()
+    run_retention()
@@ -0,0 +1,101 @@
+"""
+Freshness-bounded reuse of completed research reports.
+
+``POST /research`` returns an existing completed report instead of starting a
+new run when the same topic was researched for the same tenant within
+``max_age`` seconds. Topics are compared by a canonical key, so "AI  in
+Healthcare!" and "ai in healthcare" are the same request, while symbols that
+tell topics apart ("C#", "C++", "AT&T") are kept. A topic of punctuation only
+has an empty key and never reuses a report. High-priority
+requests (breaking news) only reuse a report when they set ``max_age``
+themselves. Hits and misses are counted in Redis.
+"""
+
+import os
+import re
+import unicodedata
+from datetime import datetime, timedelta
+
+from .models import ResearchResult
+from .queue_client import redis_conn, stored_tenant
+
+# Default freshness window when the request sets no max_age (0 disables reuse)
+REPORT_REUSE_MAX_AGE = int(os.getenv('REPORT_REUSE_MAX_AGE', '1800'))
+
+STATS_KEY = 'tv_research:reuse:stats'
+
+# Research without a topic (trending topics) shares one key
+TRENDING_TOPIC_KEY = '*trending*'
+
+# Punctuation that is part of a name rather than a separator
+KEPT_PUNCTUATION = '#&@%'
+
+def get_redis():
+    return redis_conn
+
+
+def _separates(text: str, index: int) -> bool:
+    """Whether the character at ``index`` is punctuation between words rather than part of one"""
+    char = text[index]
+    if not unicodedata.category(char).startswith('P') or char in KEPT_PUNCTUATION:
+        return False
+    inside_word = 0 < index < len(text) - 1 and text[index - 1].isalnum() and text[index + 1].isalnum()
+    return not inside_word
+
+
+def normalize_topic(topic: str) -> str:
+    """Canonical form of a topic: compatibility-normalized, accent-free,
+    case-folded, without separating punctuation and with single spaces.
+
+    Only a missing or blank topic maps to ``TRENDING_TOPIC_KEY``; a topic of
+    punctuation only normalizes to an empty key.
+    """
+    if not topic or not topic.strip():
+        return TRENDING_TOPIC_KEY
+    text = unicodedata.normalize('NFKD', topic)
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    text = unicodedata.normalize('NFKC', text).casefold()
+    text = ''.join(' ' if _separates(text, index) else char for index, char in enumerate(text))
+    return re.sub(r'\s+', ' ', text).strip()[:500]
+
+
+def reuse_max_age(max_age, priority: str) -> int:
+    """Freshness window of a request: its own ``max_age``, else the default unless it is high priority"""
+    if max_age is not None:
+        return max_age
+    return 0 if priority == 'high' else REPORT_REUSE_MAX_AGE
+
+
+def find_fresh_report(db, topic_key: str, max_age: int, tenant: str = None):
+    """Most recent completed on-demand report of ``tenant`` for ``topic_key`` no older than ``max_age`` seconds"""
+    if not max_age or max_age <= 0 or not topic_key:
+        return None
+    tenant = stored_tenant(tenant)
+    return db.query(ResearchResult).filter(
+        ResearchResult.topic_key == topic_key,
+        ResearchResult.tenant.is_(None) if tenant is None else ResearchResult.tenant == tenant,
+        ResearchResult.status == 'completed',
+        ResearchResult.schedule_name.is_(None),
+        ResearchResult.completed_at >= datetime.utcnow() - timedelta(seconds=max_age)
+    ).order_by(ResearchResult.completed_at.desc()).first()
+
+
+def record_reuse(hit: bool):
+    """Count a reuse lookup; errors are logged, never raised"""
+    try:
+        get_redis().hincrby(STATS_KEY, 'hits' if hit else 'misses', 1)
+    except Exception as e:
+        print(f"Could not record report reuse: {e}")
+
+
+def get_reuse_stats() -> dict:
+    """Hit and miss counts of report reuse lookups with the resulting hit rate"""
+    stats = {key.decode(): int(value) for key, value in get_redis().hgetall(STATS_KEY).items()}
+    hits, misses = stats.get('hits', 0), stats.get('misses', 0)
+    lookups = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / lookups * 100, 1) if lookups else 0.0,
+        'default_max_age': REPORT_REUSE_MAX_AGE
+    }
@@ -0,0 +1,141 @@
+"""
+Per-stage model routing with latency and cost budgets.
+
+Each agent in ``config/agents.yaml`` may set:
+
+- ``llm``: model of the agent's stage (default ``MODEL`` / ``OPENAI_MODEL``)
+- ``fallback_llm``: faster model the stage switches to once it is over budget
+- ``latency_budget_seconds``: wall time of one agent run, from its first LLM call
+- ``cost_budget_usd``: estimated cost of one agent run, from the tokens of its calls
+
+``STAGE_MODEL_<STAGE>``, ``STAGE_FALLBACK_MODEL_<STAGE>``,
+``STAGE_LATENCY_BUDGET_<STAGE>`` and ``STAGE_COST_BUDGET_<STAGE>`` override
+them per stage, e.g. ``STAGE_MODEL_FINAL_REPORTING=gpt-4o``.
+
+Once a budget is exceeded, every further LLM call of the agent run goes to the
+fallback model; a call in flight finishes on the model it started with. The
+fallback model, the calls it served and the budget outcome are stored with the
+stage's usage (see usage.py).
+"""
+
+import os
+import time
+from functools import lru_cache
+from pathlib import Path
+
+import yaml
+
+from .compaction import DEFAULT_MODEL
+from .llm import build_llm
+from .usage import estimate_cost
+
+AGENTS_FILE = Path(__file__).parent / 'config' / 'agents.yaml'
+
+STAGE_AGENTS = {
+    'trend_research': 'trend_researcher',
+    'news_aggregation': 'news_aggregator',
+    'content_strategy': 'content_strategist',
+    'final_reporting': 'reporting_analyst',
+}
+
+
+@lru_cache(maxsize=1)
+def _agents_config() -> dict:
+    with open(AGENTS_FILE) as f:
+        return yaml.safe_load(f) or {}
+
+
+def _budget(name: str, stage: str, configured) -> float:
+    value = os.getenv(f'{name}_{stage.upper()}')
+    if value is None or value == '':
+        value = configured
+    if value in (None, ''):
+        return None
+    try:
+        return float(value) if float(value) > 0 else None
+    except (TypeError, ValueError):
+        print(f"Ignoring invalid {name.lower()} of {stage}: {value!r}")
+        return None
+
+
+def stage_route(stage: str) -> dict:
+    """Model, fallback model and budgets of a stage"""
+    config = _agents_config().get(STAGE_AGENTS.get(stage), None) or {}
+    model = os.getenv(f'STAGE_MODEL_{stage.upper()}') or config.get('llm') or DEFAULT_MODEL
+    fallback = os.getenv(f'STAGE_FALLBACK_MODEL_{stage.upper()}') or config.get('fallback_llm')
+    return {
+        'model': model,
+        'fallback_model': fallback if fallback and fallback != model else None,
+        'latency_budget_seconds': _budget('STAGE_LATENCY_BUDGET', stage, config.get('latency_budget_seconds')),
+        'cost_budget_usd': _budget('STAGE_COST_BUDGET', stage, config.get('cost_budget_usd')),
+    }
+
+
+def stage_model(stage: str) -> str:
+    return stage_route(stage)['model']
+
+
+class StageBudget:
+    """Latency and cost budget of one agent run, shared by its LLM and the fallback LLM"""
+
+    def __init__(self, stage: str, fallback_model: str = None, latency_seconds: float = None,
+                 cost_usd: float = None):
+        self.stage = stage
+        self.fallback_model = fallback_model
+        self.latency_seconds = latency_seconds
+        self.cost_usd = cost_usd
+        self.started = None
+        self.spent_usd = 0.0
+        self.priced = True
+        self.calls = {}
+        self.outcome = None
+
+    def start(self):
+        if self.started is None:
+            self.started = time.monotonic()
+
+    def charge(self, model: str, prompt_tokens: int, completion_tokens: int):
+        """Account one finished LLM call"""
+        self.calls[model] = self.calls.get(model, 0) + 1
+        cost = estimate_cost(model, prompt_tokens, completion_tokens)
+        if cost is None:
+            self.priced = False
+        else:
+            self.spent_usd += cost
+
+    def exceeded(self) -> bool:
+        if self.outcome is None:
+            if self.latency_seconds and self.started is not None \
+                    and time.monotonic() - self.started > self.latency_seconds:
+                self.outcome = 'latency_exceeded'
+            elif self.cost_usd and self.spent_usd > self.cost_usd:
+                self.outcome = 'cost_exceeded'
+            if self.outcome and self.fallback_model:
+                print(f"{self.stage} {self.outcome.replace('_', ' ')}; falling back to {self.fallback_model}")
+        return self.outcome is not None
+
+    def usage(self) -> dict:
+        """Routing fields of the stage's usage row"""
+        self.exceeded()
+        fallback_calls = self.calls.get(self.fallback_model, 0) if self.fallback_model else 0
+        usage = {
+            'fallback_model': self.fallback_model if fallback_calls else None,
+            'fallback_calls': fallback_calls,
+            'budget_outcome': self.outcome or 'within_budget',
+        }
+        if fallback_calls and self.priced:
+            # The agent's token counter does not tell the two models apart
+            usage['cost_usd'] = round(self.spent_usd, 6)
+        return usage
+
+
+def build_stage_llm(stage: str):
+    """Rate-limited LLM of a stage's agent, falling back to the faster model once over budget"""
+    route = stage_route(stage)
+    if not (route['latency_budget_seconds'] or route['cost_budget_usd']):
+        return build_llm(route['model'])
+    budget = StageBudget(
+        stage, route['fallback_model'], route['latency_budget_seconds'], route['cost_budget_usd']
+    )
+    fallback = build_llm(route['fallback_model'], budget=budget) if route['fallback_model'] else None
+    return build_llm(route['model'], budget=budget, fallback=fallback)
@@ -0,0 +1,334 @@
+"""
+Scheduler for recurring research runs.
+
+Schedules are read from ``config/schedules.yaml``. A schedule either starts
+runs at fixed ``cron`` times, or has a deadline, in which case each run is
+started ahead of the deadline by the lead time estimated from observed stage
+latencies. The deadline is derived from the schedule's ``slot`` (its name,
+air time and days): the run must be ready ``ready_margin_minutes`` before the
+slot airs, and the slot's name is the ``time_slot`` input, so the deadline and
+the slot the report is written for cannot drift apart. A hand-written
+``ready_by`` cron expression is still accepted for schedules without a slot. Every occurrence is
+claimed with a Redis ``SET NX`` key, so several scheduler replicas never start
+the same run twice.
+
+Run with ``python -m tv_research.scheduler``. The latest completed report of a
+schedule is served from the database by ``GET /schedules/{name}/latest``.
+"""
+
+import os
+import re
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from zoneinfo import ZoneInfo
+
+import yaml
+
+from .models import ResearchResult, StageUsage, get_db, init_db
+from .tracing import start_trace
+from .queue_client import STAGES, TENANT_ID_PATTERN, enqueue_stage, redis_conn, stored_tenant, trend_entry_point
+
+SCHEDULES_FILE = os.getenv('SCHEDULES_FILE', str(Path(__file__).parent / 'config' / 'schedules.yaml'))
+SCHEDULE_TIMEZONE = os.getenv('SCHEDULE_TIMEZONE', 'UTC')
+SCHEDULER_INTERVAL = int(os.getenv('SCHEDULER_INTERVAL', '30'))
+# Occurrences missed by up to this long (e.g. scheduler restart) still run
+SCHEDULER_MISFIRE_GRACE = int(os.getenv('SCHEDULER_MISFIRE_GRACE', '3600'))
+# Lead time used before there is enough history to estimate it
+SCHEDULE_DEFAULT_LEAD = int(os.getenv('SCHEDULE_DEFAULT_LEAD', '1800'))
+SCHEDULE_SAFETY_FACTOR = float(os.getenv('SCHEDULE_SAFETY_FACTOR', '1.5'))
+SCHEDULE_SAFETY_MARGIN = int(os.getenv('SCHEDULE_SAFETY_MARGIN', '300'))
+# Minutes before a slot airs that its report must be ready
+SCHEDULE_READY_MARGIN = int(os.getenv('SCHEDULE_READY_MARGIN', '60'))
+
+CLAIM_KEY = 'tv_research:schedule:{name}:{occurrence}'
+
+_FIELD_RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 6)]
+
+
+class CronExpression:
+    """Minimal five-field cron expression (``*``, ``*/n``, ``a-b``, ``a-b/n``, lists)"""
+
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: {expression!r}")
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, self.weekdays = (
+            self._parse(field, low, high) for field, (low, high) in zip(fields, _FIELD_RANGES)
+        )
+        self.days_restricted = fields[2] != '*'
+        self.weekdays_restricted = fields[4] != '*'
+
+    @staticmethod
+    def _parse(field: str, low: int, high: int) -> set:
+        values = set()
+        for part in field.split(','):
+            step = 1
+            if '/' in part:
+                part, step = part.split('/')
+                step = int(step)
+            if part == '*':
+                start, end = low, high
+            elif '-' in part:
+                start, end = (int(value) for value in part.split('-'))
+            else:
+                start = end = int(part)
+            if start < low or end > high + (1 if high == 6 else 0):
+                raise ValueError(f"Cron value {part!r} out of range {low}-{high}")
+            values.update(value % 7 if high == 6 else value for value in range(start, end + 1, step))
+        return values
+
+    def _day_matches(self, moment: datetime) -> bool:
+        weekday = (moment.weekday() + 1) % 7  # cron: 0 = Sunday
+        day_ok = moment.day in self.days
+        weekday_ok = weekday in self.weekdays
+        # Like cron, a restricted day-of-month and day-of-week match either
+        if self.days_restricted and self.weekdays_restricted:
+            return day_ok or weekday_ok
+        return day_ok and weekday_ok
+
+    def next_after(self, moment: datetime) -> datetime:
+        """First matching minute strictly after ``moment`` (timezone-aware)"""
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = candidate + timedelta(days=366 * 4)
+        while candidate < limit:
+            if candidate.month not in self.months or not self._day_matches(candidate):
+                candidate = (candidate + timedelta(days=1)).replace(hour=0, minute=0)
+                continue
+            if candidate.hour not in self.hours:
+                candidate = (candidate + timedelta(hours=1)).replace(minute=0)
+                continue
+            if candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+                continue
+            return candidate
+        raise ValueError(f"Cron expression never matches: {self.expression!r}")
+
+
+def _minute_of_day(value) -> int:
+    """Minutes since midnight of an ``HH:MM`` time"""
+    if isinstance(value, int):
+        # YAML 1.1 reads an unquoted 20:00 as the sexagesimal number 1200
+        hour, minute = divmod(value, 60)
+    else:
+        hour, _, minute = str(value).partition(':')
+        hour, minute = int(hour), int(minute)
+    if not (0 <= hour <= 23 and 0 <= minute <= 59):
+        raise ValueError(f"Invalid time of day: {value!r}")
+    return hour * 60 + minute
+
+
+def slot_deadline(slot: dict, margin_minutes: int) -> str:
+    """``ready_by`` cron expression of a slot: its air time minus the margin, on the slot's days"""
+    if not slot.get('name') or slot.get('starts') is None:
+        raise ValueError("A slot needs a name and a starts time")
+    if margin_minutes < 0:
+        raise ValueError(f"Ready margin must not be negative: {margin_minutes}")
+    day_shift, minute = divmod(_minute_of_day(slot['starts']) - int(margin_minutes), 24 * 60)
+    days = str(slot.get('days', '*'))
+    if days != '*':
+        # The deadline falls day_shift days (0 or less) from the air day
+        weekdays = CronExpression._parse(days, *_FIELD_RANGES[4])
+        days = ','.join(str(day) for day in sorted({(day + day_shift) % 7 for day in weekdays}))
+    return f'{minute % 60} {minute // 60} * * {days}'
+
+
+def load_schedules(path: str = None) -> dict:
+    """Read and validate the schedule definitions"""
+    with open(path or SCHEDULES_FILE) as f:
+        config = yaml.safe_load(f) or {}
+    schedules = {}
+    for name, schedule in config.items():
+        slot = schedule.get('slot')
+        if slot:
+            inputs = schedule.get('inputs') or {}
+            if schedule.get('ready_by') or schedule.get('cron'):
+                print(f"Skipping schedule {name}: its deadline is derived from its slot, not ready_by or cron")
+                continue
+            if inputs.get('time_slot') not in (None, slot.get('name')):
+                print(f"Skipping schedule {name}: inputs time_slot '{inputs['time_slot']}' is not its slot")
+                continue
+            try:
+                ready_by = slot_deadline(slot, schedule.get('ready_margin_minutes', SCHEDULE_READY_MARGIN))
+            except (TypeError, ValueError) as e:
+                print(f"Skipping schedule {name}: invalid slot: {e}")
+                continue
+            schedule = {**schedule, 'ready_by': ready_by, 'inputs': {**inputs, 'time_slot': slot['name']}}
+        if not schedule.get('ready_by') and not schedule.get('cron'):
+            print(f"Skipping schedule {name}: needs ready_by or cron")
+            continue
+        if schedule.get('tenant') and not re.match(TENANT_ID_PATTERN, str(schedule['tenant'])):
+            print(f"Skipping schedule {name}: invalid tenant '{schedule['tenant']}'")
+            continue
+        schedule = dict(schedule)
+        schedule['expression'] = CronExpression(schedule.get('ready_by') or schedule['cron'])
+        schedule['tz'] = ZoneInfo(schedule.get('timezone') or SCHEDULE_TIMEZONE)
+        schedule.setdefault('priority', 'normal')
+        schedule.setdefault('inputs', {})
+        schedules[name] = schedule
+    return schedules
+
+
+def _percentile(values: list, pct: float):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def estimate_run_seconds(db) -> float:
+    """Estimate how long a research run takes from recent history.
+
+    Uses the larger of the summed p90 stage latencies and the p90 end-to-end
+    execution time (which includes queue waits), or None without history.
+    """
+    stage_total = 0.0
+    for stage in STAGES:
+        durations = [row[0] / 1000.0 for row in db.query(StageUsage.duration_ms).filter(
+            StageUsage.stage == stage,
+            StageUsage.status == 'completed',
+            StageUsage.duration_ms.isnot(None)
+        ).order_by(StageUsage.created_at.desc()).limit(50).all()]
+        stage_total += _percentile(durations, 90) or 0.0
+
+    end_to_end = [row[0] for row in db.query(ResearchResult.execution_time).filter(
+        ResearchResult.status == 'completed',
+        ResearchResult.execution_time.isnot(None)
+    ).order_by(ResearchResult.completed_at.desc()).limit(20).all()]
+    estimate = max(stage_total, _percentile(end_to_end, 90) or 0.0)
+    return estimate or None
+
+
+def lead_seconds(schedule: dict, estimate: float = None) -> int:
+    """How long before its ``ready_by`` deadline a run must be started"""
+    if not schedule.get('ready_by'):
+        return 0
+    if schedule.get('lead_minutes') is not None:
+        return int(schedule['lead_minutes'] * 60)
+    if estimate is None:
+        return SCHEDULE_DEFAULT_LEAD
+    return int(estimate * SCHEDULE_SAFETY_FACTOR + SCHEDULE_SAFETY_MARGIN)
+
+
+def next_occurrence(schedule: dict, now: datetime = None, lead: int = 0) -> dict:
+    """Next occurrence whose start time is not older than the misfire grace"""
+    now = (now or datetime.now(timezone.utc)).astimezone(schedule['tz'])
+    occurrence = schedule['expression'].next_after(now + timedelta(seconds=lead - SCHEDULER_MISFIRE_GRACE))
+    return {'occurrence': occurrence, 'start_at': occurrence - timedelta(seconds=lead)}
+
+
+def start_scheduled_run(name: str, schedule: dict, occurrence: datetime, priority: str) -> int:
+    """Create the research row for a scheduled occurrence and enqueue its first stage"""
+    inputs = {key: str(value) for key, value in schedule['inputs'].items()}
+    inputs['timestamp'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    ready_by = occurrence.astimezone(timezone.utc).replace(tzinfo=None) if schedule.get('ready_by') else None
+
+    db = get_db()
+    try:
+        with start_trace(f'schedule {name}', schedule=name, priority=priority) as root:
+            result = ResearchResult(
+                topic=inputs.get('research_focus'),
+                status='queued',
+                priority=priority,
+                schedule_name=name,
+                ready_by=ready_by,
+                tenant=stored_tenant(schedule.get('tenant')),
+                trace_id=root.trace_id if root else None
+            )
+            db.add(result)
+            db.commit()
+            db.refresh(result)
+            try:
+                job = enqueue_stage(
+                    'trend_research', trend_entry_point(inputs), result.id, inputs,
+                    priority=priority, tenant=schedule.get('tenant')
+                )
+                result.job_id = job.id
+            except Exception as e:
+                result.status = 'failed'
+                result.error_message = f"Failed to enqueue job: {str(e)}"
+            db.commit()
+            return result.id
+    finally:
+        db.close()
+
+
+def run_due(schedules: dict, now: datetime = None) -> list:
+    """Start every schedule occurrence that is due; returns the started runs"""
+    now = now or datetime.now(timezone.utc)
+    db = get_db()
+    try:
+        estimate = estimate_run_seconds(db)
+    finally:
+        db.close()
+
+    started = []
+    for name, schedule in schedules.items():
+        lead = lead_seconds(schedule, estimate)
+        planned = next_occurrence(schedule, now, lead)
+        if planned['start_at'] > now:
+            continue
+
+        occurrence = planned['occurrence']
+        key = CLAIM_KEY.format(name=name, occurrence=occurrence.strftime('%Y%m%dT%H%M%z'))
+        ttl = lead + SCHEDULER_MISFIRE_GRACE + 86400
+        if not redis_conn.set(key, 1, nx=True, ex=ttl):
+            continue
+
+        # A run that starts later than planned gets the high lane to catch up
+        late = (now - planned['start_at']).total_seconds() > SCHEDULER_INTERVAL * 2
+        priority = 'high' if late and schedule.get('ready_by') else schedule['priority']
+        research_id = start_scheduled_run(name, schedule, occurrence, priority)
+        redis_conn.set(key, research_id, ex=ttl)
+        print(
+            f"Started scheduled run {name} for {occurrence.isoformat()} "
+            f"(research {research_id}, lead {lead}s, priority {priority})"
+        )
+        started.append({'schedule': name, 'occurrence': occurrence.isoformat(), 'research_id': research_id})
+    return started
+
+
+def describe_schedules(schedules: dict, db, now: datetime = None) -> list:
+    """Planned next run and latest completed run of every schedule"""
+    now = now or datetime.now(timezone.utc)
+    estimate = estimate_run_seconds(db)
+    described = []
+    for name, schedule in schedules.items():
+        lead = lead_seconds(schedule, estimate)
+        planned = next_occurrence(schedule, now, lead)
+        latest = db.query(ResearchResult).filter(
+            ResearchResult.schedule_name == name,
+            ResearchResult.status == 'completed'
+        ).order_by(ResearchResult.completed_at.desc()).first()
+        described.append({
+            'name': name,
+            'slot': schedule.get('slot'),
+            'ready_by': schedule.get('ready_by'),
+            'cron': schedule.get('cron'),
+            'timezone': str(schedule['tz']),
+            'priority': schedule['priority'],
+            'lead_seconds': lead,
+            'next_occurrence': planned['occurrence'].isoformat(),
+            'next_start_at': planned['start_at'].isoformat(),
+            'latest_completed_id': latest.id if latest else None,
+            'latest_completed_at': latest.completed_at.isoformat() if latest and latest.completed_at else None,
+        })
+    return described
+
+
+def run_scheduler(interval: int = SCHEDULER_INTERVAL):
+    """Start due scheduled runs forever"""
+    schedules = load_schedules()
+    print(f"Starting scheduler with {len(schedules)} schedule(s): {', '.join(schedules)}")
+    while True:
+        try:
+            run_due(schedules)
+        except Exception as e:
+            print(f"Scheduler error: {e}")
+        time.sleep(interval)
+
+
+if __name__ == '__main__':
+    init_db()
+    run_scheduler()
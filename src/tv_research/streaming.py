@@ -0,0 +1,563 @@
+"""
+Streaming hand-off between the stages of a trending-topics run.
+
+A trending run (no ``research_focus``) waits at every stage boundary: news
+aggregation starts only once the trend agent has finished all 10-15 topics,
+and content strategy only once the news of every topic is in. With
+``STREAM_TRENDING_TOPICS`` (off by default) the stages overlap like a pipeline:
+
+1. The trend agent publishes each topic as a structured record with the
+   ``Publish Trending Topic`` tool as soon as it has researched it. The first
+   record starts the news stage.
+2. The news stage aggregates news per topic as the records arrive and emits
+   the news of each topic as a record of its own; the first one starts the
+   content strategy stage.
+3. Content strategy drafts story proposals for the topics whose news is in,
+   one agent call for everything that arrived since its previous call, until
+   the news stream ends. Final reporting runs on the merged strategy as usual.
+
+Records travel through a Redis stream per run and stage. Topics the trend
+agent did not publish are parsed from its final answer and emitted then, so
+a model that ignores the tool only loses the overlap. Every stage still
+completes through ``complete_stage``: a consumer started early is enqueued
+under the job ID of the upstream stage's hand-off (see handoff.py), so the
+hand-off finds it instead of enqueuing a second one.
+
+Consumers never hold a worker while they wait: a consumer works through the
+records available, then hands the stream over to a continuation job that runs
+``STREAM_POLL_SECONDS`` later. A lease per run and stage names the job allowed
+to consume, so a late hand-off job does not start a second chain. Progress is
+kept in the streams, so a continuation, a deferred consumer or one requeued
+after a crash skips the topics already done. While an upstream circuit breaker
+is open consumers are deferred like any other stage.
+
+With ``NEWS_FAN_OUT`` the news stage is split across all news workers instead
+(map-reduce): every topic record the trend stage emits is enqueued right away
+as a job of its own on the news lane, ``run_topic_news``, which emits that
+topic's news. When the trend stage completes, its hand-off enqueues the reduce
+job ``run_news_reduce`` as an RQ dependent of every topic job, so it runs once
+the last one has finished. The reduce merges the news in trend order,
+completes the news stage and ends the news stream; content strategy starts
+once it has. With N news workers a run's news stage takes about 1/N as long.
+Fan-out is off by default.
+"""
+
+import os
+import json
+import time
+import uuid
+import hashlib
+
+from rq.job import Job
+
+from .batching import parse_json_object
+from .compaction import compact_context
+from .crew import TVResearchCrew
+from .handoff import attempt_key, handoff_job_id
+from .memo import get_memoized, memo_enabled, publish, stage_memo_key
+from .queue_client import redis_conn
+from .refresh import split_sections
+from .resilience import CircuitOpenError
+from .reuse import normalize_topic
+from .routing import stage_model
+from .tools import PublishTopicTool
+from .usage import record_stage_usage, track_stage_usage
+from .worker import (
+    complete_stage, current_job_id, defer_stage, enqueue_stage, run_final_reporting, run_news_aggregation,
+    update_task_status, with_heartbeat
+)
+from crewai import Task
+
+# Seconds a stage waits for the next record of its upstream stage before failing the run
+STREAM_IDLE_TIMEOUT = int(os.getenv('STREAM_IDLE_TIMEOUT', '1800'))
+# Seconds between the polls of a consumer that has caught up with its upstream stage
+STREAM_POLL_SECONDS = int(os.getenv('STREAM_POLL_SECONDS', '10'))
+STREAM_TTL = int(os.getenv('STREAM_TTL', '86400'))
+# Topics content strategy drafts proposals for in one agent call at most
+STREAM_STRATEGY_BATCH = int(os.getenv('STREAM_STRATEGY_BATCH', '4'))
+# Aggregate the news of each topic as a job of its own, spread across the news workers
+NEWS_FAN_OUT = os.getenv('NEWS_FAN_OUT', 'false').lower() not in ('0', 'false', 'no')
+
+KEY_PREFIX = 'tv_research:stream'
+STREAM_STAGES = ('trend_research', 'news_aggregation', 'content_strategy')
+
+TREND_FIELDS = (
+    ('description', 'Description'),
+    ('engagement', 'Engagement'),
+    ('trajectory', 'Trajectory'),
+    ('audience', 'Audience'),
+    ('relevance', 'Broadcast relevance'),
+    ('time_sensitivity', 'Time-sensitivity'),
+)
+
+
+class StreamFailed(Exception):
+    """The upstream stage of a stream failed the run"""
+
+
+def stream_key(research_id: int, stage: str) -> str:
+    return f'{KEY_PREFIX}:{research_id}:{stage}'
+
+
+def started_key(research_id: int, stage: str) -> str:
+    return f'{KEY_PREFIX}:{research_id}:started:{stage}'
+
+
+def lease_key(research_id: int, stage: str) -> str:
+    return f'{KEY_PREFIX}:{research_id}:consumer:{stage}'
+
+
+def topic_key(record: dict) -> str:
+    return normalize_topic(str(record.get('topic') or ''))
+
+
+def _append(research_id: int, stage: str, fields: dict):
+    key = stream_key(research_id, stage)
+    pipe = redis_conn.pipeline()
+    pipe.xadd(key, fields)
+    pipe.expire(key, STREAM_TTL)
+    pipe.execute()
+
+
+def emitted(research_id: int, stage: str) -> list:
+    """Records a stage of a run has emitted so far, in order"""
+    return [
+        json.loads(fields[b'record'])
+        for _, fields in redis_conn.xrange(stream_key(research_id, stage)) if b'record' in fields
+    ]
+
+
+def read_stream(research_id: int, stage: str) -> tuple:
+    """``(records, ended, last_at)`` of a stage's stream, without waiting.
+
+    ``last_at`` is the unix time of the latest entry. Raises ``StreamFailed``
+    once the stage has failed the run.
+    """
+    records, ended, last_at = [], False, None
+    for entry_id, fields in redis_conn.xrange(stream_key(research_id, stage)):
+        last_at = int(entry_id.split(b'-')[0]) / 1000
+        if b'error' in fields:
+            raise StreamFailed(fields[b'error'].decode())
+        if b'end' in fields:
+            ended = True
+        elif b'record' in fields:
+            records.append(json.loads(fields[b'record']))
+    return records, ended, last_at
+
+
+def delete_streams(research_id: int):
+    redis_conn.delete(
+        *[stream_key(research_id, stage) for stage in STREAM_STAGES],
+        *[lease_key(research_id, stage) for stage in STREAM_STAGES],
+        started_key(research_id, 'news_aggregation'), started_key(research_id, 'content_strategy')
+    )
+
+
+def unique_records(records: list) -> list:
+    """``records`` without repeated topics; concurrent topic jobs may emit a topic twice"""
+    seen = set()
+    unique = []
+    for record in records:
+        key = topic_key(record)
+        if key not in seen:
+            seen.add(key)
+            unique.append(record)
+    return unique
+
+
+def claim_consumer(research_id: int, stage: str) -> bool:
+    """True if the current job holds the consumer lease of a stage, taking it when free"""
+    job_id = current_job_id() or ''
+    key = lease_key(research_id, stage)
+    if redis_conn.set(key, job_id, nx=True, ex=STREAM_TTL):
+        return True
+    return (redis_conn.get(key) or b'').decode() == job_id
+
+
+def continue_later(research_id: int, stage: str, func, inputs: dict, priority: str = 'normal',
+                   error: CircuitOpenError = None):
+    """Hand a consumer's lease to a continuation job, polling again later or deferred by ``error``"""
+    job_id = f'stream-{research_id}-{stage}-{uuid.uuid4().hex[:12]}'
+    redis_conn.set(lease_key(research_id, stage), job_id, ex=STREAM_TTL)
+    if error is not None:
+        defer_stage(research_id, stage, func, error, inputs, priority=priority, job_id=job_id)
+        return
+    enqueue_stage(stage, func, research_id, inputs, priority=priority, delay=STREAM_POLL_SECONDS, job_id=job_id)
+    # The reaper leaves the run alone while its job is scheduled
+    update_task_status(research_id, f'{stage}_running', job_id=job_id)
+
+
+def check_idle(stage: str, upstream: str, last_at: float):
+    if last_at is not None and time.time() - last_at > STREAM_IDLE_TIMEOUT:
+        raise TimeoutError(f"{upstream} sent no topic to {stage} for {STREAM_IDLE_TIMEOUT}s")
+
+
+def start_downstream(research_id: int, stage: str, next_stage: str, func, *args, priority: str = 'normal'):
+    """Enqueue the next stage early, under the job ID the stage's hand-off looks for.
+
+    Only the first call per run and stage enqueues; the others return at once.
+    """
+    job_id = handoff_job_id(attempt_key(research_id, stage))
+    try:
+        # Topic jobs of a fanned-out stage call this concurrently
+        if not redis_conn.set(started_key(research_id, next_stage), job_id, nx=True, ex=STREAM_TTL):
+            return
+        if not Job.exists(job_id, connection=redis_conn):
+            enqueue_stage(next_stage, func, *args, priority=priority, job_id=job_id)
+    except Exception as e:
+        # The hand-off enqueues it once the stage completes
+        print(f"Could not start {next_stage} early for task {research_id}: {e}")
+
+
+def topic_job_id(research_id: int, record: dict) -> str:
+    """RQ job ID of the fanned-out news job of a topic"""
+    return f"news-{research_id}-{hashlib.sha1(topic_key(record).encode()).hexdigest()[:12]}"
+
+
+def enqueue_topic_news(research_id: int, inputs: dict, record: dict, priority: str = 'normal') -> str:
+    """Enqueue the news job of a topic unless it exists; returns its job ID"""
+    job_id = topic_job_id(research_id, record)
+    if not Job.exists(job_id, connection=redis_conn):
+        enqueue_stage(
+            'news_aggregation', run_topic_news, research_id, inputs, record, priority=priority, job_id=job_id
+        )
+    return job_id
+
+
+class TopicEmitter:
+    """Emits the topic records of a stage once each, handing every new one to ``on_emit``"""
+
+    def __init__(self, research_id: int, stage: str, on_emit):
+        self.research_id = research_id
+        self.stage = stage
+        self.on_emit = on_emit
+        # A requeued stage continues where its previous attempt stopped
+        self.records = emitted(research_id, stage)
+        self.seen = {topic_key(record) for record in self.records}
+
+    def emit(self, record: dict) -> bool:
+        key = topic_key(record)
+        if not key or key in self.seen:
+            return False
+        _append(self.research_id, self.stage, {'record': json.dumps(record)})
+        self.seen.add(key)
+        self.records.append(record)
+        self.on_emit(record)
+        return True
+
+    def close(self):
+        _append(self.research_id, self.stage, {'end': 1})
+
+    def fail(self, error: Exception):
+        try:
+            _append(self.research_id, self.stage, {'error': str(error)[:500] or type(error).__name__})
+        except Exception as e:
+            print(f"Could not abort {self.stage} stream of task {self.research_id}: {e}")
+
+
+def parse_topic_records(text: str) -> list:
+    """Topic records listed in the final answer of the streaming trend stage"""
+    payload = parse_json_object(text or '')
+    items = payload.get('topics') if isinstance(payload, dict) else None
+    return [
+        item for item in items if isinstance(item, dict) and str(item.get('topic') or '').strip()
+    ] if isinstance(items, list) else []
+
+
+def format_trend_record(record: dict) -> str:
+    lines = [f"### {record['topic']}"]
+    lines.extend(
+        f"- {label}: {record[field]}" for field, label in TREND_FIELDS if record.get(field) not in (None, '')
+    )
+    return '\n'.join(lines)
+
+
+def merge_topic_sections(records: list, field: str) -> str:
+    """One markdown section per topic record holding its ``field``"""
+    return '\n\n'.join(f"### {record['topic']}\n\n{record[field]}" for record in records)
+
+
+@with_heartbeat('trend_research')
+def run_trend_stream(task_id: int, inputs: dict, priority: str = 'normal'):
+    """Trend stage of a streaming run: publishes each topic as soon as it is researched"""
+    if NEWS_FAN_OUT:
+        def on_emit(record):
+            try:
+                enqueue_topic_news(task_id, inputs, record, priority)
+            except Exception as e:
+                # Enqueued again once the stage completes
+                print(f"Could not enqueue news of '{record['topic']}' for task {task_id}: {e}")
+    else:
+        def on_emit(record):
+            start_downstream(
+                task_id, 'trend_research', 'news_aggregation', run_news_stream, task_id, inputs, priority=priority
+            )
+
+    emitter = TopicEmitter(task_id, 'trend_research', on_emit)
+    try:
+        update_task_status(task_id, 'running', job_id=current_job_id())
+
+        crew = TVResearchCrew()
+        trend_agent = crew.trend_researcher()
+        trend_task = Task(config=crew.tasks_config['trend_research_stream_task'])
+
+        # Identical trending runs reuse the topics (see memo.py)
+        memo_key = None
+        if memo_enabled():
+            model = stage_model('trend_research')
+            memo_key = stage_memo_key(
+                'trend_research', inputs, model, crew.tasks_config['trend_research_stream_task']
+            )
+        cached = get_memoized(memo_key) if memo_key else None
+        if cached is not None:
+            print(f"Task {task_id} reusing trend stage of research {cached['research_id']}")
+            result = cached['result']
+            record_stage_usage(task_id, 'trend_research', {'cost_usd': 0.0}, 0, 'memoized')
+        else:
+            with track_stage_usage(task_id, 'trend_research', trend_agent, trend_task):
+                result = str(trend_agent.execute_task(
+                    trend_task, inputs, tools=[*trend_agent.tools, PublishTopicTool(emitter.emit)]
+                ))
+            if memo_key:
+                publish(memo_key, task_id, result)
+
+        # Topics the agent listed without publishing them
+        for record in parse_topic_records(result):
+            emitter.emit(record)
+
+        if not emitter.records:
+            print(f"Trend stage of task {task_id} returned no topic records; continuing without streaming")
+            complete_stage(
+                task_id, 'trend_research', result,
+                'news_aggregation', run_news_aggregation, task_id, inputs, result, priority=priority
+            )
+            return result
+
+        if NEWS_FAN_OUT:
+            # The reduce runs once the news job of every topic has finished
+            topic_jobs = [enqueue_topic_news(task_id, inputs, record, priority) for record in emitter.records]
+            complete_stage(
+                task_id, 'trend_research', result,
+                'news_aggregation', run_news_reduce, task_id, inputs, priority=priority, depends_on=topic_jobs
+            )
+        else:
+            complete_stage(
+                task_id, 'trend_research', result,
+                'news_aggregation', run_news_stream, task_id, inputs, priority=priority
+            )
+        emitter.close()
+        print(f"Trend stage of task {task_id} streamed {len(emitter.records)} topics")
+        return result
+
+    except CircuitOpenError as e:
+        defer_stage(task_id, 'trend_research', run_trend_stream, e, inputs, priority=priority)
+        return None
+    except Exception as e:
+        emitter.fail(e)
+        update_task_status(task_id, 'failed', error_message=str(e))
+        raise
+
+
+def aggregate_topic_news(task_id: int, inputs: dict, record: dict) -> str:
+    """News of one trending topic"""
+    crew = TVResearchCrew()
+    news_agent = crew.news_aggregator()
+    news_task = Task(config=crew.tasks_config['news_aggregation_topic_task'])
+
+    topic_inputs = {**inputs, 'research_focus': record['topic'], 'trend_analysis': format_trend_record(record)}
+    stage_inputs, _ = compact_context(topic_inputs, 'news_aggregation')
+    with track_stage_usage(task_id, 'news_aggregation', news_agent, news_task):
+        return str(news_agent.execute_task(news_task, stage_inputs))
+
+
+@with_heartbeat('news_aggregation')
+def run_news_stream(task_id: int, inputs: dict, priority: str = 'normal'):
+    """News stage of a streaming run: aggregates news per topic as the trend stage publishes them"""
+    if not claim_consumer(task_id, 'news_aggregation'):
+        print(f"News stage of task {task_id} is already consumed by another job")
+        return None
+    emitter = TopicEmitter(task_id, 'news_aggregation', lambda record: start_downstream(
+        task_id, 'news_aggregation', 'content_strategy', run_strategy_stream, task_id, inputs, priority=priority
+    ))
+    try:
+        update_task_status(task_id, 'news_aggregation_running', job_id=current_job_id())
+
+        while True:
+            records, ended, last_at = read_stream(task_id, 'trend_research')
+            pending = [record for record in records if topic_key(record) not in emitter.seen]
+            for record in pending:
+                emitter.emit({'topic': record['topic'], 'news': aggregate_topic_news(task_id, inputs, record)})
+            if ended:
+                break
+            if not pending:
+                # Caught up with the trend stage; free the worker until more topics arrive
+                check_idle('news_aggregation', 'trend_research', last_at)
+                continue_later(task_id, 'news_aggregation', run_news_stream, inputs, priority)
+                return None
+
+        result = merge_topic_sections(emitter.records, 'news')
+        complete_stage(
+            task_id, 'news_aggregation', result,
+            'content_strategy', run_strategy_stream, task_id, inputs, priority=priority
+        )
+        emitter.close()
+        return result
+
+    except CircuitOpenError as e:
+        continue_later(task_id, 'news_aggregation', run_news_stream, inputs, priority, error=e)
+        return None
+    except StreamFailed as e:
+        # The trend stage failed the run; keep it failed over this stage's status
+        emitter.fail(e)
+        update_task_status(task_id, 'failed')
+        print(f"News stage of task {task_id} stopped: trend stage failed ({e})")
+        return None
+    except Exception as e:
+        emitter.fail(e)
+        update_task_status(task_id, 'failed', error_message=str(e))
+        raise
+
+
+@with_heartbeat('news_aggregation')
+def run_topic_news(task_id: int, inputs: dict, record: dict, priority: str = 'normal'):
+    """Map job of a fanned-out news stage: aggregates the news of one topic.
+
+    The run's status is left to the reduce, as several topic jobs run at once.
+    """
+    try:
+        # Requeued after its news was emitted
+        if topic_key(record) in {topic_key(news) for news in emitted(task_id, 'news_aggregation')}:
+            return None
+        news = aggregate_topic_news(task_id, inputs, record)
+        _append(task_id, 'news_aggregation', {'record': json.dumps({'topic': record['topic'], 'news': news})})
+        return news
+    except CircuitOpenError as e:
+        defer_stage(
+            task_id, 'news_aggregation', run_topic_news, e, inputs, record, priority=priority, set_status=False
+        )
+        return None
+    except Exception as e:
+        # The reduce never runs after a failed topic job
+        _append(task_id, 'news_aggregation', {'error': f"{record['topic']}: {e}"[:500]})
+        update_task_status(task_id, 'failed', error_message=str(e))
+        raise
+
+
+@with_heartbeat('news_aggregation')
+def run_news_reduce(task_id: int, inputs: dict, priority: str = 'normal'):
+    """Reduce job of a fanned-out news stage: merges the news of every topic in trend order.
+
+    A topic job deferred by an open circuit breaker finishes before its news is
+    in, so the reduce polls again until the news of every topic has arrived.
+    """
+    try:
+        update_task_status(task_id, 'news_aggregation_running', job_id=current_job_id())
+
+        records, _, last_at = read_stream(task_id, 'news_aggregation')
+        news = {topic_key(record): record for record in records}
+        topics, _, trend_at = read_stream(task_id, 'trend_research')
+        missing = [record['topic'] for record in topics if topic_key(record) not in news]
+        if missing:
+            if time.time() - (last_at or trend_at or time.time()) > STREAM_IDLE_TIMEOUT:
+                raise TimeoutError(f"No news for {len(missing)} topics: {', '.join(missing)}")
+            continue_later(task_id, 'news_aggregation', run_news_reduce, inputs, priority)
+            return None
+
+        result = merge_topic_sections([news[topic_key(record)] for record in topics], 'news')
+        complete_stage(
+            task_id, 'news_aggregation', result,
+            'content_strategy', run_strategy_stream, task_id, inputs, priority=priority
+        )
+        _append(task_id, 'news_aggregation', {'end': 1})
+        print(f"News stage of task {task_id} merged the news of {len(topics)} topics")
+        return result
+
+    except StreamFailed as e:
+        # A topic job failed the run
+        update_task_status(task_id, 'failed')
+        print(f"News stage of task {task_id} stopped: {e}")
+        return None
+    except Exception as e:
+        _append(task_id, 'news_aggregation', {'error': str(e)[:500] or type(e).__name__})
+        update_task_status(task_id, 'failed', error_message=str(e))
+        raise
+
+
+def draft_strategy(task_id: int, inputs: dict, records: list, trends: dict, drafts: list) -> str:
+    """Story proposals for the topics of ``records``, the news records that arrived together"""
+    crew = TVResearchCrew()
+    content_agent = crew.content_strategist()
+    content_task = Task(config=crew.tasks_config['content_strategy_stream_task'])
+
+    drafted = [title for draft in drafts for _, title, _ in split_sections(draft)[1]]
+    batch_inputs = {
+        **inputs,
+        'trend_analysis': '\n\n'.join(
+            format_trend_record(trends.get(topic_key(record), record)) for record in records
+        ),
+        'news_analysis': merge_topic_sections(records, 'news'),
+        'drafted_proposals': '\n'.join(f'- {title}' for title in drafted) or 'None yet',
+    }
+    stage_inputs, _ = compact_context(batch_inputs, 'content_strategy')
+    with track_stage_usage(task_id, 'content_strategy', content_agent, content_task):
+        return str(content_agent.execute_task(content_task, stage_inputs))
+
+
+@with_heartbeat('content_strategy')
+def run_strategy_stream(task_id: int, inputs: dict, priority: str = 'normal'):
+    """Content strategy of a streaming run: drafts proposals as the news of each topic completes.
+
+    Every draft is emitted to the run's ``content_strategy`` stream with the
+    topics it covers, so a continuation picks up where the previous job stopped.
+    """
+    if not claim_consumer(task_id, 'content_strategy'):
+        print(f"Content strategy of task {task_id} is already consumed by another job")
+        return None
+    try:
+        update_task_status(task_id, 'content_strategy_running', job_id=current_job_id())
+
+        batch_size = max(1, STREAM_STRATEGY_BATCH)
+        while True:
+            records, ended, last_at = read_stream(task_id, 'news_aggregation')
+            drafts = emitted(task_id, 'content_strategy')
+            drafted = {key for draft in drafts for key in draft['topics']}
+            pending = [record for record in unique_records(records) if topic_key(record) not in drafted]
+            if not pending:
+                if ended:
+                    break
+                # Caught up with the news stage; free the worker until more news arrives
+                check_idle('content_strategy', 'news_aggregation', last_at)
+                continue_later(task_id, 'content_strategy', run_strategy_stream, inputs, priority)
+                return None
+
+            trends = {topic_key(record): record for record in emitted(task_id, 'trend_research')}
+            for start in range(0, len(pending), batch_size):
+                batch = pending[start:start + batch_size]
+                draft = draft_strategy(task_id, inputs, batch, trends, [draft['draft'] for draft in drafts])
+                drafts.append({'topics': [topic_key(record) for record in batch], 'draft': draft})
+                _append(task_id, 'content_strategy', {'record': json.dumps(drafts[-1])})
+
+        # Final reporting reads the whole run's context in trend order, as in the batch pipeline
+        topics = emitted(task_id, 'trend_research')
+        order = {topic_key(record): index for index, record in enumerate(topics)}
+        news_records = sorted(unique_records(records), key=lambda record: order.get(topic_key(record), len(order)))
+        inputs['trend_analysis'] = '\n\n'.join(format_trend_record(record) for record in topics)
+        inputs['news_analysis'] = merge_topic_sections(news_records, 'news')
+        result = '\n\n'.join(draft['draft'] for draft in drafts)
+        if complete_stage(
+            task_id, 'content_strategy', result,
+            'final_reporting', run_final_reporting, task_id, inputs, result, priority=priority
+        ):
+            delete_streams(task_id)
+        return result
+
+    except CircuitOpenError as e:
+        continue_later(task_id, 'content_strategy', run_strategy_stream, inputs, priority, error=e)
+        return None
+    except StreamFailed as e:
+        update_task_status(task_id, 'failed')
+        print(f"Content strategy of task {task_id} stopped: news stage failed ({e})")
+        return None
+    except Exception as e:
+        update_task_status(task_id, 'failed', error_message=str(e))
+        raise
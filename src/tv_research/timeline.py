@@ -0,0 +1,169 @@
+"""
+Status history and queue-wait / service-time breakdown of research runs.
+
+Every stage job writes ``status_events`` rows with millisecond timestamps:
+``enqueued`` when it is put on its lane (or, for delayed stages, when it
+becomes due), ``started`` when a worker picks it up and ``finished`` or
+``failed`` when it returns. Finish events carry the stage's run time measured
+with the worker's monotonic clock; ``update_task_status`` adds a ``status``
+event for every status change.
+
+Queue wait is the time from ``enqueued`` to ``started`` and service time the
+run time of the job, so a run's latency splits into waiting for capacity and
+doing work. Timestamps are taken in different processes and assume clocks
+synchronised to well under the waits being measured.
+"""
+
+import math
+import time
+from datetime import timedelta
+
+from .models import SessionLocal, StatusEvent
+
+# Window of stage timings aggregated by GET /metrics
+TIMING_WINDOW = timedelta(hours=24)
+
+
+def now_ms() -> int:
+    return time.time_ns() // 1_000_000
+
+
+def record_events(research_ids: list, event: str, stage: str = None, job_id: str = None,
+                  at_ms: int = None, duration_ms: int = None):
+    """Append an event for each research run; errors are logged, never raised"""
+    at_ms = at_ms or now_ms()
+    db = SessionLocal()
+    try:
+        db.add_all([
+            StatusEvent(
+                research_id=research_id,
+                event=event,
+                stage=stage,
+                job_id=job_id,
+                at_ms=at_ms,
+                duration_ms=duration_ms
+            )
+            for research_id in research_ids
+        ])
+        db.commit()
+    except Exception as e:
+        print(f"Could not record {event} event of {stage} for {research_ids}: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+
+def stage_intervals(events: list) -> list:
+    """Queue wait and service time of every stage attempt in ``events`` of one run"""
+    intervals = []
+    waiting = {}
+    running = {}
+    for event in sorted(events, key=lambda item: (item.at_ms, item.id or 0)):
+        key = (event.stage, event.job_id)
+        if event.event == 'enqueued':
+            # A job requeued while running lost its worker (see reaper.py)
+            if key in running:
+                running.pop(key)['outcome'] = 'lost'
+            waiting[key] = event.at_ms
+        elif event.event == 'started':
+            enqueued = waiting.pop(key, None)
+            running[key] = {
+                'stage': event.stage,
+                'job_id': event.job_id,
+                'enqueued_at_ms': enqueued,
+                'started_at_ms': event.at_ms,
+                'queue_wait_ms': max(0, event.at_ms - enqueued) if enqueued is not None else None,
+                'service_ms': None,
+                'outcome': 'running',
+            }
+            intervals.append(running[key])
+        elif event.event in ('finished', 'failed') and key in running:
+            interval = running.pop(key)
+            interval['service_ms'] = (
+                event.duration_ms if event.duration_ms is not None else event.at_ms - interval['started_at_ms']
+            )
+            interval['outcome'] = event.event
+    # Stages still on their lane
+    for (stage, job_id), enqueued in waiting.items():
+        intervals.append({
+            'stage': stage,
+            'job_id': job_id,
+            'enqueued_at_ms': enqueued,
+            'started_at_ms': None,
+            'queue_wait_ms': None,
+            'service_ms': None,
+            'outcome': 'waiting',
+        })
+    return intervals
+
+
+def summarize_intervals(intervals: list) -> dict:
+    """Total queue wait and service time per stage and for the whole run"""
+    by_stage = {}
+    totals = {'attempts': 0, 'queue_wait_ms': 0, 'service_ms': 0}
+    for interval in intervals:
+        stage = by_stage.setdefault(interval['stage'], {'attempts': 0, 'queue_wait_ms': 0, 'service_ms': 0})
+        stage['attempts'] += 1
+        totals['attempts'] += 1
+        for field in ('queue_wait_ms', 'service_ms'):
+            stage[field] += interval[field] or 0
+            totals[field] += interval[field] or 0
+    return {'by_stage': by_stage, 'totals': totals}
+
+
+def get_timeline(db, research_id: int) -> dict:
+    """Status history of a research run with its per-stage time breakdown"""
+    events = db.query(StatusEvent).filter(
+        StatusEvent.research_id == research_id
+    ).order_by(StatusEvent.at_ms.asc(), StatusEvent.id.asc()).all()
+    intervals = stage_intervals(events)
+    return {
+        'events': [event.to_dict() for event in events],
+        'stages': intervals,
+        **summarize_intervals(intervals),
+    }
+
+
+def _percentile(values: list, pct: float):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[max(1, math.ceil(pct / 100 * len(values))) - 1]
+
+
+def _distribution(values: list) -> dict:
+    return {
+        'avg': round(sum(values) / len(values)) if values else None,
+        'p50': _percentile(values, 50),
+        'p95': _percentile(values, 95),
+        'max': max(values) if values else None,
+    }
+
+
+def get_timing_report(db, window: timedelta = TIMING_WINDOW) -> dict:
+    """Queue wait and service time distributions per stage over recent runs"""
+    since = now_ms() - int(window.total_seconds() * 1000)
+    events = db.query(StatusEvent).filter(
+        StatusEvent.at_ms >= since,
+        StatusEvent.event.in_(['enqueued', 'started', 'finished', 'failed'])
+    ).all()
+    by_research = {}
+    for event in events:
+        by_research.setdefault(event.research_id, []).append(event)
+
+    waits, services = {}, {}
+    for research_events in by_research.values():
+        for interval in stage_intervals(research_events):
+            if interval['queue_wait_ms'] is not None:
+                waits.setdefault(interval['stage'], []).append(interval['queue_wait_ms'])
+            if interval['service_ms'] is not None:
+                services.setdefault(interval['stage'], []).append(interval['service_ms'])
+
+    return {
+        stage: {
+            'attempts': max(len(waits.get(stage, [])), len(services.get(stage, []))),
+            'queue_wait_ms': _distribution(waits.get(stage, [])),
+            'service_ms': _distribution(services.get(stage, [])),
+        }
+        for stage in sorted(set(waits) | set(services))
+    }
@@ -8,4 +8,7 @@ These tools can be extended to add specialized functionality like:
 - Report formatting
 """
 
-__all__ = []
+from .publish_topic import PublishTopicTool, TrendingTopic
+from .rate_limited import RateLimitedScrapeWebsiteTool, RateLimitedSerperDevTool
+
+__all__ = ['RateLimitedSerperDevTool', 'RateLimitedScrapeWebsiteTool', 'PublishTopicTool', 'TrendingTopic']
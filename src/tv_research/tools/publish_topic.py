@@ -0,0 +1,46 @@
+"""
+Tool the trend agent of a streaming run publishes each researched topic with,
+so the news stage can start on it right away (see streaming.py).
+"""
+
+from typing import Callable, Optional, Type
+
+from crewai.tools import BaseTool
+from pydantic import BaseModel, Field, PrivateAttr
+
+
+class TrendingTopic(BaseModel):
+    """Structured record of one trending topic"""
+
+    topic: str = Field(..., description="Name of the trending topic")
+    description: str = Field(..., description="Brief description of the topic and why it is trending")
+    engagement: Optional[str] = Field(
+        None, description="Estimated reach, social media mentions and news coverage"
+    )
+    trajectory: Optional[str] = Field(None, description="Trend trajectory: rising, peaking or declining")
+    audience: Optional[str] = Field(None, description="Target audience demographics")
+    relevance: Optional[int] = Field(None, description="Relevance score for TV broadcast, 1-10")
+    time_sensitivity: Optional[str] = Field(None, description="Breaking, developing or evergreen")
+
+
+class PublishTopicTool(BaseTool):
+    """Hands each topic to ``publish``, which returns False for topics published before"""
+
+    name: str = "Publish Trending Topic"
+    description: str = (
+        "Publish one trending topic as soon as you have finished researching it, before "
+        "moving on to the next topic. News research on the topic starts immediately. "
+        "Publish every topic exactly once."
+    )
+    args_schema: Type[BaseModel] = TrendingTopic
+    _publish: Callable = PrivateAttr()
+
+    def __init__(self, publish: Callable, **kwargs):
+        super().__init__(**kwargs)
+        self._publish = publish
+
+    def _run(self, **kwargs) -> str:
+        record = TrendingTopic(**kwargs).model_dump(exclude_none=True)
+        if self._publish(record):
+            return f"Published '{record['topic']}'. Continue with the next topic."
+        return f"'{record['topic']}' was already published. Continue with the next topic."
@@ -0,0 +1,48 @@
+"""
+Search and scrape tools that respect the cluster-wide rate limits, circuit
+breakers and concurrency limits. Calls are recorded or replayed when the run
+uses a cassette (see cassette.py).
+"""
+
+import os
+from typing import Optional
+
+from crewai_tools import ScrapeWebsiteTool, SerperDevTool
+
+from ..cassette import cassette_call
+from ..ratelimit import tool_rate_limit
+from ..resilience import guarded, scrape_upstream
+from ..tracing import span
+
+
+class RateLimitedSerperDevTool(SerperDevTool):
+    """SerperDevTool that waits for shared Serper capacity"""
+
+    # Overridable to point at a stand-in, e.g. benchmarks/fake_search.py
+    base_url: str = os.getenv('SERPER_BASE_URL', 'https://google.serper.dev')
+    # Only find results published on or after this date (YYYY-MM-DD), e.g. for refreshes
+    published_after: Optional[str] = None
+
+    def _run(self, **kwargs):
+        query = kwargs.get('search_query')
+        if self.published_after and query and 'after:' not in query:
+            kwargs['search_query'] = f'{query} after:{self.published_after}'
+        with span(f'tool {self.name}', **{key: str(value)[:200] for key, value in kwargs.items()}):
+            return cassette_call(f'tool:{self.name}', kwargs, lambda: self._limited_run(**kwargs))
+
+    def _limited_run(self, **kwargs):
+        with guarded('serper'), tool_rate_limit('serper'):
+            return super()._run(**kwargs)
+
+
+class RateLimitedScrapeWebsiteTool(ScrapeWebsiteTool):
+    """ScrapeWebsiteTool that waits for shared scrape capacity"""
+
+    def _run(self, **kwargs):
+        with span(f'tool {self.name}', **{key: str(value)[:200] for key, value in kwargs.items()}):
+            return cassette_call(f'tool:{self.name}', kwargs, lambda: self._limited_run(**kwargs))
+
+    def _limited_run(self, **kwargs):
+        upstream = scrape_upstream(kwargs.get('website_url') or self.website_url)
+        with guarded(upstream), tool_rate_limit('scrape'):
+            return super()._run(**kwargs)
@@ -0,0 +1,348 @@
+"""
+Distributed tracing of research runs.
+
+``POST /research`` starts a trace; its context travels to every stage in the
+job metadata (``job.meta['trace']``) so all spans of a run share one trace
+ID. The worker records a ``queue_wait`` span for the time a job waited on its
+lane and a ``stage`` span for its execution; database writes, LLM calls and
+tool calls inside a stage are child spans.
+
+Spans are buffered per process and flushed when the outermost local span
+ends (the API request or the stage job). They are always kept in Redis for
+``TRACE_RETENTION`` seconds, which serves ``GET /research/{id}/trace``, and
+can additionally be exported with ``TRACE_EXPORT``:
+
+- ``otlp``: OTLP/HTTP JSON to ``OTEL_EXPORTER_OTLP_TRACES_ENDPOINT`` (or
+  ``OTEL_EXPORTER_OTLP_ENDPOINT`` + ``/v1/traces``), e.g. a collector or Jaeger
+- ``file``: one JSON span per line appended to ``TRACE_FILE``
+
+Exports run on a background thread per process, so a flush at the end of an
+API request only writes to Redis. Spans wait for export in a queue of at most
+``TRACE_EXPORT_QUEUE_SIZE`` spans; when the exporter falls behind, new spans
+are dropped from the export (they stay in Redis) instead of piling up. Stage
+jobs wait up to ``TRACE_EXPORT_TIMEOUT`` seconds for their spans to be
+exported before the job process exits.
+
+This is deliberately independent of the OpenTelemetry SDK, whose global
+tracer provider is owned by CrewAI's telemetry.
+"""
+
+import os
+import json
+import time
+import queue
+import atexit
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import requests
+
+TRACING_ENABLED = os.getenv('TRACING_ENABLED', 'true').lower() not in ('0', 'false', 'no')
+TRACE_EXPORT = [item.strip() for item in os.getenv('TRACE_EXPORT', '').split(',') if item.strip()]
+TRACE_FILE = os.getenv('TRACE_FILE', 'traces/spans.jsonl')
+TRACE_RETENTION = int(os.getenv('TRACE_RETENTION', '604800'))
+TRACE_SERVICE_NAME = os.getenv('TRACE_SERVICE_NAME', 'tv-research')
+OTLP_ENDPOINT = os.getenv('OTEL_EXPORTER_OTLP_TRACES_ENDPOINT') or (
+    os.getenv('OTEL_EXPORTER_OTLP_ENDPOINT', '').rstrip('/') + '/v1/traces'
+    if os.getenv('OTEL_EXPORTER_OTLP_ENDPOINT') else None
+)
+
+TRACE_EXPORT_QUEUE_SIZE = int(os.getenv('TRACE_EXPORT_QUEUE_SIZE', '10000'))
+TRACE_EXPORT_TIMEOUT = float(os.getenv('TRACE_EXPORT_TIMEOUT', '5'))
+# Spans sent in one export request at most
+TRACE_EXPORT_BATCH = 512
+
+KEY_PREFIX = 'tv_research:trace'
+
+_current = ContextVar('tv_research_trace', default=None)
+_buffer = []
+_buffer_lock = threading.Lock()
+_redis = None
+_export_queue = queue.Queue(maxsize=TRACE_EXPORT_QUEUE_SIZE)
+_exporter_lock = threading.Lock()
+# PID the exporter thread was started in; a forked job process starts its own
+_exporter_pid = None
+
+
+def get_redis():
+    global _redis
+    if _redis is None:
+        # queue_client imports this module, so its pool is looked up on first use
+        from .queue_client import redis_conn
+        _redis = redis_conn
+    return _redis
+
+
+def _new_id(size: int) -> str:
+    return os.urandom(size).hex()
+
+
+class Span:
+    """One timed operation of a trace"""
+
+    def __init__(self, name: str, trace_id: str, parent_id: str = None, start_ns: int = None, attributes: dict = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = _new_id(8)
+        self.parent_id = parent_id
+        self.start_ns = start_ns or time.time_ns()
+        self.end_ns = None
+        self.status = 'ok'
+        self.attributes = {key: value for key, value in (attributes or {}).items() if value is not None}
+
+    def set_attribute(self, key: str, value):
+        if value is not None:
+            self.attributes[key] = value
+
+    def context(self) -> dict:
+        return {'trace_id': self.trace_id, 'span_id': self.span_id}
+
+    def to_dict(self) -> dict:
+        return {
+            'name': self.name,
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'start_ns': self.start_ns,
+            'end_ns': self.end_ns,
+            'status': self.status,
+            'attributes': self.attributes,
+            'service': TRACE_SERVICE_NAME,
+        }
+
+
+def current_context() -> dict:
+    """Trace context of the current span (``{'trace_id', 'span_id'}``), or None"""
+    return _current.get()
+
+
+def _finish(span: Span):
+    span.end_ns = span.end_ns or time.time_ns()
+    with _buffer_lock:
+        _buffer.append(span.to_dict())
+
+
+@contextmanager
+def _activate(span: Span):
+    token = _current.set(span.context())
+    try:
+        yield span
+    except Exception as e:
+        span.status = 'error'
+        span.set_attribute('error', f"{type(e).__name__}: {e}"[:500])
+        raise
+    finally:
+        _current.reset(token)
+        _finish(span)
+        if _current.get() is None:
+            flush()
+
+
+@contextmanager
+def start_trace(name: str, **attributes):
+    """Start a new trace with a root span; yields the span (None when disabled)"""
+    if not TRACING_ENABLED:
+        yield None
+        return
+    with _activate(Span(name, _new_id(16), attributes=attributes)) as root:
+        yield root
+
+
+@contextmanager
+def span(name: str, context: dict = None, **attributes):
+    """Child span of ``context`` or of the current span; a no-op outside a trace"""
+    parent = context or _current.get()
+    if not TRACING_ENABLED or not parent:
+        yield None
+        return
+    with _activate(Span(name, parent['trace_id'], parent.get('span_id'), attributes=attributes)) as child:
+        yield child
+
+
+def record_span(name: str, start_ns: int, end_ns: int, context: dict = None, **attributes):
+    """Record an operation that already happened, e.g. the wait on a queue"""
+    parent = context or _current.get()
+    if not TRACING_ENABLED or not parent:
+        return
+    finished = Span(name, parent['trace_id'], parent.get('span_id'), start_ns=start_ns, attributes=attributes)
+    finished.end_ns = max(start_ns, end_ns)
+    _finish(finished)
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def to_otlp(spans: list) -> dict:
+    """OTLP/HTTP JSON payload of finished spans"""
+    return {'resourceSpans': [{
+        'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': TRACE_SERVICE_NAME}}]},
+        'scopeSpans': [{
+            'scope': {'name': 'tv_research'},
+            'spans': [{
+                'traceId': item['trace_id'],
+                'spanId': item['span_id'],
+                'parentSpanId': item['parent_id'] or '',
+                'name': item['name'],
+                'kind': 1,
+                'startTimeUnixNano': str(item['start_ns']),
+                'endTimeUnixNano': str(item['end_ns']),
+                'attributes': [{'key': key, 'value': _otlp_value(value)} for key, value in item['attributes'].items()],
+                'status': {'code': 2 if item['status'] == 'error' else 1},
+            } for item in spans],
+        }],
+    }]}
+
+
+def _export(spans: list):
+    """Send spans to the configured exporters; errors are logged, never raised"""
+    if 'file' in TRACE_EXPORT:
+        try:
+            os.makedirs(os.path.dirname(TRACE_FILE) or '.', exist_ok=True)
+            with open(TRACE_FILE, 'a') as f:
+                f.writelines(json.dumps(item) + '\n' for item in spans)
+        except Exception as e:
+            print(f"Could not write trace spans to {TRACE_FILE}: {e}")
+
+    if 'otlp' in TRACE_EXPORT and OTLP_ENDPOINT:
+        try:
+            requests.post(OTLP_ENDPOINT, json=to_otlp(spans), timeout=5).raise_for_status()
+        except Exception as e:
+            print(f"Could not export trace spans to {OTLP_ENDPOINT}: {e}")
+
+
+def _export_loop():
+    while True:
+        batch = [_export_queue.get()]
+        while len(batch) < TRACE_EXPORT_BATCH:
+            try:
+                batch.append(_export_queue.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            _export(batch)
+        finally:
+            for _ in batch:
+                _export_queue.task_done()
+
+
+def _queue_export(spans: list):
+    """Hand spans to the exporter thread, dropping them when its queue is full"""
+    global _export_queue, _exporter_pid
+    with _exporter_lock:
+        if _exporter_pid != os.getpid():
+            # Spans queued before a fork belong to the parent's exporter
+            _export_queue = queue.Queue(maxsize=TRACE_EXPORT_QUEUE_SIZE)
+            threading.Thread(target=_export_loop, name='trace-exporter', daemon=True).start()
+            _exporter_pid = os.getpid()
+    dropped = 0
+    for item in spans:
+        try:
+            _export_queue.put_nowait(item)
+        except queue.Full:
+            dropped += 1
+    if dropped:
+        print(f"Trace export queue full; dropped {dropped} spans from export")
+
+
+def wait_for_export(timeout: float = None) -> bool:
+    """Wait until the queued spans are exported; False if ``timeout`` seconds passed first"""
+    deadline = time.monotonic() + (TRACE_EXPORT_TIMEOUT if timeout is None else timeout)
+    while _export_queue.unfinished_tasks:
+        if _exporter_pid != os.getpid() or time.monotonic() >= deadline:
+            return False
+        time.sleep(0.05)
+    return True
+
+
+atexit.register(wait_for_export)
+
+
+def flush():
+    """Store the buffered spans and queue them for export; errors are logged, never raised"""
+    with _buffer_lock:
+        spans = list(_buffer)
+        _buffer.clear()
+    if not spans:
+        return
+
+    try:
+        pipe = get_redis().pipeline()
+        for trace_id in {item['trace_id'] for item in spans}:
+            key = f'{KEY_PREFIX}:{trace_id}'
+            pipe.rpush(key, *[json.dumps(item) for item in spans if item['trace_id'] == trace_id])
+            pipe.expire(key, TRACE_RETENTION)
+        pipe.execute()
+    except Exception as e:
+        print(f"Could not store trace spans: {e}")
+
+    if TRACE_EXPORT:
+        _queue_export(spans)
+
+
+def get_trace(trace_id: str) -> list:
+    """Stored spans of a trace, ordered by start time"""
+    spans = [json.loads(item) for item in get_redis().lrange(f'{KEY_PREFIX}:{trace_id}', 0, -1)]
+    return sorted(spans, key=lambda item: (item['start_ns'], item['end_ns'] or 0))
+
+
+def waterfall(spans: list) -> dict:
+    """Spans with their offset from the trace start, duration and nesting depth"""
+    if not spans:
+        return {'duration_ms': 0.0, 'spans': []}
+    start = min(item['start_ns'] for item in spans)
+    end = max(item['end_ns'] or item['start_ns'] for item in spans)
+    parents = {item['span_id']: item['parent_id'] for item in spans}
+
+    def depth(span_id):
+        level, parent = 0, parents.get(span_id)
+        while parent in parents and level < 50:
+            level, parent = level + 1, parents[parent]
+        return level
+
+    children = {}
+    for item in spans:
+        children.setdefault(item['parent_id'] if item['parent_id'] in parents else None, []).append(item)
+
+    ordered = []
+
+    def visit(parent_id):
+        for item in children.get(parent_id, []):
+            ordered.append(item)
+            visit(item['span_id'])
+
+    visit(None)
+    return {
+        'duration_ms': round((end - start) / 1e6, 1),
+        'spans': [{
+            'name': item['name'],
+            'span_id': item['span_id'],
+            'parent_id': item['parent_id'],
+            'depth': depth(item['span_id']),
+            'offset_ms': round((item['start_ns'] - start) / 1e6, 1),
+            'duration_ms': round(((item['end_ns'] or item['start_ns']) - item['start_ns']) / 1e6, 1),
+            'status': item['status'],
+            'attributes': item['attributes'],
+        } for item in ordered],
+    }
+
+
+def render_waterfall(view: dict, width: int = 60) -> str:
+    """Plain-text waterfall chart of a ``waterfall()`` view"""
+    total = view['duration_ms'] or 1.0
+    lines = [f"Trace duration: {view['duration_ms'] / 1000:.2f}s"]
+    for item in view['spans']:
+        begin = int(item['offset_ms'] / total * width)
+        length = max(1, int(item['duration_ms'] / total * width))
+        bar = ' ' * begin + '█' * min(length, width - begin)
+        label = ('  ' * item['depth'] + item['name'])[:40]
+        marker = ' !' if item['status'] == 'error' else ''
+        lines.append(f"{label:40} |{bar:{width}}| {item['duration_ms'] / 1000:8.2f}s{marker}")
+    return '\n'.join(lines)
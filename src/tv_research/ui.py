@@ -37,6 +37,12 @@ with tab1:
             help="Leave empty for trending topics research"
         )
 
+        priority = st.selectbox(
+            "Priority",
+            options=["normal", "high", "low"],
+            help="Use high for breaking news; high priority research is processed ahead of queued work"
+        )
+
         submitted = st.form_submit_button("🚀 Start Research", type="primary")
 
         if submitted:
@@ -44,7 +50,7 @@ with tab1:
                 try:
                     response = requests.post(
                         f"{api_url}/research",
-                        json={"topic": topic if topic.strip() else None},
+                        json={"topic": topic if topic.strip() else None, "priority": priority},
                         timeout=10
                     )
 
@@ -0,0 +1,197 @@
+"""
+Token and cost accounting for pipeline stages.
+
+Usage is read from each agent's token counter after it has executed its task
+and persisted per research run and stage in the ``stage_usage`` table.
+"""
+
+import time
+from contextlib import contextmanager
+
+from .models import StageUsage, get_db
+from .resilience import CircuitOpenError, stage_breakers
+
+# Maps crew task names to pipeline stage names
+TASK_STAGES = {
+    'trend_research_task': 'trend_research',
+    'news_aggregation_task': 'news_aggregation',
+    'content_strategy_task': 'content_strategy',
+    'reporting_task': 'final_reporting',
+}
+
+# USD per 1M tokens: (prompt, completion, cached prompt)
+MODEL_PRICING = {
+    'gpt-4o-mini': (0.15, 0.60, 0.075),
+    'gpt-4o': (2.50, 10.00, 1.25),
+    'gpt-4.1-nano': (0.10, 0.40, 0.025),
+    'gpt-4.1-mini': (0.40, 1.60, 0.10),
+    'gpt-4.1': (2.00, 8.00, 0.50),
+    'gpt-4-turbo': (10.00, 30.00, 10.00),
+    'gpt-4': (30.00, 60.00, 30.00),
+    'gpt-3.5-turbo': (0.50, 1.50, 0.50),
+}
+
+
+def get_model_name(agent) -> str:
+    """Return the model name used by an agent's LLM"""
+    llm = getattr(agent, 'llm', None)
+    model = getattr(llm, 'model', None) or getattr(llm, 'model_name', None)
+    return str(model) if model else None
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int, cached_prompt_tokens: int = 0):
+    """Estimate the USD cost of a stage, or None if the model is not priced"""
+    if not model:
+        return None
+    name = model.split('/')[-1].lower()
+    # Longest prefix wins so that gpt-4o-mini is not priced as gpt-4o
+    for prefix in sorted(MODEL_PRICING, key=len, reverse=True):
+        if name.startswith(prefix):
+            prompt_price, completion_price, cached_price = MODEL_PRICING[prefix]
+            uncached = max(0, prompt_tokens - cached_prompt_tokens)
+            return round(
+                (uncached * prompt_price
+                 + cached_prompt_tokens * cached_price
+                 + completion_tokens * completion_price) / 1_000_000,
+                6
+            )
+    return None
+
+
+def collect_agent_usage(agent, task=None) -> dict:
+    """Read token usage, LLM call count and tool call count for one agent run"""
+    usage = {
+        'model': get_model_name(agent),
+        'prompt_tokens': 0,
+        'completion_tokens': 0,
+        'cached_prompt_tokens': 0,
+        'total_tokens': 0,
+        'llm_calls': 0,
+        'tool_calls': getattr(task, 'used_tools', 0) or 0,
+    }
+    token_process = getattr(agent, '_token_process', None)
+    if token_process is not None:
+        summary = token_process.get_summary()
+        usage.update({
+            'prompt_tokens': summary.prompt_tokens,
+            'completion_tokens': summary.completion_tokens,
+            'cached_prompt_tokens': summary.cached_prompt_tokens,
+            'total_tokens': summary.total_tokens,
+            'llm_calls': summary.successful_requests,
+        })
+    usage['cost_usd'] = estimate_cost(
+        usage['model'], usage['prompt_tokens'], usage['completion_tokens'], usage['cached_prompt_tokens']
+    )
+    # Route and budget outcome of a stage with a budget (see routing.py)
+    budget = getattr(getattr(agent, 'llm', None), 'budget', None)
+    if budget is not None:
+        usage.update(budget.usage())
+    return usage
+
+
+def record_stage_usage(research_id: int, stage: str, usage: dict, duration_ms: int = None, status: str = 'completed'):
+    """Persist the usage of one stage; errors are logged, never raised"""
+    db = get_db()
+    try:
+        db.add(StageUsage(
+            research_id=research_id,
+            stage=stage,
+            status=status,
+            duration_ms=duration_ms,
+            **usage
+        ))
+        db.commit()
+    except Exception as e:
+        print(f"Database error storing {stage} usage for task {research_id}: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+
+def split_usage(usage: dict, parts: int) -> list:
+    """Split one agent run's usage evenly between ``parts`` research runs"""
+    shares = [dict(usage) for _ in range(parts)]
+    fields = ['prompt_tokens', 'completion_tokens', 'cached_prompt_tokens', 'total_tokens', 'llm_calls', 'tool_calls']
+    if 'fallback_calls' in usage:
+        fields.append('fallback_calls')
+    for field in fields:
+        share, remainder = divmod(usage.get(field) or 0, parts)
+        for index, entry in enumerate(shares):
+            entry[field] = share + (1 if index < remainder else 0)
+    if usage.get('cost_usd') is not None:
+        for entry in shares:
+            entry['cost_usd'] = round(usage['cost_usd'] / parts, 6)
+    return shares
+
+
+@contextmanager
+def track_stage_usage(research_id, stage: str, agent, task):
+    """Record an agent's usage for a stage when the block exits, even on failure.
+
+    ``research_id`` may be a list for a batched stage; the usage is then split
+    evenly between the research runs. A block whose calls an open circuit
+    breaker refused raises ``CircuitOpenError`` (see resilience.py).
+    """
+    started = time.monotonic()
+    status = 'completed'
+    try:
+        with stage_breakers():
+            yield
+    except CircuitOpenError:
+        status = 'deferred'
+        raise
+    except Exception:
+        status = 'failed'
+        raise
+    finally:
+        duration_ms = int((time.monotonic() - started) * 1000)
+        try:
+            usage = collect_agent_usage(agent, task)
+        except Exception as e:
+            print(f"Could not collect {stage} usage for task {research_id}: {e}")
+        else:
+            research_ids = list(research_id) if isinstance(research_id, (list, tuple)) else [research_id]
+            for run_id, share in zip(research_ids, split_usage(usage, len(research_ids))):
+                record_stage_usage(run_id, stage, share, duration_ms, status)
+
+
+def record_crew_usage(research_id: int, crew) -> list:
+    """Persist per-stage usage for every task of a crew after ``kickoff``"""
+    stages = []
+    for task in crew.tasks:
+        stage = TASK_STAGES.get(task.name, task.name)
+        usage = collect_agent_usage(task.agent, task)
+        duration_ms = None
+        if task.start_time and task.end_time:
+            duration_ms = int((task.end_time - task.start_time).total_seconds() * 1000)
+        if research_id is not None:
+            record_stage_usage(research_id, stage, usage, duration_ms)
+        stages.append({'stage': stage, 'duration_ms': duration_ms, **usage})
+    return stages
+
+
+def summarize_usage(rows) -> dict:
+    """Aggregate StageUsage rows into per-stage and overall totals"""
+    fields = ('prompt_tokens', 'completion_tokens', 'cached_prompt_tokens', 'total_tokens', 'llm_calls', 'tool_calls')
+    by_stage = {}
+    totals = {field: 0 for field in fields}
+    totals['cost_usd'] = 0.0
+    for row in rows:
+        stage = by_stage.setdefault(row.stage, {field: 0 for field in fields})
+        stage.setdefault('cost_usd', 0.0)
+        stage.setdefault('models', [])
+        stage['runs'] = stage.get('runs', 0) + 1
+        for field in fields:
+            value = getattr(row, field) or 0
+            stage[field] += value
+            totals[field] += value
+        stage['cost_usd'] = round(stage['cost_usd'] + (row.cost_usd or 0), 6)
+        totals['cost_usd'] = round(totals['cost_usd'] + (row.cost_usd or 0), 6)
+        if row.model and row.model not in stage['models']:
+            stage['models'].append(row.model)
+        stage['fallback_calls'] = stage.get('fallback_calls', 0) + (row.fallback_calls or 0)
+        if row.budget_outcome in ('latency_exceeded', 'cost_exceeded'):
+            stage['over_budget'] = stage.get('over_budget', 0) + 1
+        if row.fallback_model and row.fallback_model not in stage['models']:
+            stage['models'].append(row.fallback_model)
+    return {'by_stage': by_stage, 'totals': totals}
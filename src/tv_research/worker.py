@@ -1,15 +1,37 @@
 import os
-import redis
-from rq import Worker, Queue
+import json
+import time
+import socket
+import threading
+import functools
+from contextlib import nullcontext
+from rq import Worker, Queue, get_current_job
+from rq.exceptions import NoSuchJobError
+from rq.job import Job
+from rq.registry import ScheduledJobRegistry
 from datetime import datetime
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import sessionmaker
-from .models import ResearchResult, init_db, engine
+from .models import ResearchResult, StageOutput, StatusEvent, init_db, engine
 from .crew import TVResearchCrew
+from .compaction import compact_context, count_tokens
+from .usage import record_stage_usage, track_stage_usage
+from .memo import abandon, claim_leader, get_memoized, join_as_follower, memo_enabled, publish, stage_memo_key
+from .ratelimit import llm_provider
+from .routing import stage_model
+from .resilience import CircuitOpenError, paused_for
+from .tracing import TRACE_EXPORT, record_span, span, wait_for_export
+from .timeline import now_ms, record_events
+from .artifacts import save_report
+from .cassette import record_stage, recording_enabled
+from .handoff import completed_stages, dispatch, new_handoff
+from .fairshare import FAIR_SHARE_REFRESH_SECONDS, charge, fair_lanes
+from .queue_client import (
+    DEFAULT_TENANT, PRIORITIES, STAGES, current_tenant, enqueue_stage, get_queue, job_research_ids, job_task_ids,
+    known_tenants, lane_name, queues, redis_conn
+)
 from crewai import Agent, Task
 
-# Redis connection
-redis_conn = redis.from_url(os.getenv('REDIS_URL', 'redis://localhost:6379'))
-
 # Database session
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -20,29 +42,54 @@ def get_db():
     finally:
         db.close()
 
-def update_task_status(task_id: int, status: str, result_content: str = None, error_message: str = None, execution_time: int = None):
+def update_task_status(task_id: int, status: str, result_content: str = None, error_message: str = None, execution_time: int = None, job_id: str = None, report_id: str = None):
     """Update task status in database"""
+    with span('db update_task_status', research_id=task_id, status=status):
+        _update_task_status(task_id, status, result_content, error_message, execution_time, job_id, report_id)
+
+def status_rank(status: str):
+    """Position of a status in the pipeline, None for statuses outside it (e.g. ``failed``)"""
+    if status == 'completed':
+        return len(STAGES)
+    if status == 'running':
+        return 0
+    for index, stage in enumerate(STAGES):
+        if status.startswith(f'{stage}_'):
+            return index + (0.5 if status == f'{stage}_completed' else 0)
+    return None
+
+def _set_status(db, task, status, result_content=None, error_message=None, execution_time=None, job_id=None,
+                report_id=None):
+    rank, current = status_rank(status), status_rank(task.status or '')
+    # Overlapping stages of a streaming or fanned-out run report out of order;
+    # a run's status never moves back to an earlier stage
+    if rank is None or current is None or rank >= current:
+        task.status = status
+        if job_id:
+            task.job_id = job_id
+    if result_content:
+        task.result_content = result_content
+    if error_message:
+        task.error_message = error_message
+    if report_id:
+        task.report_id = report_id
+    # Only the end of the run completes it; per-stage queue wait and
+    # service time are derived from the status events (see timeline.py)
+    if status in ('completed', 'failed'):
+        task.completed_at = datetime.utcnow()
+        # Calculate execution time if not provided
+        if execution_time is None and task.created_at:
+            execution_time = int((task.completed_at - task.created_at).total_seconds())
+        if execution_time is not None:
+            task.execution_time = execution_time
+    db.add(StatusEvent(research_id=task.id, event='status', status=status, job_id=job_id, at_ms=now_ms()))
+
+def _update_task_status(task_id, status, result_content, error_message, execution_time, job_id, report_id=None):
     db = get_db()
     try:
         task = db.query(ResearchResult).filter(ResearchResult.id == task_id).first()
         if task:
-            task.status = status
-            if result_content:
-                task.result_content = result_content
-                task.completed_at = datetime.utcnow()
-                # Calculate execution time if not provided
-                if execution_time is None and task.created_at:
-                    execution_time = int((datetime.utcnow() - task.created_at).total_seconds())
-                if execution_time is not None:
-                    task.execution_time = execution_time
-            if error_message:
-                task.error_message = error_message
-                task.completed_at = datetime.utcnow()
-                # Calculate execution time for failed tasks too
-                if execution_time is None and task.created_at:
-                    execution_time = int((datetime.utcnow() - task.created_at).total_seconds())
-                if execution_time is not None:
-                    task.execution_time = execution_time
+            _set_status(db, task, status, result_content, error_message, execution_time, job_id, report_id)
             db.commit()
     except Exception as e:
         print(f"Database error updating task {task_id}: {e}")
@@ -51,35 +98,248 @@ def update_task_status(task_id: int, status: str, result_content: str = None, er
     finally:
         db.close()
 
-def run_trend_research(task_id: int, inputs: dict):
+def store_stage_output(task_id: int, stage: str, content: str):
+    """Keep the full output of a stage for reference, with its token count"""
+    with span('db store_stage_output', research_id=task_id, stage=stage):
+        _store_stage_output(task_id, stage, content)
+
+def _store_stage_output(task_id: int, stage: str, content: str):
+    db = get_db()
+    try:
+        db.add(StageOutput(
+            research_id=task_id,
+            stage=stage,
+            content=content,
+            token_count=count_tokens(content)
+        ))
+        db.commit()
+    except Exception as e:
+        print(f"Database error storing {stage} output for task {task_id}: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+def complete_stage(task_id: int, stage: str, result: str, next_stage: str = None, func=None, *args,
+                   priority: str = 'normal', report_id: str = None, tenant: str = None,
+                   depends_on: list = None) -> bool:
+    """Store a stage's output and hand the run on to ``func`` on the ``next_stage`` lane.
+
+    The status, the stage output and the hand-off are written in one
+    transaction, then the next stage is enqueued; if that fails the relay
+    retries it (see handoff.py). Without ``next_stage`` the run is completed.
+    The next stage runs for ``tenant``, by default the tenant of the current
+    job, once the jobs of ``depends_on`` have finished. Returns False, writing
+    nothing, when the stage already completed.
+    """
+    with span('db complete_stage', research_id=task_id, stage=stage):
+        handoff_id = _complete_stage(
+            task_id, stage, result, next_stage, func, args, priority, report_id, tenant, depends_on
+        )
+    if handoff_id is None:
+        print(f"Task {task_id} already completed {stage}; dropped duplicate result")
+        return False
+    if next_stage:
+        dispatch(handoff_id)
+    return True
+
+def _complete_stage(task_id, stage, result, next_stage, func, args, priority, report_id, tenant, depends_on):
+    db = get_db()
+    try:
+        handoff = new_handoff(task_id, stage, next_stage, func, args, priority, tenant, depends_on)
+        db.add(handoff)
+        # The unique attempt key rejects a second completion of the stage
+        db.flush()
+        task = db.query(ResearchResult).filter(ResearchResult.id == task_id).first()
+        if task:
+            _set_status(db, task, f'{stage}_completed' if next_stage else 'completed', result, report_id=report_id)
+        db.add(StageOutput(research_id=task_id, stage=stage, content=result, token_count=count_tokens(result)))
+        db.commit()
+        return handoff.id
+    except IntegrityError:
+        db.rollback()
+        return None
+    except Exception as e:
+        print(f"Database error completing {stage} for task {task_id}: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+# Running stages refresh a heartbeat; the reaper treats a running stage
+# without a heartbeat as orphaned (see reaper.py). The heartbeat of a run is a
+# sorted set of its running stage jobs scored by expiry, since stages of a
+# streaming run overlap (see streaming.py)
+HEARTBEAT_INTERVAL = int(os.getenv('HEARTBEAT_INTERVAL', '15'))
+HEARTBEAT_TTL = int(os.getenv('HEARTBEAT_TTL', '60'))
+
+def heartbeat_key(task_id: int) -> str:
+    return f'tv_research:heartbeat:{task_id}'
+
+def current_job_id():
+    job = get_current_job()
+    return job.id if job else None
+
+def with_heartbeat(stage: str):
+    """Keep a heartbeat alive in Redis while a stage function runs.
+
+    Deliveries of a stage that already completed for all its research runs
+    are skipped (see handoff.py).
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(task_id, *args, **kwargs):
+            research_ids = job_task_ids(task_id)
+            if completed_stages(research_ids, stage) >= set(research_ids):
+                print(f"Skipping duplicate {stage} delivery for task {task_id}")
+                return None
+            keys = [heartbeat_key(research_id) for research_id in research_ids]
+            member = json.dumps({
+                'stage': stage,
+                'job_id': current_job_id(),
+                'worker': os.getenv('WORKER_ID') or socket.gethostname(),
+                'pid': os.getpid(),
+                'started_at': time.time(),
+            })
+            stop = threading.Event()
+
+            def beat():
+                while True:
+                    try:
+                        pipe = redis_conn.pipeline()
+                        for key in keys:
+                            pipe.zadd(key, {member: time.time() + HEARTBEAT_TTL})
+                            pipe.expire(key, HEARTBEAT_TTL)
+                        pipe.execute()
+                    except Exception as e:
+                        print(f"Heartbeat error for task {task_id}: {e}")
+                    if stop.wait(HEARTBEAT_INTERVAL):
+                        break
+
+            thread = threading.Thread(target=beat, name=f'heartbeat-{task_id}', daemon=True)
+            thread.start()
+            try:
+                return func(task_id, *args, **kwargs)
+            finally:
+                stop.set()
+                thread.join(timeout=5)
+                try:
+                    pipe = redis_conn.pipeline()
+                    for key in keys:
+                        pipe.zrem(key, member)
+                    pipe.execute()
+                except Exception:
+                    pass
+        return wrapper
+    return decorator
+
+# Stages whose upstream breaker is open are re-enqueued with a delay instead
+# of failing; after this many deferrals the research run is failed
+STAGE_MAX_DEFERRALS = int(os.getenv('STAGE_MAX_DEFERRALS', '20'))
+
+def defer_stage(task_id: int, stage: str, func, error: CircuitOpenError, *args, priority: str = 'normal',
+                job_id: str = None, set_status: bool = True):
+    """Re-enqueue a stage once the open circuit breaker may be probed again.
+
+    With ``set_status=False`` the run's status is left alone, e.g. for the
+    topic jobs of a fanned-out stage.
+    """
+    job = get_current_job()
+    deferrals = (job.meta.get('deferrals', 0) if job else 0) + 1
+    if deferrals > STAGE_MAX_DEFERRALS:
+        for research_id in job_task_ids(task_id):
+            update_task_status(research_id, 'failed', error_message=f"{error} (gave up after {deferrals - 1} deferrals)")
+        raise error
+    delay = max(1, int(error.retry_after) + 1)
+    enqueue_stage(
+        stage, func, task_id, *args, priority=priority, delay=delay, meta={'deferrals': deferrals}, job_id=job_id
+    )
+    if set_status:
+        for research_id in job_task_ids(task_id):
+            update_task_status(research_id, f'{stage}_deferred')
+    print(f"Deferred {stage} for task {task_id} by {delay}s: {error}")
+
+def hand_off_trend_result(task_id: int, inputs: dict, result: str, priority: str = 'normal', tenant: str = None):
+    """Complete a trend stage with a memoized result and continue downstream"""
+    if complete_stage(
+        task_id, 'trend_research', result,
+        'news_aggregation', run_news_aggregation, task_id, inputs, result, priority=priority, tenant=tenant
+    ):
+        # Zero-cost usage row, so memo hits show up in the per-stage accounting
+        record_stage_usage(task_id, 'trend_research', {'cost_usd': 0.0}, 0, 'memoized')
+
+def requeue_followers(followers: list):
+    """Give followers of a failed leader their own trend stage again"""
+    for follower in followers:
+        enqueue_stage(
+            'trend_research', run_trend_research,
+            follower['task_id'], follower['inputs'], priority=follower['priority'], tenant=follower.get('tenant')
+        )
+
+@with_heartbeat('trend_research')
+def run_trend_research(task_id: int, inputs: dict, priority: str = 'normal'):
     """Worker function for trend research agent"""
+    memo_key = None
     try:
-        update_task_status(task_id, 'running')
+        update_task_status(task_id, 'running', job_id=current_job_id())
 
         # Create trend researcher agent
         crew = TVResearchCrew()
         trend_agent = crew.trend_researcher()
         trend_task = crew.trend_research_task()
 
+        # Identical requests share one trend stage (see memo.py)
+        if memo_enabled():
+            key = stage_memo_key(
+                'trend_research', inputs, stage_model('trend_research'), crew.tasks_config['trend_research_task']
+            )
+            cached = get_memoized(key)
+            if cached is None and not claim_leader(key, task_id):
+                cached = join_as_follower(key, task_id, inputs, priority, current_tenant())
+                if cached is None:
+                    update_task_status(task_id, 'trend_research_waiting')
+                    print(f"Task {task_id} waiting for a concurrent identical trend stage")
+                    return None
+            if cached is not None:
+                print(f"Task {task_id} reusing trend stage of research {cached['research_id']}")
+                hand_off_trend_result(task_id, inputs, cached['result'], priority)
+                return cached['result']
+            memo_key = key
+
         # Run trend research
-        result = trend_agent.execute_task(trend_task, inputs)
+        with track_stage_usage(task_id, 'trend_research', trend_agent, trend_task):
+            result = trend_agent.execute_task(trend_task, inputs)
 
-        # Store intermediate result
-        update_task_status(task_id, 'trend_research_completed', str(result))
+        # Store intermediate result and hand off to news aggregation
+        complete_stage(
+            task_id, 'trend_research', str(result),
+            'news_aggregation', run_news_aggregation, task_id, inputs, str(result), priority=priority
+        )
 
-        # Enqueue next job: news aggregation
-        news_queue.enqueue(run_news_aggregation, task_id, inputs, str(result))
+        # Hand the result to requests that waited for this one
+        if memo_key:
+            for follower in publish(memo_key, task_id, str(result)):
+                hand_off_trend_result(
+                    follower['task_id'], follower['inputs'], str(result), follower['priority'], follower.get('tenant')
+                )
 
         return result
 
+    except CircuitOpenError as e:
+        if memo_key:
+            requeue_followers(abandon(memo_key))
+        defer_stage(task_id, 'trend_research', run_trend_research, e, inputs, priority=priority)
+        return None
     except Exception as e:
+        if memo_key:
+            requeue_followers(abandon(memo_key))
         update_task_status(task_id, 'failed', error_message=str(e))
         raise
 
-def run_news_aggregation(task_id: int, inputs: dict, trend_result: str):
+@with_heartbeat('news_aggregation')
+def run_news_aggregation(task_id: int, inputs: dict, trend_result: str, priority: str = 'normal'):
     """Worker function for news aggregation agent"""
     try:
-        update_task_status(task_id, 'news_aggregation_running')
+        update_task_status(task_id, 'news_aggregation_running', job_id=current_job_id())
 
         # Create news aggregator agent
         crew = TVResearchCrew()
@@ -88,26 +348,32 @@ def run_news_aggregation(task_id: int, inputs: dict, trend_result: str):
 
         # Update inputs with trend research results
         inputs['trend_analysis'] = trend_result
+        stage_inputs, _ = compact_context(inputs, 'news_aggregation')
 
         # Run news aggregation
-        result = news_agent.execute_task(news_task, inputs)
-
-        # Store intermediate result
-        update_task_status(task_id, 'news_aggregation_completed', str(result))
+        with track_stage_usage(task_id, 'news_aggregation', news_agent, news_task):
+            result = news_agent.execute_task(news_task, stage_inputs)
 
-        # Enqueue next job: content strategy
-        content_queue.enqueue(run_content_strategy, task_id, inputs, str(result))
+        # Store intermediate result and hand off to content strategy
+        complete_stage(
+            task_id, 'news_aggregation', str(result),
+            'content_strategy', run_content_strategy, task_id, inputs, str(result), priority=priority
+        )
 
         return result
 
+    except CircuitOpenError as e:
+        defer_stage(task_id, 'news_aggregation', run_news_aggregation, e, inputs, trend_result, priority=priority)
+        return None
     except Exception as e:
         update_task_status(task_id, 'failed', error_message=str(e))
         raise
 
-def run_content_strategy(task_id: int, inputs: dict, news_result: str):
+@with_heartbeat('content_strategy')
+def run_content_strategy(task_id: int, inputs: dict, news_result: str, priority: str = 'normal'):
     """Worker function for content strategy agent"""
     try:
-        update_task_status(task_id, 'content_strategy_running')
+        update_task_status(task_id, 'content_strategy_running', job_id=current_job_id())
 
         # Create content strategist agent
         crew = TVResearchCrew()
@@ -116,66 +382,274 @@ def run_content_strategy(task_id: int, inputs: dict, news_result: str):
 
         # Update inputs with previous results
         inputs['news_analysis'] = news_result
+        stage_inputs, _ = compact_context(inputs, 'content_strategy')
 
         # Run content strategy
-        result = content_agent.execute_task(content_task, inputs)
-
-        # Store intermediate result
-        update_task_status(task_id, 'content_strategy_completed', str(result))
+        with track_stage_usage(task_id, 'content_strategy', content_agent, content_task):
+            result = content_agent.execute_task(content_task, stage_inputs)
 
-        # Enqueue next job: final reporting
-        reporting_queue.enqueue(run_final_reporting, task_id, inputs, str(result))
+        # Store intermediate result and hand off to final reporting
+        complete_stage(
+            task_id, 'content_strategy', str(result),
+            'final_reporting', run_final_reporting, task_id, inputs, str(result), priority=priority
+        )
 
         return result
 
+    except CircuitOpenError as e:
+        defer_stage(task_id, 'content_strategy', run_content_strategy, e, inputs, news_result, priority=priority)
+        return None
     except Exception as e:
         update_task_status(task_id, 'failed', error_message=str(e))
         raise
 
-def run_final_reporting(task_id: int, inputs: dict, content_result: str):
+@with_heartbeat('final_reporting')
+def run_final_reporting(task_id: int, inputs: dict, content_result: str, priority: str = 'normal'):
     """Worker function for final reporting agent"""
     try:
-        update_task_status(task_id, 'final_reporting_running')
+        update_task_status(task_id, 'final_reporting_running', job_id=current_job_id())
 
         # Create reporting analyst agent
         crew = TVResearchCrew()
         reporting_agent = crew.reporting_analyst()
 
-        # Create final reporting task with timestamp
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        output_file = f'reports/tv_research_report_{timestamp}.md'
-
+        # The report is kept in the artifact store (see artifacts.py), not the task's output_file
         from crewai import Task
         reporting_task = Task(
-            config=crew.tasks_config['reporting_task'],
-            output_file=output_file
+            config={key: value for key, value in crew.tasks_config['reporting_task'].items() if key != 'output_file'}
         )
 
         # Update inputs with all previous results
         inputs['content_strategy'] = content_result
+        stage_inputs, _ = compact_context(inputs, 'final_reporting')
 
         # Run final reporting
-        result = reporting_agent.execute_task(reporting_task, inputs)
+        with track_stage_usage(task_id, 'final_reporting', reporting_agent, reporting_task):
+            result = reporting_agent.execute_task(reporting_task, stage_inputs)
 
         # Store final result
-        update_task_status(task_id, 'completed', str(result))
+        with span('artifact save_report', research_id=task_id):
+            report_id = save_report(str(result))
+        complete_stage(task_id, 'final_reporting', str(result), report_id=report_id)
 
         return result
 
+    except CircuitOpenError as e:
+        defer_stage(task_id, 'final_reporting', run_final_reporting, e, inputs, content_result, priority=priority)
+        return None
     except Exception as e:
         update_task_status(task_id, 'failed', error_message=str(e))
         raise
 
-# Worker queues
-trend_queue = Queue('trend_research', connection=redis_conn)
-news_queue = Queue('news_aggregation', connection=redis_conn)
-content_queue = Queue('content_strategy', connection=redis_conn)
-reporting_queue = Queue('final_reporting', connection=redis_conn)
+# Stage lanes and enqueue_stage live in queue_client.py, shared with the API.
+# Low priority jobs waiting longer than this are promoted to the normal lane
+PRIORITY_AGING_SECONDS = int(os.getenv('PRIORITY_AGING_SECONDS', '300'))
+# Normal jobs waiting longer than this are promoted to the high lane, behind
+# the breaking news already there; 0 keeps the high lane for high priority
+PRIORITY_AGING_HIGH_SECONDS = int(os.getenv('PRIORITY_AGING_HIGH_SECONDS', '0'))
+
+trend_queue = get_queue('trend_research')
+news_queue = get_queue('news_aggregation')
+content_queue = get_queue('content_strategy')
+reporting_queue = get_queue('final_reporting')
+
+def promote_aged_jobs(stage: str, max_age: int = None, high_max_age: int = None) -> int:
+    """Move jobs that waited too long in a lower lane up one lane of their tenant.
+
+    Low jobs move to the normal lane after ``max_age`` seconds; normal jobs
+    only move to the high lane with a ``high_max_age``. Promoted jobs are
+    appended, behind the jobs already waiting in the higher lane. Lanes are
+    FIFO, so scanning stops at the first job that is still young.
+    Returns the number of promoted jobs.
+    """
+    max_age = PRIORITY_AGING_SECONDS if max_age is None else max_age
+    high_max_age = PRIORITY_AGING_HIGH_SECONDS if high_max_age is None else high_max_age
+    now = time.time()
+    promoted = 0
+    steps = [('low', 'normal', max_age)]
+    if high_max_age > 0:
+        steps.insert(0, ('normal', 'high', high_max_age))
+    lanes = [
+        (lower, get_queue(stage, lower, tenant), get_queue(stage, higher, tenant), age)
+        for tenant in known_tenants() for lower, higher, age in steps
+    ]
+    for lower, source, target, max_age in lanes:
+        for job in source.get_jobs(0, 50):
+            entered_at = job.meta.get('lane_entered_at')
+            if entered_at is None and job.enqueued_at:
+                entered_at = job.enqueued_at.timestamp()
+            if entered_at is None or now - entered_at < max_age:
+                break
+            # Only the worker that actually removed the job re-enqueues it
+            if not source.remove(job):
+                continue
+            job.meta['lane_entered_at'] = now
+            job.meta.setdefault('promoted_from', lower)
+            job.save_meta()
+            target.enqueue_job(job)
+            promoted += 1
+            print(f"Promoted job {job.id} from {source.name} to {target.name} after waiting {int(now - entered_at)}s")
+    return promoted
+
+def release_due_jobs(stage: str) -> int:
+    """Move due delayed jobs of other tenants' lanes onto their lane.
+
+    The RQ scheduler inside the workers only serves the lanes the workers were
+    started with, the default tenant's. Returns the number of released jobs.
+    """
+    released = 0
+    for tenant in known_tenants()[1:]:
+        for priority in PRIORITIES:
+            queue = get_queue(stage, priority, tenant)
+            registry = ScheduledJobRegistry(queue=queue)
+            for job_id in registry.get_jobs_to_schedule(int(time.time())):
+                # Only the worker that actually removed the job enqueues it
+                if not registry.remove(job_id):
+                    continue
+                try:
+                    queue.enqueue_job(Job.fetch(job_id, connection=redis_conn))
+                    released += 1
+                except NoSuchJobError:
+                    pass
+    return released
+
+# Upstreams each stage cannot run without; while one of their circuit
+# breakers is open the stage's workers stop dequeuing
+STAGE_UPSTREAMS = {
+    'trend_research': [llm_provider(stage_model('trend_research')), 'serper'],
+    'news_aggregation': [llm_provider(stage_model('news_aggregation')), 'serper'],
+    'content_strategy': [llm_provider(stage_model('content_strategy'))],
+    'final_reporting': [llm_provider(stage_model('final_reporting'))],
+}
+
+class PriorityWorker(Worker):
+    """Worker that drains higher priority lanes first and ages waiting jobs.
+
+    Within a priority it shares its capacity fairly between the tenants' lanes
+    (see fairshare.py). It also pauses while an upstream its stages depend on
+    has an open breaker.
+    """
+
+    aging_check_interval = 10
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._last_aging_check = 0.0
+
+    def listened_stages(self) -> list:
+        listening = set(self.queue_names())
+        return [
+            stage for stage in STAGES
+            if any(lane_name(stage, priority) in listening for priority in PRIORITIES)
+        ]
+
+    def wait_for_upstreams(self):
+        """Block while every stage this worker serves is cut off by an open breaker"""
+        stages = self.listened_stages()
+        announced = False
+        while stages and not getattr(self, '_stop_requested', False):
+            pause = min(paused_for(STAGE_UPSTREAMS[stage]) for stage in stages)
+            if pause <= 0:
+                break
+            if not announced:
+                print(f"Pausing {', '.join(stages)} for {pause:.0f}s: upstream circuit breaker open")
+                announced = True
+            self.heartbeat()
+            time.sleep(min(pause, 5))
+
+    def maintain_lanes(self):
+        if time.time() - self._last_aging_check < self.aging_check_interval:
+            return
+        self._last_aging_check = time.time()
+        for stage in self.listened_stages():
+            try:
+                promote_aged_jobs(stage)
+                release_due_jobs(stage)
+            except Exception as e:
+                print(f"Lane maintenance failed for {stage}: {e}")
+
+    def dequeue_job_and_maintain_ttl(self, timeout, max_idle_time=None):
+        """Dequeue in fair-share order, re-evaluated at least every FAIR_SHARE_REFRESH_SECONDS"""
+        idle_since = time.time()
+        while True:
+            self.wait_for_upstreams()
+            self.maintain_lanes()
+            stages = self.listened_stages()
+            if not stages:
+                return super().dequeue_job_and_maintain_ttl(timeout, max_idle_time)
+            try:
+                self._ordered_queues = fair_lanes(stages)
+            except Exception as e:
+                print(f"Fair-share ordering failed, keeping the previous order: {e}")
+            if timeout is None:
+                # Burst mode: a single non-blocking pass
+                return super().dequeue_job_and_maintain_ttl(timeout, max_idle_time) if self._ordered_queues else None
+
+            window = FAIR_SHARE_REFRESH_SECONDS
+            if max_idle_time is not None:
+                window = min(window, max_idle_time - (time.time() - idle_since))
+                if window <= 0:
+                    return None
+            window = max(1, int(window))
+            if not self._ordered_queues:
+                # Every tenant with work is at its quota
+                self.heartbeat()
+                time.sleep(window)
+                continue
+            result = super().dequeue_job_and_maintain_ttl(min(timeout, window), window)
+            if result is not None or getattr(self, '_stop_requested', False):
+                return result
+
+    def _recording(self, job, stage: str, research_ids: list):
+        """Cassette recording of a job's research run, when enabled for the run or its tenant"""
+        if len(research_ids) != 1 or not recording_enabled(research_ids[0], job.meta.get('tenant')):
+            return nullcontext()
+        inputs = job.args[1] if len(job.args) > 1 and isinstance(job.args[1], dict) else None
+        return record_stage(research_ids[0], stage, inputs, job_id=job.id, function=job.func_name)
+
+    def perform_job(self, job, queue):
+        """Run a job inside the trace of its research run, recording when it started and finished"""
+        stage = next((stage for stage in STAGES if queue.name.startswith(stage)), queue.name)
+        research_ids = job_research_ids(job)
+        record_events(research_ids, 'started', stage, job_id=job.id)
+        started = time.monotonic()
+        try:
+            charge(stage, job.meta.get('tenant') or DEFAULT_TENANT)
+        except Exception as e:
+            print(f"Could not charge fair-share time for job {job.id}: {e}")
+
+        # Without a trace context (jobs enqueued before tracing) the spans are no-ops
+        context = job.meta.get('trace')
+        attributes = {
+            'stage': stage, 'queue': queue.name, 'job_id': job.id,
+            'research_id': ','.join(str(research_id) for research_id in research_ids),
+        }
+        ready_at = job.meta.get('ready_at') or job.meta.get('lane_entered_at') or time.time()
+        record_span(f'queue_wait {stage}', int(ready_at * 1e9), time.time_ns(), context, **attributes)
+        with span(f'stage {stage}', context, function=job.func_name, **attributes) as stage_span, \
+                self._recording(job, stage, research_ids):
+            succeeded = super().perform_job(job, queue)
+            if not succeeded and stage_span is not None:
+                stage_span.status = 'error'
+        if TRACE_EXPORT and not wait_for_export():
+            # The job process exits right after the job, taking the export queue with it
+            print(f"Trace spans of job {job.id} not exported in time")
+
+        record_events(
+            research_ids, 'finished' if succeeded else 'failed', stage, job_id=job.id,
+            duration_ms=int((time.monotonic() - started) * 1000)
+        )
+        return succeeded
 
 def run_worker(queue_name: str):
-    """Run worker for specific queue"""
-    worker = Worker(queue_name, connection=redis_conn)
-    worker.work()
+    """Run worker for specific queue, listening to its lanes in priority order"""
+    if queue_name in queues:
+        worker_queues = [get_queue(queue_name, priority) for priority in PRIORITIES]
+    else:
+        worker_queues = [Queue(queue_name, connection=redis_conn)]
+    worker = PriorityWorker(worker_queues, connection=redis_conn)
+    # The scheduler moves deferred stages back onto their lanes
+    worker.work(with_scheduler=True)
 
 if __name__ == '__main__':
     # Initialize database
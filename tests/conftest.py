@@ -0,0 +1,36 @@
+"""
+Shared test setup.
+
+Unit tests run without any services: the database is a temporary SQLite file
+and Redis is replaced by fakeredis (``fake_redis``). test_api.py exercises the
+live stack and is skipped when the API is not reachable.
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{tempfile.mkdtemp(prefix='tv_research_test_')}/test.db")
+os.environ.setdefault('OTEL_SDK_DISABLED', 'true')
+os.environ.setdefault('CREWAI_DISABLE_TELEMETRY', 'true')
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """fakeredis client standing in for the shared Redis connection of every tv_research module"""
+    import fakeredis
+    from tv_research import queue_client
+
+    conn = fakeredis.FakeRedis()
+    shared = queue_client.redis_conn
+    for name, module in list(sys.modules.items()):
+        if name.startswith('tv_research') and getattr(module, 'redis_conn', None) is shared:
+            monkeypatch.setattr(module, 'redis_conn', conn)
+    # The default tenant's lanes are created at import time
+    for lanes in queue_client.queues.values():
+        for queue in lanes.values():
+            monkeypatch.setattr(queue, 'connection', conn)
+    monkeypatch.setattr(queue_client, '_tenant_queues', {})
+    return conn
@@ -7,12 +7,24 @@ Run with: python -m pytest tests/test_api.py -v
 import pytest
 import requests
 import time
+import json
 import os
 from typing import Dict, Any
 
 # Test configuration
 API_BASE_URL = os.getenv("API_BASE_URL", "http://localhost:8000")
 
+
+def api_available() -> bool:
+    try:
+        return requests.get(f"{API_BASE_URL}/health", timeout=2).ok
+    except requests.RequestException:
+        return False
+
+
+# Integration tests against the running stack (API, Redis, workers)
+pytestmark = pytest.mark.skipif(not api_available(), reason=f"API not reachable at {API_BASE_URL}")
+
 class TestAPI:
     """Test suite for TV Research API"""
 
@@ -48,6 +60,43 @@ class TestAPI:
 
         return data["id"]
 
+    def test_high_priority_research_creation(self):
+        """Test creating breaking-news research on the high priority lane"""
+        response = requests.post(
+            f"{API_BASE_URL}/research",
+            json={"topic": "Priority Test Topic", "priority": "high"}
+        )
+        assert response.status_code == 200
+        assert response.json()["priority"] == "high"
+
+        response = requests.get(f"{API_BASE_URL}/queue/status")
+        assert response.status_code == 200
+        assert set(response.json()["lanes"]["trend_research"]) == {"high", "normal", "low"}
+
+    def test_research_reuse(self):
+        """Test that max_age=0 always starts a new run and reuse is reported"""
+        response = requests.post(
+            f"{API_BASE_URL}/research",
+            json={"topic": "Reuse Test Topic", "max_age": 0}
+        )
+        assert response.status_code == 200
+        assert response.json()["reused"] is False
+
+        response = requests.get(f"{API_BASE_URL}/metrics")
+        assert response.status_code == 200
+        assert "hit_rate" in response.json()["report_reuse"]
+
+    def test_schedules(self):
+        """Test listing schedules and fetching a schedule's latest report"""
+        response = requests.get(f"{API_BASE_URL}/schedules")
+        assert response.status_code == 200
+        schedules = {schedule["name"]: schedule for schedule in response.json()["schedules"]}
+        assert "daily_news_brief" in schedules
+        assert "next_start_at" in schedules["daily_news_brief"]
+
+        response = requests.get(f"{API_BASE_URL}/schedules/no_such_schedule/latest")
+        assert response.status_code == 404
+
     def test_research_retrieval(self):
         """Test getting specific research"""
         # First create a research
@@ -77,6 +126,151 @@ class TestAPI:
         for queue in expected_queues:
             assert queue in data["queues"]
 
+    def test_research_usage(self):
+        """Test per-stage token usage endpoint"""
+        research_id = self.test_research_creation()
+
+        response = requests.get(f"{API_BASE_URL}/research/{research_id}/usage")
+        assert response.status_code == 200
+
+        data = response.json()
+        assert data["research_id"] == research_id
+        assert isinstance(data["stages"], list)
+        assert "total_tokens" in data["totals"]
+
+    def test_metrics_token_usage(self):
+        """Test that metrics aggregate token usage per stage"""
+        response = requests.get(f"{API_BASE_URL}/metrics")
+        assert response.status_code == 200
+
+        data = response.json()
+        assert "by_stage" in data["token_usage"]
+        assert "cost_usd" in data["token_usage"]
+
+    def test_metrics_model_fallbacks(self):
+        """Test that metrics count the LLM calls served by fallback models per stage"""
+        response = requests.get(f"{API_BASE_URL}/metrics")
+        assert response.status_code == 200
+
+        for stage in response.json()["token_usage"]["by_stage"].values():
+            assert "fallback_calls" in stage
+
+    def test_metrics_handoffs(self):
+        """Test that metrics report pending stage hand-offs"""
+        response = requests.get(f"{API_BASE_URL}/metrics")
+        assert response.status_code == 200
+
+        handoffs = response.json()["handoffs"]
+        assert handoffs["pending"] >= 0
+        assert handoffs["relayed"] >= 0
+
+    def test_tenant_research_creation(self):
+        """Test that research runs of a tenant are queued on its own lanes"""
+        response = requests.post(
+            f"{API_BASE_URL}/research",
+            json={"topic": "Tenant Test Topic", "tenant": "test-desk", "max_age": 0}
+        )
+        assert response.status_code == 200
+        assert response.json()["tenant"] == "test-desk"
+
+        response = requests.get(f"{API_BASE_URL}/queue/status")
+        assert response.status_code == 200
+        assert "test-desk" in response.json()["tenants"]
+
+        response = requests.post(f"{API_BASE_URL}/research", json={"topic": "x", "tenant": "not a tenant"})
+        assert response.status_code == 422
+
+    def test_batch_research_creation(self):
+        """Test starting research for several topics with a batched trend stage"""
+        topics = ["Batch Test Topic A", "Batch Test Topic B"]
+        response = requests.post(
+            f"{API_BASE_URL}/research/batch",
+            json={"topics": topics, "batch_trend": True, "max_age": 0}
+        )
+        assert response.status_code == 200
+
+        data = response.json()
+        assert [item["topic"] for item in data] == topics
+        assert all(item["status"] in ["queued", "running"] for item in data)
+
+        response = requests.post(f"{API_BASE_URL}/research/batch", json={"topics": []})
+        assert response.status_code == 400
+
+    def test_research_trace(self):
+        """Test the trace waterfall of a research run"""
+        research_id = self.test_research_creation()
+
+        response = requests.get(f"{API_BASE_URL}/research/{research_id}/trace")
+        assert response.status_code == 200
+
+        data = response.json()
+        assert data["research_id"] == research_id
+        assert data["spans"][0]["name"] == "POST /research"
+        assert all("offset_ms" in span and "duration_ms" in span for span in data["spans"])
+
+        response = requests.get(f"{API_BASE_URL}/research/{research_id}/trace?format=text")
+        assert response.status_code == 200
+        assert "POST /research" in response.text
+
+        response = requests.get(f"{API_BASE_URL}/research/99999/trace")
+        assert response.status_code == 404
+
+    def test_research_timeline(self):
+        """Test status history and queue wait vs service time breakdown"""
+        research_id = self.test_research_creation()
+
+        response = requests.get(f"{API_BASE_URL}/research/{research_id}/timeline")
+        assert response.status_code == 200
+
+        data = response.json()
+        assert data["research_id"] == research_id
+        assert any(event["event"] == "enqueued" for event in data["events"])
+        assert all(isinstance(event["at_ms"], int) for event in data["events"])
+        assert "queue_wait_ms" in data["totals"]
+        assert "service_ms" in data["totals"]
+
+        response = requests.get(f"{API_BASE_URL}/research/99999/timeline")
+        assert response.status_code == 404
+
+    def test_report_download_invalid_research_id(self):
+        """Test downloading the report of research that does not exist"""
+        response = requests.get(f"{API_BASE_URL}/research/99999/report")
+        assert response.status_code == 404
+
+    def test_research_export(self):
+        """Test streaming export of research history"""
+        research_id = self.test_research_creation()
+
+        response = requests.get(f"{API_BASE_URL}/research/export", params={"topic": "api test topic"})
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        assert research_id in [row["id"] for row in rows]
+        assert all("result_content" not in row for row in rows)
+
+        response = requests.get(f"{API_BASE_URL}/research/export", params={"format": "csv", "include_body": "true"})
+        assert response.status_code == 200
+        header = response.text.splitlines()[0].split(",")
+        assert "id" in header and "result_content" in header
+
+    def test_bulk_delete_research(self):
+        """Test bulk deletion by filter"""
+        response = requests.delete(f"{API_BASE_URL}/research")
+        assert response.status_code == 400
+
+        response = requests.delete(
+            f"{API_BASE_URL}/research", params={"topic": "API Test Topic", "dry_run": "true"}
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert data["dry_run"] is True
+        assert data["deleted"] == 0
+
+    def test_refresh_invalid_research_id(self):
+        """Test refreshing research that does not exist"""
+        response = requests.post(f"{API_BASE_URL}/research/99999/refresh")
+        assert response.status_code == 404
+
     def test_invalid_research_id(self):
         """Test retrieving non-existent research"""
         response = requests.get(f"{API_BASE_URL}/research/99999")
@@ -107,6 +301,18 @@ class TestAPI:
                 assert "execution_time" in data
                 assert data["execution_time"] is not None
                 assert data["execution_time"] > 0
+
+                # The report is streamed from the artifact store
+                report = requests.get(f"{API_BASE_URL}/research/{research_id}/report")
+                assert report.status_code == 200
+                assert report.headers["etag"] == f'"{data["report_id"]}"'
+                partial = requests.get(f"{API_BASE_URL}/research/{research_id}/report", headers={"Range": "bytes=0-9"})
+                assert partial.status_code == 206
+                assert partial.content == report.content[:10]
+                cached = requests.get(
+                    f"{API_BASE_URL}/research/{research_id}/report", headers={"If-None-Match": report.headers["etag"]}
+                )
+                assert cached.status_code == 304
                 break
             elif status == "failed":
                 pytest.fail(f"Research failed: {data.get('error_message', 'Unknown error')}")
@@ -0,0 +1,54 @@
+"""
+Unit tests for report artifacts: byte ranges and the local store
+Run with: python -m pytest tests/test_artifacts.py -v
+"""
+
+import pytest
+
+from tv_research.artifacts import ArtifactNotFound, LocalArtifactStore, parse_range, report_id_for
+
+
+class TestParseRange:
+    """Single ``bytes=`` ranges of an artifact of 100 bytes"""
+
+    @pytest.mark.parametrize('header, expected', [
+        ('bytes=0-9', (0, 9)),
+        ('bytes=90-', (90, 99)),
+        ('bytes=90-500', (90, 99)),
+        ('bytes=-10', (90, 99)),
+        ('bytes=-500', (0, 99)),
+        (' bytes=5-5 ', (5, 5)),
+    ])
+    def test_satisfiable(self, header, expected):
+        assert parse_range(header, 100) == expected
+
+    @pytest.mark.parametrize('header', [
+        None, '', 'items=0-9', 'bytes=0-9,20-29', 'bytes=-', 'bytes=a-9', 'bytes=9-0', 'bytes=5',
+    ])
+    def test_ignored(self, header):
+        assert parse_range(header, 100) is None
+
+    @pytest.mark.parametrize('header, size', [('bytes=100-', 100), ('bytes=-0', 100), ('bytes=-5', 0)])
+    def test_not_satisfiable(self, header, size):
+        with pytest.raises(ValueError):
+            parse_range(header, size)
+
+
+class TestLocalArtifactStore:
+    """Content-addressed reports on the local filesystem"""
+
+    def test_put_stat_read_delete(self, tmp_path):
+        store = LocalArtifactStore(str(tmp_path))
+        content = b'# Report\n' * 10000
+        report_id = store.put(content)
+
+        assert report_id == report_id_for(content) == store.put(content)
+        assert store.stat(report_id)[0] == len(content)
+        assert b''.join(store.read(report_id)) == content
+        assert b''.join(store.read(report_id, 9, 17)) == b'# Report\n'
+
+        store.delete(report_id)
+        with pytest.raises(ArtifactNotFound):
+            store.stat(report_id)
+        with pytest.raises(ArtifactNotFound):
+            next(store.read(report_id))
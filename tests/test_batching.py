@@ -0,0 +1,46 @@
+"""
+Unit tests for splitting a batched trend answer into per-topic analyses
+Run with: python -m pytest tests/test_batching.py -v
+"""
+
+import json
+
+from tv_research.batching import parse_batch_result, parse_json_object
+
+TOPICS = ['AI in Healthcare', 'Électric Cars']
+
+
+class TestParseBatchResult:
+    """JSON answers, fenced answers and the markdown fallback"""
+
+    def test_json_answer(self):
+        answer = json.dumps({'topics': [
+            {'topic': 'ai in healthcare', 'analysis': 'AI analysis'},
+            {'topic': 'Electric cars!', 'analysis': {'trend': 'rising'}},
+        ]})
+        analyses = parse_batch_result(answer, TOPICS)
+        assert analyses['ai in healthcare'] == 'AI analysis'
+        assert json.loads(analyses['electric cars']) == {'trend': 'rising'}
+
+    def test_fenced_answer_with_prose(self):
+        answer = 'Here you go:\n```json\n{"topics": [{"topic": "AI in Healthcare", "analysis": "A"}]}\n```'
+        assert parse_json_object(answer) == {'topics': [{'topic': 'AI in Healthcare', 'analysis': 'A'}]}
+        assert parse_batch_result(answer, TOPICS) == {'ai in healthcare': 'A'}
+
+    def test_unknown_and_empty_topics_are_dropped(self):
+        answer = json.dumps({'topics': [
+            {'topic': 'Space', 'analysis': 'not asked for'},
+            {'topic': 'AI in Healthcare', 'analysis': '  '},
+            'not an object',
+        ]})
+        assert parse_batch_result(answer, TOPICS) == {}
+
+    def test_markdown_fallback_for_missing_topics(self):
+        answer = '# Trends\n\n## AI in Healthcare\n\nAI section\n\n## Electric Cars\n\nEV section'
+        assert parse_batch_result(answer, TOPICS) == {
+            'ai in healthcare': 'AI section', 'electric cars': 'EV section'
+        }
+
+    def test_invalid_answer(self):
+        assert parse_json_object('no json here') is None
+        assert parse_batch_result('', TOPICS) == {}
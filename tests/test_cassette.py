@@ -0,0 +1,54 @@
+"""
+Unit tests for worker-side cassette recording and replay of research runs
+Run with: python -m pytest tests/test_cassette.py -v
+"""
+
+import os
+
+from tv_research import cassette
+from tv_research.cassette import (
+    Cassette, cassette_call, enable_recording, record_stage, recording_enabled, run_cassette_dir, use_cassette
+)
+
+CALLS = {
+    'trend_research': [('llm', {'model': 'gpt-4o-mini', 'messages': ['find trends']}, 'Alpha, Beta')],
+    'news_aggregation': [
+        ('tool:Search', {'search_query': 'Alpha'}, {'organic': [{'title': 'Alpha news'}]}),
+        ('llm', {'model': 'gpt-4o-mini', 'messages': ['summarize Alpha news']}, 'Alpha summary'),
+    ],
+}
+
+
+def run_stage(stage: str) -> list:
+    return [cassette_call(stream, request, lambda response=response: response)
+            for stream, request, response in CALLS[stage]]
+
+
+class TestRunRecording:
+    """Stage jobs record one cassette part each; the run directory replays them in order"""
+
+    def test_enabled_per_run_or_tenant(self, fake_redis, monkeypatch):
+        monkeypatch.setattr(cassette, 'CASSETTE_RECORD_TENANTS', {'sports-desk'})
+        assert not recording_enabled(1)
+        assert recording_enabled(1, 'sports-desk')
+        enable_recording(1)
+        assert recording_enabled(1)
+
+    def test_record_then_replay(self, fake_redis, monkeypatch, tmp_path):
+        monkeypatch.setattr(cassette, 'CASSETTE_DIR', str(tmp_path))
+        enable_recording(7)
+        recorded = []
+        for stage in CALLS:
+            with record_stage(7, stage, {'research_focus': 'Alpha'}, job_id=f'{stage}-job'):
+                recorded.append(run_stage(stage))
+
+        assert sorted(os.listdir(run_cassette_dir(7))) == [
+            '001-trend_research.jsonl.gz', '002-news_aggregation.jsonl.gz'
+        ]
+        replay = Cassette(run_cassette_dir(7), 'replay', 'zero')
+        assert replay.header['stage'] == 'trend_research' and replay.inputs == {'research_focus': 'Alpha'}
+        with use_cassette(replay):
+            replayed = [run_stage(stage) for stage in CALLS]
+        assert replayed == recorded
+        assert replay.mismatches == 0
+        assert replay.remaining() == {}
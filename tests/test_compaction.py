@@ -0,0 +1,91 @@
+"""
+Unit tests for context compaction between pipeline stages
+Run with: python -m pytest tests/test_compaction.py -v
+"""
+
+import re
+
+from tv_research.compaction import allocate_budget, compact_text, count_tokens, extractive_summary
+
+
+def trend_report(sections: int = 40) -> str:
+    """A long trend report with a title, sections, lists and paragraphs"""
+    parts = ["# Trend Report", "Generated for the evening news desk. Covers the last 24 hours."]
+    for number in range(1, sections + 1):
+        parts.append(f"## Topic {number}")
+        parts.append(
+            f"Topic {number} is trending across social media. Mentions doubled overnight. "
+            f"Coverage is led by national outlets and local stations."
+        )
+        parts.append(
+            f"- Engagement: about {number * 10}k mentions. Mostly on video platforms.\n"
+            f"- Trajectory: rising\n"
+            f"- Audience: adults 25-54"
+        )
+    return '\n\n'.join(parts)
+
+
+class TestExtractiveSummary:
+    """Extractive summaries stay within budget and never come back empty"""
+
+    def test_short_text_unchanged(self):
+        text = "# Title\n\nShort body."
+        assert extractive_summary(text, 100) == text
+
+    def test_large_budget_keeps_structure(self):
+        summary = extractive_summary(trend_report(), 600)
+        assert summary.startswith("# Trend Report")
+        assert "## Topic 1" in summary
+        assert "Topic 1 is trending across social media." in summary
+        assert count_tokens(summary) <= 600
+
+    def test_small_budgets_keep_body_text(self):
+        report = trend_report()
+        assert count_tokens(report) > 2000
+        for budget in (100, 30):
+            summary = extractive_summary(report, budget)
+            assert summary.strip()
+            assert "Generated for the evening news desk." in summary or "trending" in summary
+            assert count_tokens(summary) <= budget
+
+    def test_title_ranked_above_sections(self):
+        summary = extractive_summary(trend_report(), 100)
+        assert summary.startswith("# Trend Report")
+
+    def test_zero_budget_is_not_empty(self):
+        summary = extractive_summary(trend_report(), 0)
+        assert summary.strip()
+        assert count_tokens(summary) <= 1
+
+    def test_heading_only_budget_falls_back_to_lead_paragraph(self):
+        report = "# Trend Report\n\n## A long section heading that takes the whole budget\n\nBody text follows here."
+        summary = extractive_summary(report, 8)
+        assert summary.strip()
+        assert not summary.startswith("#")
+        assert count_tokens(summary) <= 8
+
+    def test_heading_only_text(self):
+        text = '\n\n'.join(f"## Heading number {number}" for number in range(50))
+        summary = extractive_summary(text, 20)
+        assert summary.strip()
+        assert count_tokens(summary) <= 20
+
+    def test_compact_text_reports_kept_tokens(self):
+        compacted = compact_text(trend_report(), 60, mode='extractive')
+        kept = int(re.search(r"\[Compacted from \d+ to (\d+) tokens", compacted).group(1))
+        assert kept > 0
+
+
+class TestAllocateBudget:
+    """Budget split between upstream outputs"""
+
+    def test_proportional_split(self):
+        allocation = allocate_budget({'a': 1000, 'b': 1000}, {'a': 0.25, 'b': 0.75}, 400)
+        assert allocation == {'a': 100, 'b': 300}
+
+    def test_small_outputs_keep_their_size(self):
+        allocation = allocate_budget({'a': 50, 'b': 1000}, {'a': 0.5, 'b': 0.5}, 400)
+        assert allocation == {'a': 50, 'b': 350}
+
+    def test_everything_fits(self):
+        assert allocate_budget({'a': 10, 'b': 20}, {}, 100) == {'a': 10, 'b': 20}
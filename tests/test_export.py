@@ -0,0 +1,82 @@
+"""
+Unit tests for the streaming research export, against the test database
+Run with: python -m pytest tests/test_export.py -v
+"""
+
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from tv_research.api import app
+from tv_research.models import ResearchResult, get_db, init_db
+
+
+@pytest.fixture(scope='module')
+def runs():
+    """Runs whose topics differ only where an unescaped LIKE wildcard would match"""
+    init_db()
+    created = datetime.utcnow() - timedelta(days=1)
+    db = get_db()
+    try:
+        rows = [
+            ResearchResult(topic='Export 50%_off sale', status='completed', result_content='# Sale report',
+                           created_at=created),
+            ResearchResult(topic='Export 50 off sale', status='completed', result_content='# Other report',
+                           created_at=created),
+            ResearchResult(topic='Export 50%xoff sale', status='failed', error_message='boom', created_at=created),
+        ]
+        db.add_all(rows)
+        db.commit()
+        return [row.id for row in rows]
+    finally:
+        db.close()
+
+
+def export(**params):
+    response = TestClient(app).get('/research/export', params=params)
+    assert response.status_code == 200
+    return response
+
+
+class TestExport:
+    """GET /research/export"""
+
+    def test_ndjson(self, runs):
+        response = export(topic='Export 50')
+        assert response.headers['content-type'] == 'application/x-ndjson'
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        assert [row['id'] for row in rows] == runs
+        assert rows[0]['status'] == 'completed' and 'result_content' not in rows[0]
+        assert datetime.fromisoformat(rows[0]['created_at'])
+
+    def test_csv(self, runs):
+        response = export(format='csv', topic='Export 50', status='failed')
+        assert response.headers['content-type'].startswith('text/csv')
+        assert 'research_export.csv' in response.headers['content-disposition']
+        rows = list(csv.DictReader(io.StringIO(response.text)))
+        assert [(int(row['id']), row['status'], row['error_message']) for row in rows] == [
+            (runs[2], 'failed', 'boom')
+        ]
+
+    def test_wildcards_in_topic_are_literal(self, runs):
+        rows = [json.loads(line) for line in export(topic='50%_off').text.splitlines()]
+        assert [row['id'] for row in rows] == [runs[0]]
+        assert export(topic='50_off').text == ''
+
+    def test_include_body(self, runs):
+        rows = list(csv.DictReader(io.StringIO(
+            export(format='csv', topic='Export 50%_off', include_body='true').text
+        )))
+        assert [row['result_content'] for row in rows] == ['# Sale report']
+        rows = [json.loads(line) for line in export(topic='Export 50%_off', include_body='true').text.splitlines()]
+        assert rows[0]['result_content'] == '# Sale report'
+
+    def test_until_must_follow_since(self):
+        response = TestClient(app).get('/research/export', params={
+            'since': '2026-10-19T00:00:00', 'until': '2026-10-18T00:00:00'
+        })
+        assert response.status_code == 400
@@ -0,0 +1,62 @@
+"""
+Unit tests for the dequeue order of tenant lanes, against fakeredis
+Run with: python -m pytest tests/test_fairshare.py -v
+"""
+
+import time
+
+import pytest
+from rq.registry import StartedJobRegistry
+
+from tv_research import fairshare
+from tv_research.fairshare import charge, fair_lanes
+from tv_research.queue_client import DEFAULT_TENANT, PRIORITIES, TENANTS_KEY, get_queue
+
+STAGE = 'news_aggregation'
+
+
+@pytest.fixture
+def tenants(fake_redis, monkeypatch):
+    monkeypatch.setattr(fairshare, '_charge', None)
+    fake_redis.sadd(TENANTS_KEY, 'archive', 'newsdesk')
+    return [DEFAULT_TENANT, 'archive', 'newsdesk']
+
+
+def lane_order(priority: str) -> list:
+    """Tenants in the order their ``priority`` lanes are dequeued from"""
+    names = {get_queue(STAGE, priority, tenant).name: tenant for tenant in [DEFAULT_TENANT, 'archive', 'newsdesk']}
+    return [names[queue.name] for queue in fair_lanes([STAGE]) if queue.name in names]
+
+
+class TestFairLanes:
+    """Priority first, then start-time fair queuing between tenants under quota"""
+
+    def test_priorities_come_first(self, tenants):
+        lanes = [queue.name for queue in fair_lanes([STAGE])]
+        expected = [get_queue(STAGE, priority, tenant).name for priority in PRIORITIES for tenant in tenants]
+        assert sorted(lanes) == sorted(expected)
+        for index, priority in enumerate(PRIORITIES):
+            block = lanes[index * len(tenants):(index + 1) * len(tenants)]
+            assert set(block) == {get_queue(STAGE, priority, tenant).name for tenant in tenants}
+
+    def test_busy_tenant_goes_last(self, tenants):
+        charge(STAGE, 'newsdesk')
+        for _ in range(3):
+            charge(STAGE, 'archive')
+        # Idle tenants start at the stage clock, ahead of the tenants that used more
+        assert lane_order('normal') == [DEFAULT_TENANT, 'newsdesk', 'archive']
+
+    def test_weights_slow_down_virtual_time(self, tenants, monkeypatch):
+        monkeypatch.setattr(fairshare, 'TENANT_WEIGHTS', {'newsdesk': 4.0})
+        for _ in range(3):
+            charge(STAGE, 'newsdesk')
+        charge(STAGE, 'archive')
+        charge(STAGE, DEFAULT_TENANT)
+        assert lane_order('high') == ['newsdesk', 'archive', DEFAULT_TENANT]
+
+    def test_tenant_at_quota_is_left_out(self, tenants, fake_redis, monkeypatch):
+        monkeypatch.setattr(fairshare, 'TENANT_MAX_CONCURRENCY', {'archive': 1})
+        registry = StartedJobRegistry(queue=get_queue(STAGE, 'low', 'archive'))
+        fake_redis.zadd(registry.key, {'archive-job': time.time() + 600})
+        assert 'archive' not in lane_order('normal')
+        assert lane_order('normal') == [DEFAULT_TENANT, 'newsdesk']
@@ -0,0 +1,98 @@
+"""
+Unit tests for the stage hand-off outbox, against fakeredis and the test database
+Run with: python -m pytest tests/test_handoff.py -v
+"""
+
+from datetime import datetime, timedelta
+
+from tv_research.handoff import LOCK_PREFIX, STATS_KEY, dispatch, handoff_job_id, new_handoff, relay_pending
+from tv_research.models import ResearchResult, StageHandoff, get_db, init_db
+from tv_research.queue_client import enqueue_stage, get_queue
+from tv_research.worker import run_news_aggregation
+
+
+def pending_handoff(age: int = 0) -> StageHandoff:
+    """A research run whose trend stage completed and handed off to news aggregation ``age`` seconds ago"""
+    init_db()
+    db = get_db()
+    try:
+        research = ResearchResult(status='trend_research_completed')
+        db.add(research)
+        db.commit()
+        handoff = new_handoff(
+            research.id, 'trend_research', 'news_aggregation', run_news_aggregation,
+            (research.id, {'research_focus': 'Outbox'}, 'trends'), tenant='default'
+        )
+        handoff.created_at = datetime.utcnow() - timedelta(seconds=age)
+        db.add(handoff)
+        db.commit()
+        db.refresh(handoff)
+        db.expunge(handoff)
+        return handoff
+    finally:
+        db.close()
+
+
+def stored(handoff_id: int) -> StageHandoff:
+    db = get_db()
+    try:
+        return db.get(StageHandoff, handoff_id)
+    finally:
+        db.close()
+
+
+def news_jobs() -> list:
+    return get_queue('news_aggregation').get_job_ids()
+
+
+class TestDispatch:
+    """A hand-off enqueues its next stage exactly once"""
+
+    def test_repeated_dispatch_enqueues_once(self, fake_redis):
+        handoff = pending_handoff()
+
+        assert dispatch(handoff.id)
+        assert not dispatch(handoff.id)
+
+        job_id = handoff_job_id(handoff.attempt_key)
+        assert news_jobs() == [job_id]
+        row = stored(handoff.id)
+        assert (row.job_id, row.attempts, row.payload) == (job_id, 1, None)
+        assert row.dispatched_at is not None
+        assert not fake_redis.exists(f'{LOCK_PREFIX}:{handoff.id}')
+
+    def test_dispatch_after_crash_finds_enqueued_job(self, fake_redis):
+        handoff = pending_handoff()
+        job_id = handoff_job_id(handoff.attempt_key)
+        # The previous dispatcher enqueued the job and crashed before marking the row
+        enqueue_stage('news_aggregation', run_news_aggregation, handoff.research_id, {}, 'trends', job_id=job_id)
+
+        assert dispatch(handoff.id)
+        assert news_jobs() == [job_id]
+        assert stored(handoff.id).dispatched_at is not None
+
+    def test_locked_handoff_is_left_to_its_dispatcher(self, fake_redis):
+        handoff = pending_handoff()
+        fake_redis.set(f'{LOCK_PREFIX}:{handoff.id}', 1)
+
+        assert not dispatch(handoff.id)
+        assert news_jobs() == []
+        assert stored(handoff.id).dispatched_at is None
+
+
+class TestRelayPending:
+    """The relay dispatches hand-offs pending past the grace period"""
+
+    def test_relays_only_stale_handoffs(self, fake_redis):
+        stale = pending_handoff(age=120)
+        fresh = pending_handoff()
+
+        relayed = relay_pending(grace=60)
+
+        assert stale.research_id in relayed and fresh.research_id not in relayed
+        assert handoff_job_id(stale.attempt_key) in news_jobs()
+        assert handoff_job_id(fresh.attempt_key) not in news_jobs()
+        row = stored(stale.id)
+        assert row.dispatched_at is not None and row.payload is None
+        assert stored(fresh.id).dispatched_at is None
+        assert int(fake_redis.hget(STATS_KEY, 'relayed')) == len(relayed)
@@ -0,0 +1,26 @@
+"""
+Unit tests for the autoscaling supervisor's queue metrics, against fakeredis
+Run with: python -m pytest tests/test_manage_workers.py -v
+"""
+
+from tv_research import manage_workers
+from tv_research.models import init_db
+from tv_research.queue_client import enqueue_stage
+
+
+class TestStageMetrics:
+    """Queue depth is sampled over every tenant's lanes"""
+
+    def test_depth_counts_every_tenant(self, fake_redis):
+        init_db()
+        enqueue_stage('news_aggregation', 'tv_research.worker.run_news_aggregation', 1, {}, priority='high')
+        enqueue_stage('news_aggregation', 'tv_research.worker.run_news_aggregation', 2, {}, tenant='archive')
+        enqueue_stage(
+            'news_aggregation', 'tv_research.worker.run_news_aggregation', 3, {}, priority='low', tenant='sports'
+        )
+
+        metrics = manage_workers.sample_stage_metrics()
+
+        assert set(metrics) == set(manage_workers.STAGES)
+        assert metrics['news_aggregation']['depth'] == 3
+        assert metrics['trend_research']['depth'] == 0
@@ -0,0 +1,69 @@
+"""
+Unit tests for stage memoization: leader election and follower hand-off, against fakeredis
+Run with: python -m pytest tests/test_memo.py -v
+"""
+
+from tv_research import memo
+from tv_research.memo import (
+    abandon, claim_leader, get_memoized, join_as_follower, publish, stage_memo_key, stranded_followers
+)
+
+INPUTS = {'research_focus': 'AI in Healthcare', 'channel_type': 'News', 'timestamp': '2026-10-19 08:00'}
+
+
+class TestStageMemoKey:
+    """Requests differing only in volatile inputs share a key"""
+
+    def test_normalized_inputs(self):
+        key = stage_memo_key('trend_research', INPUTS, 'gpt-4o-mini')
+        same = {'research_focus': ' ai  in healthcare', 'channel_type': 'NEWS', 'timestamp': 'later'}
+        assert stage_memo_key('trend_research', same, 'gpt-4o-mini') == key
+        assert stage_memo_key('trend_research', INPUTS, 'gpt-4o') != key
+        assert stage_memo_key('news_aggregation', INPUTS, 'gpt-4o-mini') != key
+
+
+class TestLeaderFollower:
+    """One leader runs the stage; followers are handed its result"""
+
+    def test_followers_are_handed_the_result(self, fake_redis):
+        key = stage_memo_key('trend_research', INPUTS)
+        assert claim_leader(key, 1)
+        assert claim_leader(key, 1)  # a requeued leader keeps its lock
+        assert not claim_leader(key, 2)
+        assert join_as_follower(key, 2, INPUTS, 'normal', 'newsdesk') is None
+        assert join_as_follower(key, 3, INPUTS, 'high') is None
+
+        waiters = publish(key, 1, 'trends')
+        assert [(waiter['task_id'], waiter['priority'], waiter['tenant']) for waiter in waiters] == [
+            (2, 'normal', 'newsdesk'), (3, 'high', None)
+        ]
+        assert get_memoized(key)['result'] == 'trends'
+        assert not fake_redis.exists(f'{key}:lock') and not fake_redis.hlen(memo.WAITING_KEY)
+
+    def test_follower_joining_after_publish_takes_cached_result(self, fake_redis):
+        key = stage_memo_key('trend_research', INPUTS)
+        claim_leader(key, 1)
+        publish(key, 1, 'trends')
+
+        cached = join_as_follower(key, 2, INPUTS, 'normal')
+        assert cached['result'] == 'trends' and cached['research_id'] == 1
+        assert not fake_redis.llen(f'{key}:waiters') and not fake_redis.hlen(memo.WAITING_KEY)
+
+    def test_failed_leader_releases_followers(self, fake_redis):
+        key = stage_memo_key('trend_research', INPUTS)
+        claim_leader(key, 1)
+        join_as_follower(key, 2, INPUTS, 'normal')
+
+        assert [waiter['task_id'] for waiter in abandon(key)] == [2]
+        assert get_memoized(key) is None
+        assert claim_leader(key, 2)
+
+    def test_followers_of_a_dead_leader_are_stranded(self, fake_redis):
+        key = stage_memo_key('trend_research', INPUTS)
+        claim_leader(key, 1)
+        join_as_follower(key, 2, INPUTS, 'low')
+        assert stranded_followers(0) == []
+
+        fake_redis.delete(f'{key}:lock')  # the leader's lock expired
+        assert [follower['task_id'] for follower in stranded_followers(0)] == [2]
+        assert stranded_followers(0) == []
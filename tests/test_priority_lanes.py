@@ -0,0 +1,61 @@
+"""
+Unit tests for priority lane aging and schema upgrades of older databases
+Run with: python -m pytest tests/test_priority_lanes.py -v
+"""
+
+from sqlalchemy import create_engine, inspect, text
+
+from tv_research import models
+from tv_research.queue_client import enqueue_stage, get_queue
+from tv_research.worker import promote_aged_jobs, run_news_aggregation
+
+
+def enqueue_waiting(priority: str, waited: int):
+    job = enqueue_stage('news_aggregation', run_news_aggregation, 1, {}, priority=priority)
+    job.meta['lane_entered_at'] -= waited
+    job.save_meta()
+    return job
+
+
+def lane_ids(priority: str) -> list:
+    return get_queue('news_aggregation', priority).get_job_ids()
+
+
+class TestPromoteAgedJobs:
+    """Low jobs age into the normal lane; the high lane stays reserved"""
+
+    def test_low_moves_to_normal_only(self, fake_redis):
+        low = enqueue_waiting('low', 600)
+        normal = enqueue_waiting('normal', 600)
+
+        assert promote_aged_jobs('news_aggregation', max_age=300, high_max_age=0) == 1
+        assert lane_ids('high') == []
+        assert lane_ids('normal') == [normal.id, low.id]
+        assert lane_ids('low') == []
+
+    def test_normal_moves_behind_high_with_own_threshold(self, fake_redis):
+        high = enqueue_waiting('high', 0)
+        old = enqueue_waiting('normal', 4000)
+        young = enqueue_waiting('normal', 600)
+
+        assert promote_aged_jobs('news_aggregation', max_age=300, high_max_age=3600) == 1
+        assert lane_ids('high') == [high.id, old.id]
+        assert lane_ids('normal') == [young.id]
+
+
+class TestAddMissingColumns:
+    """Upgrading a database created before a column adds the column's index"""
+
+    def test_creates_indexes_of_added_columns(self, monkeypatch, tmp_path):
+        engine = create_engine(f'sqlite:///{tmp_path}/old.db')
+        with engine.begin() as conn:
+            conn.execute(text('CREATE TABLE research_results (id INTEGER PRIMARY KEY, topic VARCHAR(500))'))
+        monkeypatch.setattr(models, 'engine', engine)
+
+        models.add_missing_columns()
+
+        inspector = inspect(engine)
+        columns = {column['name'] for column in inspector.get_columns('research_results')}
+        indexed = {tuple(index['column_names']) for index in inspector.get_indexes('research_results')}
+        assert {'topic_key', 'schedule_name', 'parent_id', 'tenant'} <= columns
+        assert {('topic_key',), ('schedule_name',), ('parent_id',), ('tenant',)} <= indexed
@@ -0,0 +1,82 @@
+"""
+Unit tests for the cluster-wide rate limiter, against fakeredis
+Run with: python -m pytest tests/test_ratelimit.py -v
+"""
+
+import pytest
+
+from tv_research import ratelimit
+from tv_research.ratelimit import (
+    KEY_PREFIX, RateLimiter, RateLimitTimeout, get_limits, llm_provider, llm_rate_limit
+)
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Delays the limiter slept for, without sleeping"""
+    delays = []
+    monkeypatch.setattr(ratelimit.time, 'sleep', delays.append)
+    return delays
+
+
+def bucket_tokens(conn, scope: str, unit: str) -> float:
+    return float(conn.hget(f'{KEY_PREFIX}:bucket:{scope}:{unit}', 'tokens'))
+
+
+class TestRateLimiter:
+    """Token buckets shared through Redis"""
+
+    def test_acquire_within_capacity(self, fake_redis):
+        limiter = RateLimiter(fake_redis)
+        limiter.acquire('serper', [('serper', 'rpm', 10, 1)])
+        limiter.acquire('serper', [('serper', 'rpm', 10, 1)])
+        assert bucket_tokens(fake_redis, 'serper', 'rpm') == pytest.approx(8, abs=0.01)
+        assert not fake_redis.zcard(f'{KEY_PREFIX}:queue:serper')
+
+    def test_exhausted_bucket_times_out(self, fake_redis, sleeps):
+        limiter = RateLimiter(fake_redis)
+        buckets = [('scrape', 'rpm', 2, 1)]
+        limiter.acquire('scrape', buckets)
+        limiter.acquire('scrape', buckets)
+        with pytest.raises(RateLimitTimeout):
+            limiter.acquire('scrape', buckets, max_wait=0.05)
+        # The refill of one request at 2 RPM is 30s away; polling is capped at 5s
+        assert sleeps and set(sleeps) == {5.0}
+        assert not fake_redis.zcard(f'{KEY_PREFIX}:queue:scrape')
+
+    def test_waiters_are_served_in_order(self, fake_redis, sleeps):
+        limiter = RateLimiter(fake_redis)
+        queue, seen = f'{KEY_PREFIX}:queue:serper', f'{KEY_PREFIX}:seen:serper'
+        now_ms = int(fake_redis.time()[0]) * 1000
+        fake_redis.zadd(queue, {'earlier': now_ms - 1000})
+        fake_redis.hset(seen, 'earlier', now_ms)
+        with pytest.raises(RateLimitTimeout):
+            limiter.acquire('serper', [('serper', 'rpm', 10, 1)], max_wait=0.05)
+        assert set(sleeps) == {ratelimit.POLL_INTERVAL}
+
+        # A waiter that stopped polling loses its place
+        fake_redis.hset(seen, 'earlier', now_ms - ratelimit.RATE_LIMIT_STALE_MS - 1000)
+        limiter.acquire('serper', [('serper', 'rpm', 10, 1)], max_wait=0.05)
+        assert not fake_redis.zcard(queue)
+
+    def test_llm_tokens_are_reconciled(self, fake_redis, monkeypatch):
+        monkeypatch.setattr(ratelimit, '_limiter', RateLimiter(fake_redis))
+        with llm_rate_limit('gpt-4o-mini', 1000) as reconcile:
+            reconcile(400)
+        assert bucket_tokens(fake_redis, 'openai', 'tpm') == pytest.approx(199600, abs=1)
+        assert bucket_tokens(fake_redis, 'openai', 'rpm') == pytest.approx(499, abs=0.01)
+
+
+class TestLimits:
+    """Scopes and their configured limits"""
+
+    def test_environment_overrides(self, monkeypatch):
+        monkeypatch.setenv('RATE_LIMIT_GPT_4O_MINI_TPM', '50000')
+        monkeypatch.setenv('RATE_LIMIT_SERPER_RPM', '0')
+        assert get_limits('gpt-4o-mini') == {'tpm': 50000}
+        assert get_limits('serper', {'rpm': 300}) == {}
+
+    def test_llm_provider(self):
+        assert llm_provider('anthropic/claude-3-5-sonnet') == 'anthropic'
+        assert llm_provider('claude-3-haiku') == 'anthropic'
+        assert llm_provider('gpt-4o-mini') == 'openai'
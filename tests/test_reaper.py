@@ -0,0 +1,149 @@
+"""
+Unit tests for the stuck-job reaper and duplicate stage deliveries, against fakeredis
+Run with: python -m pytest tests/test_reaper.py -v
+"""
+
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from rq.job import JobStatus
+from rq.registry import FailedJobRegistry, StartedJobRegistry
+
+from tv_research import reaper
+from tv_research.handoff import new_handoff
+from tv_research.memo import claim_leader, join_as_follower, stage_memo_key
+from tv_research.models import ResearchResult, get_db, init_db
+from tv_research.queue_client import enqueue_stage, get_queue
+from tv_research.reaper import find_orphans, has_heartbeat, reclaim, reclaim_stranded_followers
+from tv_research.worker import heartbeat_key, run_news_aggregation, with_heartbeat
+
+
+def create_run(status: str) -> int:
+    init_db()
+    db = get_db()
+    try:
+        research = ResearchResult(status=status)
+        db.add(research)
+        db.commit()
+        return research.id
+    finally:
+        db.close()
+
+
+def run_status(research_id: int) -> str:
+    db = get_db()
+    try:
+        return db.get(ResearchResult, research_id).status
+    finally:
+        db.close()
+
+
+def started_job(conn, research_id: int, started_ago: int = 600):
+    """A news aggregation job a worker picked up ``started_ago`` seconds ago"""
+    job = enqueue_stage('news_aggregation', run_news_aggregation, research_id, {}, 'trends')
+    queue = get_queue('news_aggregation')
+    queue.remove(job)
+    job.started_at = datetime.utcnow() - timedelta(seconds=started_ago)
+    job.set_status(JobStatus.STARTED)
+    job.save()
+    # RQ 2 registers executions as "{job_id}:{execution_id}"
+    conn.zadd(StartedJobRegistry(queue=queue).key, {f'{job.id}:execution-1': time.time() + 600})
+    return job
+
+
+class TestReclaim:
+    """Stages of dead workers are requeued, then failed"""
+
+    def test_stale_heartbeat_is_requeued_at_front(self, fake_redis):
+        research_id = create_run('news_aggregation_running')
+        job = started_job(fake_redis, research_id)
+        waiting = enqueue_stage('news_aggregation', run_news_aggregation, create_run('queued'), {}, 'trends')
+        # The heartbeat of the dead worker expired
+        fake_redis.zadd(heartbeat_key(research_id), {'dead-worker': time.time() - 1})
+        assert not has_heartbeat(research_id)
+
+        orphans = find_orphans()
+        assert orphans[research_id][0] == 'news_aggregation'
+        assert orphans[research_id][1].id == job.id
+
+        event = reclaim(research_id, *orphans[research_id])
+
+        queue = get_queue('news_aggregation')
+        assert event['action'] == 'requeued' and event['attempt'] == 1
+        assert queue.get_job_ids() == [job.id, waiting.id]
+        assert job.id not in StartedJobRegistry(queue=queue).get_job_ids()
+        job.refresh()
+        assert job.meta['reap_attempts'] == 1
+        assert run_status(research_id) == 'news_aggregation_requeued'
+
+    def test_live_heartbeat_is_left_alone(self, fake_redis):
+        research_id = create_run('news_aggregation_running')
+        started_job(fake_redis, research_id)
+        fake_redis.zadd(heartbeat_key(research_id), {'live-worker': time.time() + 60})
+        assert research_id not in find_orphans()
+
+    def test_fails_after_max_attempts(self, fake_redis):
+        research_id = create_run('news_aggregation_running')
+        job = started_job(fake_redis, research_id)
+        job.meta['reap_attempts'] = reaper.REAPER_MAX_ATTEMPTS
+        job.save_meta()
+
+        event = reclaim(research_id, 'news_aggregation', job)
+
+        queue = get_queue('news_aggregation')
+        assert event['action'] == 'failed'
+        assert job.id not in queue.get_job_ids()
+        assert job.id in FailedJobRegistry(queue=queue).get_job_ids()
+        assert run_status(research_id) == 'failed'
+        assert reaper.get_reaper_report()['failed'] == 1
+
+
+class TestStrandedFollowers:
+    """Followers of a memo leader that died get their own trend stage"""
+
+    def test_follower_is_requeued(self, fake_redis, monkeypatch):
+        monkeypatch.setattr(reaper, 'REAPER_GRACE_SECONDS', 0)
+        follower_id = create_run('queued')
+        key = stage_memo_key('trend_research', {'research_focus': 'Reaper'})
+        claim_leader(key, follower_id - 1)
+        join_as_follower(key, follower_id, {'research_focus': 'Reaper'}, 'normal')
+        fake_redis.delete(f'{key}:lock')
+
+        assert reclaim_stranded_followers() == [follower_id]
+        jobs = get_queue('trend_research').get_jobs()
+        assert [job.args[0] for job in jobs] == [follower_id]
+
+
+class TestWithHeartbeat:
+    """Heartbeats while a stage runs; duplicate deliveries are skipped"""
+
+    def test_heartbeat_while_running(self, fake_redis):
+        research_id = create_run('news_aggregation_running')
+        beating = []
+
+        @with_heartbeat('news_aggregation')
+        def stage(task_id):
+            time.sleep(0.1)
+            beating.append(has_heartbeat(task_id))
+            return 'news'
+
+        assert stage(research_id) == 'news'
+        assert beating == [True]
+        assert not has_heartbeat(research_id)
+
+    def test_duplicate_delivery_is_skipped(self, fake_redis):
+        research_id = create_run('news_aggregation_completed')
+        db = get_db()
+        try:
+            db.add(new_handoff(research_id, 'news_aggregation'))
+            db.commit()
+        finally:
+            db.close()
+
+        @with_heartbeat('news_aggregation')
+        def stage(task_id):
+            pytest.fail("a completed stage ran again")
+
+        assert stage(research_id) is None
+        assert not fake_redis.exists(heartbeat_key(research_id))
@@ -0,0 +1,112 @@
+"""
+Unit tests for incremental refresh: section merging and the refresh stages
+Run with: python -m pytest tests/test_refresh.py -v
+"""
+
+import crewai
+
+from tv_research import refresh
+from tv_research.models import ResearchResult, StageHandoff, StageOutput, get_db, init_db
+from tv_research.refresh import NO_NEW_DEVELOPMENTS, merge_sections, split_sections
+from tv_research.tools import RateLimitedSerperDevTool
+
+BASE = """# Report
+
+Intro
+
+## Summary
+
+Old summary
+
+## Stories
+
+Old stories
+
+## Appendix
+
+Sources"""
+
+
+class TestMergeSections:
+    """Splicing updated sections into a markdown document by heading"""
+
+    def test_title_stays_in_preamble(self):
+        preamble, sections = split_sections(BASE)
+        assert preamble == '# Report\n\nIntro'
+        assert [title for _, title, _ in sections] == ['Summary', 'Stories', 'Appendix']
+
+    def test_replaces_matching_sections(self):
+        merged, changed = merge_sections(BASE, '## 1. stories!\n\nNew stories')
+        assert changed == ['Stories']
+        assert '## Stories\n\nNew stories' in merged
+        assert 'Old stories' not in merged and 'Old summary' in merged
+
+    def test_adds_new_sections_before_appendix(self):
+        merged, changed = merge_sections(BASE, '## Breaking\n\nNew story')
+        assert changed == ['Breaking']
+        assert merged.index('## Breaking') < merged.index('## Appendix')
+
+    def test_text_without_headings_gets_fallback_title(self):
+        merged, changed = merge_sections(BASE, 'Plain update', fallback_title='Updates')
+        assert changed == ['Updates']
+        assert '## Updates\n\nPlain update' in merged
+
+    def test_empty_update_keeps_base(self):
+        assert merge_sections(BASE, '  ') == (BASE, [])
+
+
+class TestRefreshSearch:
+    """Refresh searches are date-bounded in code"""
+
+    def test_query_gets_after_operator(self, monkeypatch):
+        queries = []
+        monkeypatch.setattr(
+            RateLimitedSerperDevTool, '_limited_run', lambda self, **kwargs: queries.append(kwargs['search_query'])
+        )
+        tool = RateLimitedSerperDevTool(published_after='2026-10-01')
+        tool._run(search_query='election results')
+        tool._run(search_query='election results after:2026-10-10')
+        assert queries == ['election results after:2026-10-01', 'election results after:2026-10-10']
+
+
+class TestNoNewDevelopments:
+    """A refresh without news completes like any other run"""
+
+    def test_completes_through_final_stage(self, fake_redis, monkeypatch):
+        monkeypatch.setenv('OPENAI_API_KEY', 'test')
+        monkeypatch.setenv('SERPER_API_KEY', 'test')
+        init_db()
+        db = get_db()
+        try:
+            parent = ResearchResult(topic='Refresh', status='completed')
+            db.add(parent)
+            db.commit()
+            for stage in ('trend_research', 'news_aggregation', 'content_strategy', 'final_reporting'):
+                db.add(StageOutput(research_id=parent.id, stage=stage, content=f'{stage} of the parent'))
+            child = ResearchResult(topic='Refresh', status='queued', parent_id=parent.id)
+            db.add(child)
+            db.commit()
+            parent_id, child_id = parent.id, child.id
+        finally:
+            db.close()
+
+        monkeypatch.setattr(crewai.Agent, 'execute_task', lambda *args, **kwargs: NO_NEW_DEVELOPMENTS)
+        monkeypatch.setattr(refresh, 'save_report', lambda content: 'report-1')
+
+        report = refresh.run_news_refresh(
+            child_id, {'previous_run_at': '2026-10-01 08:00 UTC'}, parent_id
+        )
+
+        assert report.startswith('> Refreshed ') and report.endswith('final_reporting of the parent')
+        db = get_db()
+        try:
+            child = db.get(ResearchResult, child_id)
+            assert (child.status, child.report_id) == ('completed', 'report-1')
+            handoffs = db.query(StageHandoff).filter(StageHandoff.research_id == child_id).all()
+            assert [handoff.stage for handoff in handoffs] == ['final_reporting']
+            outputs = {
+                row.stage for row in db.query(StageOutput).filter(StageOutput.research_id == child_id)
+            }
+            assert outputs == {'trend_research', 'news_aggregation', 'content_strategy', 'final_reporting'}
+        finally:
+            db.close()
@@ -0,0 +1,159 @@
+"""
+Unit tests for circuit breakers and adaptive concurrency, against fakeredis
+Run with: python -m pytest tests/test_resilience.py -v
+"""
+
+import time
+
+import crewai
+import pytest
+import requests
+
+from tv_research import worker
+from tv_research.models import ResearchResult, StageUsage, get_db, init_db
+from tv_research.resilience import (
+    BREAKER_FAILURE_THRESHOLD, AdaptiveLimiter, CircuitBreaker, CircuitOpenError, guarded, stage_breakers
+)
+from tv_research.tools import RateLimitedSerperDevTool
+
+
+def open_breaker(conn, upstream: str, seconds: float = 60):
+    conn.hset(f'tv_research:breaker:{upstream}', mapping={
+        'state': 'open', 'open_until': int((time.time() + seconds) * 1000)
+    })
+
+
+def failing_call(upstream: str):
+    with guarded(upstream):
+        raise requests.ConnectionError("upstream down")
+
+
+class TestCircuitBreaker:
+    """Shared breaker state"""
+
+    def test_opens_after_threshold_failures(self, fake_redis):
+        for _ in range(BREAKER_FAILURE_THRESHOLD):
+            with pytest.raises(requests.ConnectionError):
+                failing_call('serper')
+        with pytest.raises(CircuitOpenError) as error:
+            with guarded('serper'):
+                pass
+        assert error.value.upstream == 'serper'
+        assert error.value.retry_after > 0
+
+    def test_request_errors_keep_breaker_closed(self, fake_redis):
+        for _ in range(BREAKER_FAILURE_THRESHOLD + 1):
+            with pytest.raises(ValueError):
+                with guarded('serper'):
+                    raise ValueError("bad query")
+        with guarded('serper'):
+            pass
+
+    def test_probe_success_closes_breaker(self, fake_redis):
+        open_breaker(fake_redis, 'openai', seconds=-1)
+        with guarded('openai'):
+            pass
+        assert fake_redis.hget('tv_research:breaker:openai', 'state') == b'closed'
+
+    def test_probe_failure_reopens_breaker(self, fake_redis):
+        open_breaker(fake_redis, 'openai', seconds=-1)
+        with pytest.raises(requests.ConnectionError):
+            failing_call('openai')
+        assert CircuitBreaker('openai').retry_after() > 0
+
+    def test_probe_released_when_no_slot_frees_up(self, fake_redis, monkeypatch):
+        open_breaker(fake_redis, 'openai', seconds=-1)
+
+        def no_slot(self, max_wait=None):
+            raise TimeoutError("No openai concurrency slot free")
+
+        with monkeypatch.context() as patched:
+            patched.setattr(AdaptiveLimiter, 'acquire', no_slot)
+            with pytest.raises(TimeoutError):
+                with guarded('openai'):
+                    pass
+        assert not fake_redis.exists('tv_research:breaker:openai:probe')
+        # The next call probes right away instead of waiting out BREAKER_PROBE_TIMEOUT
+        with guarded('openai'):
+            pass
+        assert fake_redis.hget('tv_research:breaker:openai', 'state') == b'closed'
+
+
+class TestAdaptiveLimiter:
+    """AIMD concurrency limit"""
+
+    def test_failure_halves_limit(self, fake_redis):
+        limiter = AdaptiveLimiter('serper')
+        slot = limiter.acquire()
+        assert limiter.release(slot, success=False) == limiter.initial / 2
+
+    def test_success_grows_limit(self, fake_redis):
+        limiter = AdaptiveLimiter('serper')
+        slot = limiter.acquire()
+        assert limiter.release(slot, success=True) > limiter.initial
+
+    def test_waits_for_free_slot(self, fake_redis):
+        fake_redis.hset('tv_research:concurrency:serper', 'limit', '1')
+        limiter = AdaptiveLimiter('serper')
+        limiter.acquire()
+        with pytest.raises(TimeoutError):
+            limiter.acquire(max_wait=0.3)
+
+
+class TestStageBreakers:
+    """Breakers that refused calls an agent swallowed still defer the stage"""
+
+    def test_swallowed_error_is_raised(self, fake_redis):
+        open_breaker(fake_redis, 'serper')
+        with pytest.raises(CircuitOpenError):
+            with stage_breakers():
+                try:
+                    with guarded('serper'):
+                        pass
+                except CircuitOpenError:
+                    pass
+
+    def test_scraped_sites_are_left_to_the_agent(self, fake_redis):
+        open_breaker(fake_redis, 'scrape:example.com')
+        with stage_breakers():
+            try:
+                with guarded('scrape:example.com'):
+                    pass
+            except CircuitOpenError:
+                pass
+
+    def test_stage_deferred_when_search_breaker_open(self, fake_redis, monkeypatch):
+        monkeypatch.setenv('OPENAI_API_KEY', 'test')
+        monkeypatch.setenv('SERPER_API_KEY', 'test')
+        init_db()
+        db = get_db()
+        research = ResearchResult(status='queued')
+        db.add(research)
+        db.commit()
+        research_id = research.id
+        db.close()
+        open_breaker(fake_redis, 'serper')
+
+        def execute_task(agent, task, context=None, tools=None):
+            try:
+                RateLimitedSerperDevTool().run(search_query='breaking news')
+            except CircuitOpenError as e:
+                # What crewai's tool usage hands back to the agent
+                return f"Tool error: {e}"
+            return 'news'
+
+        deferred, completed = [], []
+        monkeypatch.setattr(crewai.Agent, 'execute_task', execute_task)
+        monkeypatch.setattr(worker, 'defer_stage', lambda *args, **kwargs: deferred.append(args))
+        monkeypatch.setattr(worker, 'complete_stage', lambda *args, **kwargs: completed.append(args))
+
+        worker.run_news_aggregation(research_id, {'channel_type': 'News'}, 'Trend analysis')
+
+        assert not completed
+        assert [(args[1], args[3].upstream) for args in deferred] == [('news_aggregation', 'serper')]
+        db = get_db()
+        try:
+            usage = db.query(StageUsage).filter(StageUsage.research_id == research_id).one()
+            assert usage.status == 'deferred'
+        finally:
+            db.close()
@@ -0,0 +1,63 @@
+"""
+Unit tests for retention passes, against fakeredis
+Run with: python -m pytest tests/test_retention.py -v
+"""
+
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+
+from tv_research import retention
+from tv_research.api import app
+from tv_research.models import ResearchResult, StageOutput, get_db, init_db
+
+
+class TestRetentionLock:
+    """Concurrent retention services"""
+
+    def test_lock_held_by_another_service(self, fake_redis):
+        fake_redis.set(retention.LOCK_KEY, 'other')
+        assert retention.retention_pass() is None
+        assert fake_redis.get(retention.LOCK_KEY) == b'other'
+
+    def test_pass_keeps_lock_taken_over_after_expiry(self, fake_redis, monkeypatch):
+        init_db()
+
+        def maintain_database(vacuum):
+            # The lock expired during a long pass and the next pass took it
+            fake_redis.set(retention.LOCK_KEY, 'next pass')
+
+        monkeypatch.setattr(retention, 'maintain_database', maintain_database)
+        assert retention.retention_pass() is not None
+        assert fake_redis.get(retention.LOCK_KEY) == b'next pass'
+
+    def test_pass_releases_own_lock(self, fake_redis, monkeypatch):
+        init_db()
+        monkeypatch.setattr(retention, 'maintain_database', lambda vacuum: None)
+        assert retention.retention_pass() is not None
+        assert fake_redis.get(retention.LOCK_KEY) is None
+
+
+class TestCompactedRefresh:
+    """Compacted runs cannot be refreshed"""
+
+    def test_refresh_of_compacted_run_conflicts(self, fake_redis):
+        init_db()
+        db = get_db()
+        try:
+            run = ResearchResult(
+                topic='Compacted', status='completed', completed_at=datetime.utcnow() - timedelta(days=40)
+            )
+            db.add(run)
+            db.commit()
+            for stage in ('trend_research', 'news_aggregation', 'content_strategy', 'final_reporting'):
+                db.add(StageOutput(research_id=run.id, stage=stage, content=stage))
+            db.commit()
+            research_id = run.id
+        finally:
+            db.close()
+
+        retention.compact_runs(datetime.utcnow() - timedelta(days=30))
+
+        response = TestClient(app).post(f'/research/{research_id}/refresh')
+        assert response.status_code == 409
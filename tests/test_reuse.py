@@ -0,0 +1,86 @@
+"""
+Unit tests for freshness-bounded report reuse
+Run with: python -m pytest tests/test_reuse.py -v
+"""
+
+from datetime import datetime, timedelta
+
+from tv_research.models import ResearchResult, get_db, init_db
+from tv_research.reuse import (
+    REPORT_REUSE_MAX_AGE, TRENDING_TOPIC_KEY, find_fresh_report, normalize_topic, reuse_max_age
+)
+
+
+class TestReuseMaxAge:
+    """Freshness window per request"""
+
+    def test_default_window(self):
+        assert reuse_max_age(None, 'normal') == REPORT_REUSE_MAX_AGE
+        assert reuse_max_age(None, 'low') == REPORT_REUSE_MAX_AGE
+
+    def test_high_priority_skips_reuse_by_default(self):
+        assert reuse_max_age(None, 'high') == 0
+
+    def test_explicit_max_age_wins(self):
+        assert reuse_max_age(600, 'high') == 600
+        assert reuse_max_age(0, 'normal') == 0
+
+
+class TestFindFreshReport:
+    """Reports are reused within their tenant only"""
+
+    def test_tenant_scoped(self):
+        init_db()
+        topic_key = normalize_topic('Reuse Tenant Scope')
+        db = get_db()
+        try:
+            report = ResearchResult(
+                topic='Reuse Tenant Scope', topic_key=topic_key, status='completed', tenant='sports',
+                completed_at=datetime.utcnow() - timedelta(seconds=60)
+            )
+            db.add(report)
+            db.commit()
+
+            assert find_fresh_report(db, topic_key, 1800, 'sports').id == report.id
+            assert find_fresh_report(db, topic_key, 1800, 'archive') is None
+            assert find_fresh_report(db, topic_key, 1800) is None
+            assert find_fresh_report(db, topic_key, 30, 'sports') is None
+        finally:
+            db.close()
+
+    def test_default_tenant_is_one_pool(self):
+        init_db()
+        topic_key = normalize_topic('Reuse Default Tenant')
+        db = get_db()
+        try:
+            report = ResearchResult(
+                topic='Reuse Default Tenant', topic_key=topic_key, status='completed', tenant=None,
+                completed_at=datetime.utcnow() - timedelta(seconds=60)
+            )
+            db.add(report)
+            db.commit()
+
+            assert find_fresh_report(db, topic_key, 1800, 'default').id == report.id
+            assert find_fresh_report(db, topic_key, 1800, None).id == report.id
+            assert find_fresh_report(db, '', 1800) is None
+        finally:
+            db.close()
+
+
+class TestNormalizeTopic:
+    """Topic keys ignore formatting but never merge different topics"""
+
+    def test_formatting_is_ignored(self):
+        assert normalize_topic('AI  in Healthcare!') == normalize_topic('ai in healthcare') == 'ai in healthcare'
+        assert normalize_topic('Électric Cars') == 'electric cars'
+        assert normalize_topic('"Elections"?') == 'elections'
+
+    def test_symbols_tell_topics_apart(self):
+        keys = [normalize_topic(topic) for topic in ['C', 'C#', 'C++', 'F#', 'F', 'AT&T', 'AT T']]
+        assert len(set(keys)) == len(keys)
+        assert normalize_topic('C#') == 'c#' and normalize_topic('Node.js') == 'node.js'
+
+    def test_only_blank_topics_are_trending(self):
+        assert normalize_topic(None) == normalize_topic('  ') == TRENDING_TOPIC_KEY
+        assert normalize_topic('???') == ''
+        assert normalize_topic('*trending*') != TRENDING_TOPIC_KEY
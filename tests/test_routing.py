@@ -0,0 +1,67 @@
+"""
+Unit tests for per-stage model routing and latency/cost budgets
+Run with: python -m pytest tests/test_routing.py -v
+"""
+
+import time
+
+from tv_research.routing import StageBudget, stage_route
+
+
+class TestStageBudget:
+    """Budget outcome and fallback accounting of one agent run"""
+
+    def test_within_budget(self):
+        budget = StageBudget('news_aggregation', 'gpt-4.1-mini', latency_seconds=60, cost_usd=1.0)
+        budget.start()
+        budget.charge('gpt-4.1', 1000, 100)
+        assert not budget.exceeded()
+        assert budget.usage() == {'fallback_model': None, 'fallback_calls': 0, 'budget_outcome': 'within_budget'}
+
+    def test_cost_exceeded_switches_to_fallback(self):
+        budget = StageBudget('news_aggregation', 'gpt-4.1-mini', cost_usd=0.01)
+        budget.start()
+        budget.charge('gpt-4.1', 10000, 0)  # $0.02
+        assert budget.exceeded()
+        budget.charge('gpt-4.1-mini', 10000, 0)  # $0.004
+        assert budget.usage() == {
+            'fallback_model': 'gpt-4.1-mini', 'fallback_calls': 1, 'budget_outcome': 'cost_exceeded',
+            'cost_usd': 0.024,
+        }
+
+    def test_latency_exceeded_from_first_call(self):
+        budget = StageBudget('content_strategy', 'gpt-4.1-mini', latency_seconds=5)
+        assert not budget.exceeded()
+        budget.start()
+        budget.started = time.monotonic() - 10
+        assert budget.exceeded() and budget.outcome == 'latency_exceeded'
+        # The first outcome sticks
+        budget.spent_usd = 100.0
+        budget.cost_usd = 1.0
+        assert budget.usage()['budget_outcome'] == 'latency_exceeded'
+
+    def test_unpriced_model_keeps_agent_cost(self):
+        budget = StageBudget('final_reporting', 'local-model', cost_usd=0.001)
+        budget.charge('gpt-4.1', 10000, 0)
+        budget.charge('local-model', 10000, 0)
+        usage = budget.usage()
+        assert usage['fallback_calls'] == 1 and 'cost_usd' not in usage
+
+
+class TestStageRoute:
+    """Per-stage overrides from the environment"""
+
+    def test_environment_overrides(self, monkeypatch):
+        monkeypatch.setenv('STAGE_MODEL_FINAL_REPORTING', 'gpt-4o')
+        monkeypatch.setenv('STAGE_FALLBACK_MODEL_FINAL_REPORTING', 'gpt-4o-mini')
+        monkeypatch.setenv('STAGE_LATENCY_BUDGET_FINAL_REPORTING', '120')
+        monkeypatch.setenv('STAGE_COST_BUDGET_FINAL_REPORTING', 'cheap')
+        route = stage_route('final_reporting')
+        assert route['model'] == 'gpt-4o' and route['fallback_model'] == 'gpt-4o-mini'
+        assert route['latency_budget_seconds'] == 120.0
+        assert route['cost_budget_usd'] is None
+
+    def test_fallback_same_as_model_is_dropped(self, monkeypatch):
+        monkeypatch.setenv('STAGE_MODEL_TREND_RESEARCH', 'gpt-4o-mini')
+        monkeypatch.setenv('STAGE_FALLBACK_MODEL_TREND_RESEARCH', 'gpt-4o-mini')
+        assert stage_route('trend_research')['fallback_model'] is None
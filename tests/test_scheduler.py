@@ -0,0 +1,115 @@
+"""
+Unit tests for cron expressions and slot deadlines of scheduled research
+Run with: python -m pytest tests/test_scheduler.py -v
+"""
+
+from datetime import datetime, timezone
+
+import pytest
+
+from tv_research.scheduler import CronExpression, load_schedules, slot_deadline
+
+
+def at(*args) -> datetime:
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+class TestCronExpression:
+    """Next occurrence of five-field cron expressions"""
+
+    def test_step_minutes(self):
+        assert CronExpression('*/15 * * * *').next_after(at(2026, 10, 19, 10, 7)) == at(2026, 10, 19, 10, 15)
+
+    def test_strictly_after(self):
+        assert CronExpression('0 9 * * *').next_after(at(2026, 10, 19, 9, 0, 30)) == at(2026, 10, 20, 9, 0)
+
+    def test_weekday_range_skips_weekend(self):
+        # 2026-10-23 is a Friday
+        expression = CronExpression('30 6 * * 1-5')
+        assert expression.next_after(at(2026, 10, 23, 7, 0)) == at(2026, 10, 26, 6, 30)
+
+    def test_seven_is_sunday(self):
+        assert CronExpression('0 0 * * 7').next_after(at(2026, 10, 19, 12, 0)) == at(2026, 10, 25, 0, 0)
+
+    def test_day_of_month_or_weekday(self):
+        # Both restricted: the 1st of the month or any Sunday, whichever comes first
+        expression = CronExpression('0 9 1 * 0')
+        assert expression.next_after(at(2026, 10, 19, 10, 0)) == at(2026, 10, 25, 9, 0)
+        assert expression.next_after(at(2026, 10, 25, 10, 0)) == at(2026, 11, 1, 9, 0)
+
+    def test_lists_and_ranged_steps(self):
+        expression = CronExpression('0 8-20/6,23 * * *')
+        assert expression.hours == {8, 14, 20, 23}
+
+    @pytest.mark.parametrize('expression', ['* * * *', '60 * * * *', '0 24 * * *', '0 0 0 * *'])
+    def test_invalid_expressions(self, expression):
+        with pytest.raises(ValueError):
+            CronExpression(expression)
+
+    def test_never_matching(self):
+        with pytest.raises(ValueError):
+            CronExpression('0 0 31 2 *').next_after(at(2026, 10, 19, 0, 0))
+
+
+def write_schedules(tmp_path, text: str) -> str:
+    path = tmp_path / 'schedules.yaml'
+    path.write_text(text)
+    return str(path)
+
+
+class TestSlotDeadlines:
+    """Deadlines derived from the slot a schedule's report is for"""
+
+    def test_deadline_before_air_time(self):
+        assert slot_deadline({'name': 'Prime Time', 'starts': '20:00'}, 60) == '0 19 * * *'
+        assert slot_deadline({'name': 'Prime Time', 'starts': '20:15'}, 240) == '15 16 * * *'
+
+    def test_deadline_on_an_earlier_day(self):
+        # Sunday and Monday 00:30 slots are ready Saturday and Sunday 23:30
+        assert slot_deadline({'name': 'Late', 'starts': '00:30', 'days': '0,1'}, 60) == '30 23 * * 0,6'
+        # Saturday 09:00 minus 25 hours is Friday 08:00
+        assert slot_deadline({'name': 'Weekend', 'starts': '09:00', 'days': '6'}, 1500) == '0 8 * * 5'
+
+    def test_unquoted_yaml_time(self):
+        # YAML 1.1 reads 20:00 as 1200
+        assert slot_deadline({'name': 'Prime Time', 'starts': 1200}, 60) == '0 19 * * *'
+
+    @pytest.mark.parametrize('slot, margin', [
+        ({'name': 'Prime Time', 'starts': '24:00'}, 60),
+        ({'name': 'Prime Time'}, 60),
+        ({'starts': '20:00'}, 60),
+        ({'name': 'Prime Time', 'starts': '20:00'}, -5),
+    ])
+    def test_invalid_slots(self, slot, margin):
+        with pytest.raises(ValueError):
+            slot_deadline(slot, margin)
+
+    def test_loaded_schedule_uses_slot(self, tmp_path):
+        schedules = load_schedules(write_schedules(tmp_path, """
+prime:
+  slot: {name: Prime Time, starts: "20:00"}
+  ready_margin_minutes: 240
+  inputs: {channel_type: News}
+"""))
+        assert schedules['prime']['ready_by'] == '0 16 * * *'
+        assert schedules['prime']['inputs']['time_slot'] == 'Prime Time'
+        assert schedules['prime']['expression'].next_after(at(2026, 10, 19, 17, 0)) == at(2026, 10, 20, 16, 0)
+
+    def test_conflicting_schedules_are_rejected(self, tmp_path):
+        schedules = load_schedules(write_schedules(tmp_path, """
+hand_written_deadline:
+  slot: {name: Prime Time, starts: "20:00"}
+  ready_by: "0 21 * * *"
+other_time_slot:
+  slot: {name: Prime Time, starts: "20:00"}
+  inputs: {time_slot: Morning}
+bad_slot:
+  slot: {name: Prime Time, starts: "8pm"}
+"""))
+        assert schedules == {}
+
+    def test_shipped_schedules(self):
+        schedules = load_schedules()
+        assert schedules['daily_prime_time']['inputs']['time_slot'] == 'Prime Time'
+        assert schedules['daily_prime_time']['ready_by'] == '0 16 * * *'
+        assert schedules['weekly_trends']['ready_by'] == '0 8 * * 5'
@@ -0,0 +1,106 @@
+"""
+Unit tests for streaming consumers of trending runs, against fakeredis
+Run with: python -m pytest tests/test_streaming.py -v
+"""
+
+import json
+
+import pytest
+from rq.registry import ScheduledJobRegistry
+
+from tv_research import streaming, worker
+from tv_research.models import ResearchResult, get_db, init_db
+from tv_research.queue_client import get_queue
+
+
+@pytest.fixture
+def research_id():
+    init_db()
+    db = get_db()
+    try:
+        research = ResearchResult(status='running')
+        db.add(research)
+        db.commit()
+        return research.id
+    finally:
+        db.close()
+
+
+def append_record(research_id: int, stage: str, record: dict):
+    streaming._append(research_id, stage, {'record': json.dumps(record)})
+
+
+class TestReadStream:
+    """Non-blocking reads of a stage's stream"""
+
+    def test_records_and_end(self, fake_redis):
+        append_record(1, 'trend_research', {'topic': 'Alpha'})
+        records, ended, last_at = streaming.read_stream(1, 'trend_research')
+        assert records == [{'topic': 'Alpha'}] and not ended and last_at
+        streaming._append(1, 'trend_research', {'end': 1})
+        assert streaming.read_stream(1, 'trend_research')[1]
+
+    def test_upstream_failure(self, fake_redis):
+        streaming._append(1, 'trend_research', {'error': 'trend agent failed'})
+        with pytest.raises(streaming.StreamFailed):
+            streaming.read_stream(1, 'trend_research')
+
+
+class TestConsumers:
+    """Consumers hand the stream to a continuation job instead of waiting"""
+
+    def test_caught_up_consumer_schedules_continuation(self, fake_redis, research_id):
+        append_record(research_id, 'trend_research', {'topic': 'Alpha'})
+        append_record(research_id, 'news_aggregation', {'topic': 'Alpha', 'news': 'news about Alpha'})
+
+        assert streaming.run_news_stream(research_id, {'channel_type': 'News'}) is None
+
+        continuation = fake_redis.get(streaming.lease_key(research_id, 'news_aggregation')).decode()
+        assert continuation.startswith(f'stream-{research_id}-news_aggregation-')
+        assert ScheduledJobRegistry(queue=get_queue('news_aggregation')).get_job_ids() == [continuation]
+        db = get_db()
+        try:
+            research = db.get(ResearchResult, research_id)
+            assert (research.status, research.job_id) == ('news_aggregation_running', continuation)
+        finally:
+            db.close()
+
+    def test_consumer_without_lease_skips(self, fake_redis, research_id):
+        fake_redis.set(streaming.lease_key(research_id, 'content_strategy'), 'stream-other')
+        append_record(research_id, 'news_aggregation', {'topic': 'Alpha', 'news': 'news about Alpha'})
+
+        assert streaming.run_strategy_stream(research_id, {'channel_type': 'News'}) is None
+        assert not streaming.emitted(research_id, 'content_strategy')
+        assert fake_redis.get(streaming.lease_key(research_id, 'content_strategy')) == b'stream-other'
+
+
+class TestNewsFanOut:
+    """Reduce of a fanned-out news stage"""
+
+    def test_reduce_waits_for_deferred_topic_jobs(self, fake_redis, research_id):
+        append_record(research_id, 'trend_research', {'topic': 'Alpha'})
+        append_record(research_id, 'trend_research', {'topic': 'Beta'})
+        append_record(research_id, 'news_aggregation', {'topic': 'Alpha', 'news': 'news about Alpha'})
+
+        assert streaming.run_news_reduce(research_id, {'channel_type': 'News'}) is None
+
+        continuation = fake_redis.get(streaming.lease_key(research_id, 'news_aggregation')).decode()
+        assert ScheduledJobRegistry(queue=get_queue('news_aggregation')).get_job_ids() == [continuation]
+        assert not streaming.read_stream(research_id, 'news_aggregation')[1]
+
+    def test_status_never_moves_back(self, fake_redis, research_id):
+        worker.update_task_status(research_id, 'content_strategy_running', job_id='strategy')
+        worker.update_task_status(research_id, 'news_aggregation_running', job_id='news')
+        worker.update_task_status(research_id, 'news_aggregation_completed')
+        db = get_db()
+        try:
+            research = db.get(ResearchResult, research_id)
+            assert (research.status, research.job_id) == ('content_strategy_running', 'strategy')
+        finally:
+            db.close()
+        worker.update_task_status(research_id, 'failed')
+        db = get_db()
+        try:
+            assert db.get(ResearchResult, research_id).status == 'failed'
+        finally:
+            db.close()
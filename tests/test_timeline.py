@@ -0,0 +1,60 @@
+"""
+Unit tests for splitting a run's status history into queue wait and service time
+Run with: python -m pytest tests/test_timeline.py -v
+"""
+
+from tv_research.models import StatusEvent
+from tv_research.timeline import stage_intervals, summarize_intervals
+
+
+def events(*rows) -> list:
+    return [
+        StatusEvent(id=index, research_id=1, event=event, stage=stage, job_id=job_id, at_ms=at_ms,
+                    duration_ms=duration_ms)
+        for index, (event, stage, job_id, at_ms, duration_ms) in enumerate(rows, start=1)
+    ]
+
+
+class TestStageIntervals:
+    """Stage attempts from enqueued, started and finished events"""
+
+    def test_wait_and_service_time(self):
+        intervals = stage_intervals(events(
+            ('started', 'trend_research', 'a', 1500, None),
+            ('enqueued', 'trend_research', 'a', 1000, None),
+            ('finished', 'trend_research', 'a', 4000, 2400),
+            ('enqueued', 'news_aggregation', 'b', 4000, None),
+            ('started', 'news_aggregation', 'b', 4100, None),
+            ('failed', 'news_aggregation', 'b', 5100, None),
+        ))
+        assert [(i['stage'], i['queue_wait_ms'], i['service_ms'], i['outcome']) for i in intervals] == [
+            ('trend_research', 500, 2400, 'finished'),
+            ('news_aggregation', 100, 1000, 'failed'),
+        ]
+
+    def test_requeued_while_running_is_lost(self):
+        intervals = stage_intervals(events(
+            ('enqueued', 'news_aggregation', 'b', 0, None),
+            ('started', 'news_aggregation', 'b', 100, None),
+            ('enqueued', 'news_aggregation', 'b', 60000, None),
+            ('started', 'news_aggregation', 'b', 60500, None),
+        ))
+        assert [(i['queue_wait_ms'], i['outcome']) for i in intervals] == [(100, 'lost'), (500, 'running')]
+
+    def test_waiting_stage(self):
+        intervals = stage_intervals(events(('enqueued', 'content_strategy', 'c', 7000, None)))
+        assert intervals == [{
+            'stage': 'content_strategy', 'job_id': 'c', 'enqueued_at_ms': 7000, 'started_at_ms': None,
+            'queue_wait_ms': None, 'service_ms': None, 'outcome': 'waiting',
+        }]
+
+    def test_summary(self):
+        intervals = stage_intervals(events(
+            ('enqueued', 'trend_research', 'a', 0, None),
+            ('started', 'trend_research', 'a', 200, None),
+            ('finished', 'trend_research', 'a', 1200, None),
+            ('enqueued', 'trend_research', 'a2', 1300, None),
+        ))
+        summary = summarize_intervals(intervals)
+        assert summary['by_stage']['trend_research'] == {'attempts': 2, 'queue_wait_ms': 200, 'service_ms': 1000}
+        assert summary['totals'] == {'attempts': 2, 'queue_wait_ms': 200, 'service_ms': 1000}
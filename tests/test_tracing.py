@@ -0,0 +1,50 @@
+"""
+Unit tests for span storage and background export, against fakeredis
+Run with: python -m pytest tests/test_tracing.py -v
+"""
+
+import threading
+import time
+
+from tv_research import tracing
+
+
+class TestBackgroundExport:
+    """Exports run off the request path"""
+
+    def test_flush_does_not_wait_for_export(self, fake_redis, monkeypatch):
+        exported = []
+
+        def slow_export(spans):
+            time.sleep(0.5)
+            exported.extend(spans)
+
+        monkeypatch.setattr(tracing, 'TRACE_EXPORT', ['otlp'])
+        monkeypatch.setattr(tracing, '_export', slow_export)
+        monkeypatch.setattr(tracing, 'get_redis', lambda: fake_redis)
+
+        started = time.monotonic()
+        with tracing.start_trace('POST /research') as root:
+            with tracing.span('db insert research_result'):
+                pass
+        assert time.monotonic() - started < 0.3
+        # Stored in Redis before the request returns
+        assert len(tracing.get_trace(root.trace_id)) == 2
+
+        assert tracing.wait_for_export(timeout=5)
+        assert {item['name'] for item in exported} == {'POST /research', 'db insert research_result'}
+
+    def test_full_queue_drops_spans(self, fake_redis, monkeypatch):
+        release = threading.Event()
+        monkeypatch.setattr(tracing, 'TRACE_EXPORT', ['otlp'])
+        monkeypatch.setattr(tracing, 'TRACE_EXPORT_QUEUE_SIZE', 2)
+        monkeypatch.setattr(tracing, '_export', lambda spans: release.wait(5))
+        monkeypatch.setattr(tracing, '_exporter_pid', None)
+        monkeypatch.setattr(tracing, 'get_redis', lambda: fake_redis)
+
+        for index in range(5):
+            with tracing.start_trace(f'request {index}'):
+                pass
+        assert tracing._export_queue.qsize() <= 2
+        release.set()
+        assert tracing.wait_for_export(timeout=5)
@@ -0,0 +1,89 @@
+"""
+Unit tests for per-stage token and cost accounting
+Run with: python -m pytest tests/test_usage.py -v
+"""
+
+import pytest
+
+from tv_research.models import StageUsage
+from tv_research.usage import estimate_cost, split_usage, summarize_usage
+
+
+class TestEstimateCost:
+    """Pricing by the longest matching model prefix"""
+
+    def test_longest_prefix_wins(self):
+        assert estimate_cost('gpt-4o-mini', 1_000_000, 0) == 0.15
+        assert estimate_cost('gpt-4o', 1_000_000, 0) == 2.50
+        assert estimate_cost('gpt-4o-2024-08-06', 0, 1_000_000) == 10.00
+        assert estimate_cost('gpt-4.1-nano', 1_000_000, 0) == 0.10
+        assert estimate_cost('gpt-4', 1_000_000, 0) == 30.00
+
+    def test_provider_prefix_and_case_are_ignored(self):
+        assert estimate_cost('openai/GPT-4o-mini', 1_000_000, 1_000_000) == 0.75
+
+    def test_cached_prompt_tokens(self):
+        # 400k uncached at $2.50 and 600k cached at $1.25 per 1M tokens
+        assert estimate_cost('gpt-4o', 1_000_000, 0, cached_prompt_tokens=600_000) == pytest.approx(1.75)
+        # More cached than prompt tokens never prices the uncached part negative
+        assert estimate_cost('gpt-4o', 100, 0, cached_prompt_tokens=200) == pytest.approx(0.00025)
+
+    def test_unpriced_models(self):
+        assert estimate_cost('claude-3-haiku', 1000, 1000) is None
+        assert estimate_cost(None, 1000, 1000) is None
+
+
+class TestSplitUsage:
+    """A batched agent run's usage split between its research runs"""
+
+    def test_remainder_goes_to_the_first_runs(self):
+        usage = {
+            'model': 'gpt-4o-mini', 'prompt_tokens': 10, 'completion_tokens': 5, 'cached_prompt_tokens': 0,
+            'total_tokens': 15, 'llm_calls': 2, 'tool_calls': 1, 'cost_usd': 0.01,
+        }
+        shares = split_usage(usage, 3)
+        assert [share['prompt_tokens'] for share in shares] == [4, 3, 3]
+        assert [share['completion_tokens'] for share in shares] == [2, 2, 1]
+        assert [share['llm_calls'] for share in shares] == [1, 1, 0]
+        assert [share['tool_calls'] for share in shares] == [1, 0, 0]
+        assert all(share['model'] == 'gpt-4o-mini' and share['cost_usd'] == 0.003333 for share in shares)
+        for field in ('prompt_tokens', 'completion_tokens', 'total_tokens', 'llm_calls'):
+            assert sum(share[field] for share in shares) == usage[field]
+
+    def test_fallback_calls_and_unpriced_runs(self):
+        shares = split_usage({'prompt_tokens': 3, 'fallback_calls': 3, 'cost_usd': None}, 2)
+        assert [share['fallback_calls'] for share in shares] == [2, 1]
+        assert [share['cost_usd'] for share in shares] == [None, None]
+        assert 'fallback_calls' not in split_usage({'prompt_tokens': 3}, 2)[0]
+
+    def test_single_run_is_unchanged(self):
+        usage = {'prompt_tokens': 7, 'completion_tokens': 3, 'total_tokens': 10, 'llm_calls': 1,
+                 'tool_calls': 0, 'cached_prompt_tokens': 0, 'cost_usd': 0.5}
+        assert split_usage(usage, 1) == [usage]
+
+
+class TestSummarizeUsage:
+    """Per-stage and run totals of stored usage rows"""
+
+    def test_totals(self):
+        rows = [
+            StageUsage(stage='trend_research', model='gpt-4o-mini', prompt_tokens=100, completion_tokens=20,
+                       total_tokens=120, llm_calls=2, tool_calls=1, cost_usd=0.001),
+            StageUsage(stage='trend_research', model='gpt-4o', prompt_tokens=50, completion_tokens=10,
+                       total_tokens=60, llm_calls=1, cost_usd=None, fallback_model='gpt-4o-mini',
+                       fallback_calls=1, budget_outcome='cost_exceeded'),
+            StageUsage(stage='final_reporting', model='gpt-4o', prompt_tokens=10, completion_tokens=5,
+                       total_tokens=15, llm_calls=1, cost_usd=0.002),
+        ]
+        summary = summarize_usage(rows)
+        trend = summary['by_stage']['trend_research']
+        assert (trend['runs'], trend['prompt_tokens'], trend['tool_calls']) == (2, 150, 1)
+        assert trend['models'] == ['gpt-4o-mini', 'gpt-4o']
+        assert (trend['fallback_calls'], trend['over_budget'], trend['cost_usd']) == (1, 1, 0.001)
+        assert 'over_budget' not in summary['by_stage']['final_reporting']
+        assert summary['totals']['total_tokens'] == 195
+        assert summary['totals']['cost_usd'] == 0.003
+
+    def test_no_rows(self):
+        summary = summarize_usage([])
+        assert summary['by_stage'] == {} and summary['totals']['cost_usd'] == 0.0